@@ -0,0 +1,473 @@
+# coding=utf-8
+
+import os
+import sys
+import math
+import marshal
+import hashlib
+import itertools
+
+import ibis
+
+from . import nodes
+from . import filters
+from . import errors
+from . import compiler
+from .context import Context
+from .template import Template
+
+
+# Compiled template backend.
+#
+# Instead of walking the node tree node by node on every render, a template is translated into Python source with
+# one render function per body (the template itself, each of its blocks and each spaceless/trim section) and
+# compiled once. The resulting code object is cached on disk, keyed by a hash of the template source, and loaded
+# with marshal, so later runs skip lexing and parsing altogether.
+#
+# Compiled and tree templates can be mixed freely: both expose .root_node.render(context) and .blocks, which is all
+# includes, extends and blocks use. Templates using node types the code generator doesn't know (e.g. registered by
+# the application) are returned as tree templates.
+
+# Bump whenever the generated code changes, so cached code is regenerated.
+VERSION = 1
+
+CACHE_EXT = ".ibc"
+
+SIMPLE_TYPES = (str, int, bool, type(None))
+
+OPERATORS = dict((func, op) for op, func in nodes.IfNode.operators.items())
+
+
+class NotCompilable(Exception):
+    pass
+
+
+# Runtime helpers used by the generated code. These mirror the corresponding parts of nodes.Expression and the
+# node classes, including their error messages.
+
+def _call(context, token, name, obj, args, kwargs):
+    try:
+        if getattr(obj, "with_context", False):
+            kwargs["context"] = context
+        obj = obj(*args, **kwargs)
+
+        if isinstance(obj, nodes.ResolveContextVariable):
+            value = context.resolve(obj, token)
+            obj = context.resolve(value, token)
+    except Exception as err:
+        msg = "Error calling function '{}'.".format(name)
+        errors.raise_(errors.TemplateRenderingError(msg, token), err)
+    return obj
+
+
+def _filter(context, token, name, obj, args, kwargs):
+    func = filters.filtermap[name]
+    try:
+        if getattr(func, "with_context", False):
+            kwargs["context"] = context
+        return func(obj, *args, **kwargs)
+    except Exception as err:
+        msg = "Error applying filter '{}'.".format(name)
+        errors.raise_(errors.TemplateRenderingError(msg, token), err)
+
+
+def _math(expr, matheval):
+    return lambda *args: nodes.apply_math_context(expr, matheval, args)
+
+
+def _fail(err, token):
+    if token:
+        tagname = "'{}'".format(token.keyword) if token.type == "INSTRUCTION" else token.type
+        msg = "An unexpected error occurred while rendering the {} tag: ".format(tagname)
+        msg += "{name}: {err}".format(name=err.__class__.__name__, err=err)
+    else:
+        msg = "Unexpected rendering error: {name}: {err}".format(name=err.__class__.__name__, err=err)
+    errors.raise_(errors.TemplateRenderingError(msg, token), err)
+
+
+def _unpack(loopvars, item, token):
+    try:
+        return dict(zip(loopvars, item))
+    except Exception as err:
+        errors.raise_(errors.TemplateRenderingError("Unpacking error.", token), err)
+
+
+def _load(template_name, token, template_arg):
+    if not isinstance(template_name, str):
+        msg = "Invalid argument for the 'include' tag. "
+        msg += "The variable '{}' should evaluate to a string. ".format(template_arg)
+        msg += "This variable has the value: {}.".format(repr(template_name))
+        raise errors.TemplateRenderingError(msg, token)
+
+    if not ibis.loader:
+        msg = "No template loader has been specified. "
+        msg += "A template loader is required by the 'include' tag in "
+        msg += "template '{template_id}', line {line_number}.".format(template_id=token.template_id,
+                                                                      line_number=token.line_number)
+        raise errors.TemplateLoadError(msg)
+    return ibis.loader(template_name)
+
+
+def _block(context, title):
+    block_list = []
+    for template in context.templates:
+        block_node = template.blocks.get(title)
+        if block_node:
+            block_list.append(block_node)
+    return _render_block(context, block_list)
+
+
+def _render_block(context, block_list):
+    if block_list:
+        current_block = block_list.pop(0)
+        context.push()
+        context['super'] = lambda: _render_block(context, block_list)
+        output = ''.join(child.render(context) for child in current_block.children)
+        context.pop()
+        return output
+    return ''
+
+
+RUNTIME = {
+    "_call": _call,
+    "_filter": _filter,
+    "_math": _math,
+    "_fail": _fail,
+    "_unpack": _unpack,
+    "_load": _load,
+    "_block": _block,
+    "_escape": filters.escape,
+    "_spaceless": filters.spaceless,
+    "_cycle": itertools.cycle,
+    "TemplateError": errors.TemplateError,
+}
+
+
+# Translates a parsed node tree into Python source. Values that can't be written as literals go into a constants
+# list, tokens (needed for error messages) into a token table; both are stored next to the code object.
+class CodeGenerator:
+
+    def __init__(self, template_id):
+        self.template_id = template_id
+        self.tokens = []
+        self.token_index = {}
+        self.constants = []
+        self.prelude = []
+        self.functions = []
+        self.counter = 0
+
+    def name(self, prefix):
+        self.counter += 1
+        return "{}{}".format(prefix, self.counter)
+
+    def token(self, token):
+        if id(token) not in self.token_index:
+            self.token_index[id(token)] = len(self.tokens)
+            self.tokens.append((token.type, token.text, token.line_number))
+        return self.token_index[id(token)]
+
+    def constant(self, value):
+        if type(value) in SIMPLE_TYPES or type(value) is float and math.isfinite(value):
+            return repr(value)
+        self.constants.append(value)
+        return "K[{}]".format(len(self.constants) - 1)
+
+    def arg(self, arg, tok):
+        if isinstance(arg, nodes.ContextVariable):
+            return "ctx.resolve({!r}, T[{}])".format(str(arg), tok)
+        elif isinstance(arg, nodes.Expression):
+            return self.expr(arg)
+        return self.constant(arg)
+
+    def args(self, args, tok):
+        return "({})".format("".join(self.arg(arg, tok) + ", " for arg in args))
+
+    def kwargs(self, kwargs, tok):
+        return "{{{}}}".format(", ".join("{!r}: {}".format(k, self.arg(v, tok)) for k, v in kwargs.items()))
+
+    def expr(self, expr):
+        tok = self.token(expr.token)
+        if expr.is_literal and not expr.dyn_args:
+            code = self.constant(expr.literal)
+        else:
+            if isinstance(expr.varstring, str):
+                name = expr.varstring
+                code = "ctx.resolve({!r}, T[{}])".format(str(expr.varstring), tok)
+            elif expr.math_expr:
+                name = expr.math_expr[0]
+                code = self.name("_m")
+                self.prelude.append("{} = _math({}, {})".format(code, self.constant(expr.math_expr[0]),
+                                                                self.constant(expr.math_expr[1])))
+            else:
+                raise NotCompilable("Unknown expression type")
+
+            if expr.is_func_call:
+                code = "_call(ctx, T[{}], {!r}, {}, {}, {})".format(tok, str(name), code,
+                                                                   self.args(expr.func_args, tok),
+                                                                   self.kwargs(expr.func_kwargs, tok))
+
+        for name, func, args, kwargs, _ in expr.filters:
+            code = "_filter(ctx, T[{}], {!r}, {}, {}, {})".format(tok, name, code, self.args(args, tok),
+                                                                 self.kwargs(kwargs, tok))
+        return code
+
+    def condition(self, cond):
+        lhs = self.expr(cond.lhs)
+        if cond.op:
+            code = "({} {} {})".format(lhs, OPERATORS[cond.op], self.expr(cond.rhs))
+        else:
+            code = "({})".format(lhs)
+        return "(not {})".format(code) if cond.negated else code
+
+    def function(self, children):
+        name = self.name("_f")
+        lines = [
+            "def {}(ctx):".format(name),
+            "    _o = []",
+            "    _a = _o.append",
+            "    _t = None",
+            "    try:",
+        ]
+        self.body(children, lines, " " * 8)
+        lines += [
+            "    except TemplateError:",
+            "        raise",
+            "    except Exception as err:",
+            "        _fail(err, T[_t] if _t is not None else None)",
+            "    return ''.join(_o)",
+        ]
+        self.functions.append("\n".join(lines))
+        return name
+
+    def body(self, children, lines, indent):
+        start = len(lines)
+        for child in children:
+            self.node(child, lines, indent)
+        if len(lines) == start:
+            lines.append(indent + "pass")
+
+    def node(self, node, lines, indent):
+        add = lambda line: lines.append(indent + line)
+        cls = type(node)
+        if cls is nodes.TextNode:
+            if node.token.text:
+                add("_a({!r})".format(node.token.text))
+            return
+
+        if cls in (nodes.ExtendsNode, nodes.ElifNode, nodes.ElseNode, nodes.EmptyNode):
+            # these render nothing by themselves
+            return
+
+        if cls is nodes.Node:
+            self.body(node.children, lines, indent)
+            return
+
+        if cls is nodes.BlockNode:
+            add("_a(_block(ctx, {!r}))".format(node.title))
+            return
+
+        add("_t = {}".format(self.token(node.token)))
+        if cls is nodes.PrintNode:
+            if node.is_ternary:
+                content = "({} if {} else {})".format(self.expr(node.true_branch_expr), self.expr(node.test_expr),
+                                                      self.expr(node.false_branch_expr))
+            else:
+                content = "({})".format(" or ".join(self.expr(expr) for expr in node.exprs))
+            if node.token.type == "EPRINT":
+                add("_a(_escape(str{}))".format(content))
+            else:
+                add("_a(str{})".format(content))
+
+        elif cls is nodes.IfNode:
+            add("if {}:".format(" or ".join(
+                "({})".format(" and ".join(self.condition(cond) for cond in group))
+                for group in node.condition_groups
+            )))
+            self.body([node.true_branch], lines, indent + "    ")
+            add("else:")
+            self.body([node.false_branch], lines, indent + "    ")
+
+        elif cls is nodes.ForNode:
+            var = self.name("_c")
+            add("{} = {}".format(var, self.expr(node.expr)))
+            add("if {0} and hasattr({0}, '__iter__'):".format(var))
+            add("    {0} = list({0})".format(var))
+            add("    {0}_len = len({0})".format(var))
+            add("    for {0}_i, {0}_item in enumerate({0}):".format(var))
+            add("        ctx.push()")
+            if len(node.loopvars) > 1:
+                add("        ctx.update(_unpack({!r}, {}_item, T[_t]))".format(tuple(node.loopvars), var))
+            else:
+                add("        ctx[{!r}] = {}_item".format(node.loopvars[0], var))
+            add("        ctx['loop'] = {{'index': {0}_i, 'count': {0}_i + 1, 'length': {0}_len, "
+                "'is_first': {0}_i == 0, 'is_last': {0}_i == {0}_len - 1, 'parent': ctx.get('loop')}}".format(var))
+            # the body might have changed _t
+            self.body([node.for_branch], lines, indent + "        ")
+            add("        ctx.pop()")
+            add("else:")
+            self.body([node.empty_branch], lines, indent + "    ")
+
+        elif cls is nodes.CycleNode:
+            key = self.name("_cy")
+            self.prelude.append("{} = object()".format(key))
+            add("if {} not in ctx.stash:".format(key))
+            add("    _v = {}".format(self.expr(node.expr)))
+            add("    ctx.stash[{}] = _cycle(_v if hasattr(_v, '__iter__') else '')".format(key))
+            add("_a(str(next(ctx.stash[{}], '')))".format(key))
+
+        elif cls is nodes.IncludeNode:
+            var = self.name("_tpl")
+            add("{} = _load({}, T[_t], {!r})".format(var, self.expr(node.template_expr), node.template_arg))
+            add("ctx.push()")
+            for name, expr in node.variables.items():
+                add("ctx[{!r}] = {}".format(name, self.expr(expr)))
+            add("_a({}.root_node.render(ctx))".format(var))
+            add("ctx.pop()")
+
+        elif cls is nodes.WithNode:
+            add("ctx.push()")
+            for name, expr in node.variables.items():
+                add("ctx[{!r}] = {}".format(name, self.expr(expr)))
+            self.body(node.children, lines, indent)
+            add("ctx.pop()")
+
+        elif cls is nodes.SpacelessNode:
+            add("_a(_spaceless({}(ctx)).strip())".format(self.function(node.children)))
+
+        elif cls is nodes.TrimNode:
+            add("_a({}(ctx).strip())".format(self.function(node.children)))
+
+        else:
+            raise NotCompilable("Unsupported node type: {}".format(cls.__name__))
+
+    def blocks(self, node, blocks):
+        # same order as Template._register_blocks, so the same block wins for duplicate titles
+        if isinstance(node, nodes.BlockNode):
+            blocks.append((node.title, self.function(node.children)))
+        for child in node.children:
+            self.blocks(child, blocks)
+        return blocks
+
+    def generate(self, root):
+        parent_name = None
+        if root.children and isinstance(root.children[0], nodes.ExtendsNode):
+            parent_name = root.children[0].parent_name
+
+        root_func = self.function(root.children)
+        blocks = self.blocks(root, [])
+        source = "\n".join(self.prelude + self.functions + [
+            "ROOT = {}".format(root_func),
+            "BLOCKS = [{}]".format(", ".join("({!r}, {})".format(title, func) for title, func in blocks))
+        ])
+        code = compile(source, "<ibis:{}>".format(self.template_id), "exec")
+        return code, self.constants, self.tokens, parent_name
+
+
+class CompiledNode:
+
+    def __init__(self, func):
+        self.func = func
+
+    def render(self, context):
+        return self.func(context)
+
+
+class CompiledBlock:
+
+    def __init__(self, func):
+        self.children = [CompiledNode(func)]
+
+
+# Counterpart of the Template class for compiled templates.
+class CompiledTemplate:
+
+    def __init__(self, template_id, code, constants, tokens, parent_name):
+        self.template_id = template_id
+        self.parent_name = parent_name
+        namespace = dict(RUNTIME)
+        namespace["K"] = constants
+        namespace["T"] = [compiler.Token(token_type, text, template_id, line_number)
+                          for token_type, text, line_number in tokens]
+        exec(code, namespace)
+        self.root_node = CompiledNode(namespace["ROOT"])
+        self.blocks = dict((title, CompiledBlock(func)) for title, func in namespace["BLOCKS"])
+
+    def render(self, *pargs, **kwargs):
+        data_dict = pargs[0] if pargs else kwargs
+        strict_mode = kwargs.get("strict_mode", False)
+        context = Context(data_dict, strict_mode)
+        return self._render(context)
+
+    def _render(self, context):
+        context.templates.append(self)
+        if self.parent_name is not None:
+            if ibis.loader:
+                parent_template = ibis.loader(self.parent_name)
+                return parent_template._render(context)
+            else:
+                msg = "No template loader has been specified. A template loader is required "
+                msg += "by the 'extends' tag in template '{}'.".format(self.template_id)
+                raise errors.TemplateLoadError(msg)
+        return self.root_node.render(context)
+
+
+def compile_template(template_string, template_id):
+    root = compiler.compile(template_string, template_id)
+    return CodeGenerator(template_id).generate(root)
+
+
+def cache_file(cache_dir, template_string, template_id):
+    # the template ID goes into the error messages, so it's part of the key; it's also used as prefix to find
+    # outdated files of the same template
+    prefix = hashlib.sha1(template_id.encode("utf-8")).hexdigest()[:10]
+    key = hashlib.sha1("{}\0{}\0{}\0{}".format(VERSION, sys.version, template_id, template_string)
+                       .encode("utf-8")).hexdigest()
+    return prefix, os.path.join(cache_dir, "{}-{}{}".format(prefix, key, CACHE_EXT))
+
+
+def _store(path, prefix, data):
+    try:
+        blob = marshal.dumps(data)
+    except ValueError:
+        # constants that marshal can't handle; such a template is compiled on every run
+        return
+
+    cache_dir = os.path.dirname(path)
+    try:
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        for name in os.listdir(cache_dir):
+            if name.startswith(prefix + "-") and name.endswith(CACHE_EXT):
+                os.remove(os.path.join(cache_dir, name))
+
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.rename(tmp, path)
+    except (IOError, OSError):
+        pass
+
+
+# Returns a CompiledTemplate for template_string, using the code cached in cache_dir if there is any. Falls back to a
+# tree Template for templates the code generator can't handle.
+def load(template_string, template_id, cache_dir=None):
+    path = prefix = None
+    if cache_dir:
+        prefix, path = cache_file(cache_dir, template_string, template_id)
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    return CompiledTemplate(template_id, *marshal.load(f))
+            except Exception:
+                # corrupted or from an incompatible version; regenerate it
+                pass
+
+    try:
+        data = compile_template(template_string, template_id)
+    except NotCompilable:
+        return Template(template_string, template_id)
+
+    if path:
+        _store(path, prefix, data)
+    return CompiledTemplate(template_id, *data)
@@ -5,6 +5,7 @@ import os
 from io import open
 
 from .template import Template
+from . import compiled
 from .errors import TemplateLoadError, raise_
 
 
@@ -27,11 +28,21 @@ from .errors import TemplateLoadError, raise_
 #     template = loader('foo.txt')
 #     template = loader('subdir/foo.txt')
 #
+# With compiled=True templates are compiled to Python code instead of being interpreted (see compiled.py); with a
+# cache_dir the compiled code is also cached on disk between runs.
+#
 class FileLoader:
 
-    def __init__(self, *base_dirs):
+    def __init__(self, *base_dirs, **kwargs):
         self.base_dirs = base_dirs
         self.cache = {}
+        self.cache_dir = kwargs.get('cache_dir')
+        self.compiled = kwargs.get('compiled', False) or bool(self.cache_dir)
+
+    def load(self, template_string, filename):
+        if self.compiled:
+            return compiled.load(template_string, filename, self.cache_dir)
+        return Template(template_string, filename)
 
     def __call__(self, filename):
         if filename in self.cache:
@@ -47,7 +58,7 @@ class FileLoader:
                     msg = "FileLoader cannot load the template file '{}'.".format(path)
                     raise_(TemplateLoadError(msg), err)
 
-                template = Template(template_string, filename)
+                template = self.load(template_string, filename)
                 self.cache[filename] = template
                 return template
 
@@ -171,6 +171,7 @@ class Expression:
         self.func_kwargs = None
         self.is_func_call = False
         self.dyn_args = False
+        self.math_expr = None
         pipe_split = utils.splitc(expr.strip(), '|', strip=True)
         self._parse_primary_expr(pipe_split[0])
         self._parse_filters(pipe_split[1:])
@@ -205,6 +206,8 @@ class Expression:
                             func_args.append(arg)
 
                         self.varstring = lambda *args: apply_math_context(expr, matheval, args)
+                        # kept for the compiled backend
+                        self.math_expr = (expr, matheval)
 
                         self.func_args = func_args
                         self.func_kwargs = {}
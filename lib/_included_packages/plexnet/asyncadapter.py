@@ -1,6 +1,8 @@
 from __future__ import absolute_import
 import time
 import socket
+import threading
+import weakref
 import six
 
 import requests
@@ -35,6 +37,11 @@ WIN_EHOSTUNREACH = 10065
 
 MAX_RETRIES = 3
 
+# shared keep-alive pools: number of hosts (PlexConnection addresses) to keep pools for and the number of idle
+# connections to keep per host
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 6
+
 
 def ABORT_FLAG_FUNCTION():
     return False
@@ -79,6 +86,19 @@ class AsyncTimeout(float):
 DEFAULT_TIMEOUT = AsyncTimeout(10).setConnectTimeout(10)
 
 
+# connections checked out by the request the current thread is sending, see AsyncHTTPAdapter.send
+_CHECKOUTS = threading.local()
+
+
+def _checkedOut(conn):
+    # pooled connections might have been canceled along with a previous request
+    conn._canceled = False
+    checkouts = getattr(_CHECKOUTS, "connections", None)
+    if checkouts is not None:
+        checkouts.append(conn)
+    return conn
+
+
 class AsyncVerifiedHTTPSConnection(VerifiedHTTPSConnection):
     __slots__ = ("_canceled", "deadline", "_timeout")
 
@@ -186,7 +206,8 @@ class AsyncHTTPConnectionPool(HTTPConnectionPool):
 
     def __init__(self, *args, **kwargs):
         HTTPConnectionPool.__init__(self, *args, **kwargs)
-        self.connections = []
+        # weak, so connections dropped by a long lived (shared) pool don't pile up here
+        self.connections = weakref.WeakSet()
 
     def _new_conn(self):
         """
@@ -207,12 +228,15 @@ class AsyncHTTPConnectionPool(HTTPConnectionPool):
             # Mark this connection as not reusable
             conn.auto_open = 0
 
-        self.connections.append(conn)
+        self.connections.add(conn)
 
         return conn
 
+    def _get_conn(self, timeout=None):
+        return _checkedOut(HTTPConnectionPool._get_conn(self, timeout))
+
     def cancel(self):
-        for c in self.connections:
+        for c in list(self.connections):
             c.cancel()
 
 
@@ -221,7 +245,8 @@ class AsyncHTTPSConnectionPool(HTTPSConnectionPool):
 
     def __init__(self, *args, **kwargs):
         HTTPSConnectionPool.__init__(self, *args, **kwargs)
-        self.connections = []
+        # weak, so connections dropped by a long lived (shared) pool don't pile up here
+        self.connections = weakref.WeakSet()
 
     def _new_conn(self):
         """
@@ -242,7 +267,7 @@ class AsyncHTTPSConnectionPool(HTTPSConnectionPool):
             extra_params['strict'] = self.strict
         connection = connection_class(host=actual_host, port=actual_port, timeout=self.timeout.connect_timeout, **extra_params)
 
-        self.connections.append(connection)
+        self.connections.add(connection)
 
         try:
             return self._prepare_conn(connection)
@@ -250,8 +275,11 @@ class AsyncHTTPSConnectionPool(HTTPSConnectionPool):
             # urllib3 2.1.0
             return connection
 
+    def _get_conn(self, timeout=None):
+        return _checkedOut(HTTPSConnectionPool._get_conn(self, timeout))
+
     def cancel(self):
-        for c in self.connections:
+        for c in list(self.connections):
             c.cancel()
 
 
@@ -262,6 +290,10 @@ pool_classes_by_scheme = {
 
 
 class AsyncPoolManager(PoolManager):
+    def __init__(self, *args, **kwargs):
+        PoolManager.__init__(self, *args, **kwargs)
+        self.created = weakref.WeakValueDictionary()
+
     def _new_pool(self, scheme, host, port, request_context=None):
         """
         Create a new :class:`ConnectionPool` based on host, port and scheme.
@@ -277,14 +309,93 @@ class AsyncPoolManager(PoolManager):
             for kw in SSL_KEYWORDS:
                 kwargs.pop(kw, None)
 
-        return pool_cls(host, port, **kwargs)
+        pool = pool_cls(host, port, **kwargs)
+        self.created['{0}://{1}:{2}'.format(scheme, host, port)] = pool
+        return pool
+
+
+class SharedPools(object):
+    """
+    Process wide keep-alive connection pools, one per scheme/host/port, so every PlexConnection gets its own
+    bounded pool of reusable connections no matter which session or request uses it.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._manager = None
+
+    @property
+    def manager(self):
+        with self._lock:
+            if self._manager is None:
+                self._manager = AsyncPoolManager(num_pools=POOL_CONNECTIONS, maxsize=POOL_MAXSIZE,
+                                                 block=DEFAULT_POOLBLOCK)
+            return self._manager
+
+    def stats(self):
+        manager = self._manager
+        if not manager:
+            return {}
+
+        stats = {}
+        for key, pool in list(manager.created.items()):
+            stats[key] = {
+                "connections": pool.num_connections,
+                "requests": pool.num_requests,
+                "reused": max(0, pool.num_requests - pool.num_connections),
+                # the queue is padded with None placeholders
+                "idle": pool.pool and len([c for c in list(pool.pool.queue) if c]) or 0
+            }
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._manager:
+                self._manager.clear()
+                self._manager = None
+
+
+POOLS = SharedPools()
 
 
 class AsyncHTTPAdapter(HTTPAdapter):
+    def __init__(self, *args, **kwargs):
+        self.shared = kwargs.pop("shared", False)
+        HTTPAdapter.__init__(self, *args, **kwargs)
+
     def cancel(self):
         for c in self.connections:
             c.cancel()
 
+        # connections of shared pools the requests in progress have checked out
+        for checkouts in list(self._checkouts):
+            for c in list(checkouts):
+                c.cancel()
+
+    def send(self, request, *args, **kwargs):
+        if not self.shared:
+            return HTTPAdapter.send(self, request, *args, **kwargs)
+
+        # shared pools are used by other requests as well; keep track of our own connections so cancel() can reach
+        # them
+        checkouts = []
+        previous = getattr(_CHECKOUTS, "connections", None)
+        _CHECKOUTS.connections = checkouts
+        self._checkouts.append(checkouts)
+        try:
+            return HTTPAdapter.send(self, request, *args, **kwargs)
+        finally:
+            _CHECKOUTS.connections = previous
+            self._checkouts.remove(checkouts)
+
+    def close(self):
+        if not self.shared:
+            return HTTPAdapter.close(self)
+
+        # the shared pools outlive us, only drop our own proxy pools
+        for proxy in self.proxy_manager.values():
+            proxy.clear()
+        self.proxy_manager.clear()
+
     def init_poolmanager(self, connections, maxsize, block=DEFAULT_POOLBLOCK):
         """Initializes a urllib3 PoolManager. This method should not be called
         from user code, and is only exposed for use when subclassing the
@@ -299,8 +410,12 @@ class AsyncHTTPAdapter(HTTPAdapter):
         self._pool_maxsize = maxsize
         self._pool_block = block
 
-        self.poolmanager = AsyncPoolManager(num_pools=connections, maxsize=maxsize, block=block)
+        if self.shared:
+            self.poolmanager = POOLS.manager
+        else:
+            self.poolmanager = AsyncPoolManager(num_pools=connections, maxsize=maxsize, block=block)
         self.connections = []
+        self._checkouts = []
 
     def get_connection(self, url, proxies=None):
         """Returns a urllib3 connection for the given URL. This should not be
@@ -332,15 +447,19 @@ class AsyncHTTPAdapter(HTTPAdapter):
             url = parsed.geturl()
             conn = self.poolmanager.connection_from_url(url)
 
-        self.connections.append(conn)
+        # shared pools are used by other requests as well; canceling all their connections would cancel those (see
+        # send)
+        if not self.shared:
+            self.connections.append(conn)
         return conn
 
 
 class Session(requests.Session):
     def __init__(self, *args, **kwargs):
+        shared = kwargs.pop("shared", True)
         requests.Session.__init__(self, *args, **kwargs)
-        self.mount('https://', AsyncHTTPAdapter(max_retries=MAX_RETRIES))
-        self.mount('http://', AsyncHTTPAdapter(max_retries=MAX_RETRIES))
+        self.mount('https://', AsyncHTTPAdapter(max_retries=MAX_RETRIES, shared=shared))
+        self.mount('http://', AsyncHTTPAdapter(max_retries=MAX_RETRIES, shared=shared))
 
     def cancel(self):
         for v in self.adapters.values():
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Local seek preview thumbnails from BIF (base index frames) files.
+
+Instead of requesting one thumbnail per seek position from the server, the whole index file of a media part is
+downloaded once in the background when playback starts. Thumbnails are then served from the memory-mapped file:
+the frame for an offset is found by binary search over the index table and written out as a small image file,
+which is what Kodi's image controls need.
+
+BIF layout (all values little-endian uint32):
+    0   magic, 0x89 'BIF' 0x0d 0x0a 0x1a 0x0a
+    8   version
+    12  number of frames
+    16  timestamp multiplier in ms (0 means 1000)
+    64  frame index: (timestamp, file offset) pairs, terminated by (0xffffffff, end of last frame)
+"""
+from __future__ import absolute_import
+import os
+import mmap
+import struct
+import bisect
+import hashlib
+import threading
+
+from . import asyncadapter
+from . import util
+
+MAGIC = b'\x89BIF\r\n\x1a\n'
+HEADER_SIZE = 64
+INDEX_ENTRY = struct.Struct('<II')
+
+
+class BifError(Exception):
+    pass
+
+
+class BifFile(object):
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, mmap.error):
+            self._file.close()
+            raise BifError('Empty or unreadable BIF file')
+
+        try:
+            self._parse()
+        except BifError:
+            self.close()
+            raise
+
+    def _parse(self):
+        if len(self._map) < HEADER_SIZE or self._map[:8] != MAGIC:
+            raise BifError('Not a BIF file')
+
+        version, count, multiplier = struct.unpack_from('<III', self._map, 8)
+        multiplier = multiplier or 1000
+        if HEADER_SIZE + (count + 1) * INDEX_ENTRY.size > len(self._map):
+            raise BifError('Truncated BIF index')
+
+        self.timestamps = []
+        self.offsets = []
+        for x in range(count + 1):
+            timestamp, offset = INDEX_ENTRY.unpack_from(self._map, HEADER_SIZE + x * INDEX_ENTRY.size)
+            if x < count:
+                self.timestamps.append(timestamp * multiplier)
+            self.offsets.append(offset)
+
+        if self.offsets and self.offsets[-1] > len(self._map):
+            raise BifError('Truncated BIF data')
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def frameIndex(self, offset):
+        """
+        Returns the index of the frame shown at offset (ms), or None if there are no frames.
+        """
+        if not self.timestamps:
+            return None
+        return max(0, bisect.bisect_right(self.timestamps, offset) - 1)
+
+    def frame(self, index):
+        if self._map is None:
+            raise ValueError('BIF file closed')
+        return self._map[self.offsets[index]:self.offsets[index + 1]]
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+class BifManager(object):
+    """
+    Downloads and keeps the BIF file of the parts being played. Only the most recent MAX_FILES files are kept on
+    disk; everything is stored below special://temp, so Kodi cleans up after us.
+    """
+    MAX_FILES = 3
+    TIMEOUT = 30
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self):
+        self._path = None
+        self._lock = threading.Lock()
+        self._files = {}
+        self._loading = set()
+        self._order = []
+
+    @property
+    def path(self):
+        if self._path is None:
+            self._path = os.path.join(util.translatePath("special://temp/"), "p4k", "bif")
+            if not os.path.exists(self._path):
+                os.makedirs(self._path)
+        return self._path
+
+    @staticmethod
+    def key(server, indexPath):
+        return hashlib.sha1("{0}:{1}".format(server.uuid, indexPath).encode("utf-8")).hexdigest()
+
+    def load(self, server, indexPath):
+        """
+        Starts the background download of the BIF file at indexPath, unless it's already loaded or loading.
+        Returns the key to pass to thumbnail().
+        """
+        key = self.key(server, indexPath)
+        with self._lock:
+            if key in self._files or key in self._loading:
+                return key
+            self._loading.add(key)
+
+        url = server.buildUrl(indexPath, True)
+        threading.Thread(target=self._load, args=(key, url), name="BIF-LOAD").start()
+        return key
+
+    def _load(self, key, url):
+        path = os.path.join(self.path, key + ".bif")
+        try:
+            if not os.path.exists(path):
+                self._download(url, path)
+
+            bif = BifFile(path)
+        except Exception as e:
+            util.WARN_LOG("BIF: Couldn't load {0}: {1}", util.cleanToken(url), e)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return
+        finally:
+            with self._lock:
+                self._loading.discard(key)
+
+        util.DEBUG_LOG("BIF: Loaded {0} frames from {1}", len(bif), util.cleanToken(url))
+        with self._lock:
+            self._files[key] = bif
+            self._order.append(key)
+            self._prune()
+
+    def _download(self, url, path):
+        res = asyncadapter.Session().get(url, headers=util.BASE_HEADERS.copy(), timeout=self.TIMEOUT, stream=True)
+        res.raise_for_status()
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            for chunk in res.iter_content(self.CHUNK_SIZE):
+                f.write(chunk)
+        os.rename(tmp, path)
+
+    def _prune(self):
+        while len(self._order) > self.MAX_FILES:
+            key = self._order.pop(0)
+            bif = self._files.pop(key)
+            bif.close()
+            for name in os.listdir(self.path):
+                if name.startswith(key):
+                    try:
+                        os.remove(os.path.join(self.path, name))
+                    except OSError:
+                        pass
+
+    def thumbnail(self, key, offset):
+        """
+        Returns the path of an image file with the frame for offset (ms) of a loaded BIF file, or None.
+        """
+        bif = self._files.get(key)
+        if not bif:
+            return None
+
+        index = bif.frameIndex(offset)
+        if index is None:
+            return None
+
+        path = os.path.join(self.path, "{0}.{1}.jpg".format(key, index))
+        if not os.path.exists(path):
+            try:
+                tmp = "{0}.{1}.tmp".format(path, threading.current_thread().ident)
+                with open(tmp, "wb") as f:
+                    f.write(bif.frame(index))
+                os.rename(tmp, path)
+            except (IOError, OSError, ValueError):
+                # ValueError: the file was closed by _prune
+                return None
+        return path
+
+    def close(self):
+        with self._lock:
+            for bif in self._files.values():
+                bif.close()
+            self._files = {}
+            self._order = []
+
+
+MANAGER = BifManager()
@@ -1,5 +1,6 @@
 from __future__ import absolute_import
-import threading
+
+from . import util
 
 
 class Callable(object):
@@ -46,9 +47,7 @@ class Callable(object):
         return cls._currID
 
     def deferCall(self, timeout=0.1):
-        timer = threading.Timer(timeout, self.onDeferCallTimer)
-        timer.name = 'ONDEFERCALLBACK-TIMER:{0}'.format(self.func)
-        timer.start()
+        util.SCHEDULER.callLater(timeout, self.onDeferCallTimer)
 
     def onDeferCallTimer(self):
         self()
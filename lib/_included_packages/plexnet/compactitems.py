@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Compact item representation for large library listings.
+
+PlexObject turns every XML attribute into a PlexValue instance attribute, which for sections with tens of thousands
+of items costs a lot more memory than the data itself. An ItemTable instead stores the attributes library grids
+use in per-attribute columns (low cardinality values are interned, so they're shared between rows) and keeps
+everything else serialized. CompactItem is a lightweight row view that answers the common attributes and cheap
+properties from the columns, and builds the full PlexObject the first time anything else is accessed.
+"""
+from __future__ import absolute_import
+import sys
+import types
+from xml.etree import ElementTree
+
+from . import plexobjects
+from . import exceptions
+
+COLUMNS = (
+    'ratingKey', 'key', 'type', 'title', 'titleSort', 'editionTitle', 'parentTitle', 'grandparentTitle', 'index',
+    'parentIndex', 'year', 'thumb', 'parentThumb', 'grandparentThumb', 'art', 'grandparentArt', 'composite',
+    'duration', 'viewCount', 'viewOffset', 'leafCount', 'viewedLeafCount', 'childCount', 'addedAt',
+    'originallyAvailableAt', 'lastViewedAt', 'rating', 'audienceRating', 'userRating', 'contentRating', 'summary'
+)
+
+# columns with few distinct values; these share one string object between rows
+INTERNED = frozenset((
+    'type', 'parentTitle', 'grandparentTitle', 'index', 'parentIndex', 'year', 'parentThumb', 'grandparentThumb',
+    'grandparentArt', 'viewCount', 'leafCount', 'viewedLeafCount', 'childCount', 'rating', 'audienceRating',
+    'userRating', 'contentRating'
+))
+
+# properties and methods of the item class that only need column data and are evaluated against the row view
+VIEW_ATTRS = frozenset((
+    'defaultTitle', 'defaultThumb', 'defaultArt', 'isWatched', 'isFullyWatched', 'inProgress', 'unViewedLeafCount',
+    'fixedDuration', 'isDirectory', 'isFullObject'
+))
+
+
+class ItemTable(object):
+    def __init__(self, server, initpath, container=None, bytag=False, tag_fallback=False):
+        self.server = server
+        self.initpath = initpath
+        self.container = container
+        self.bytag = bytag
+        self.tagFallback = tag_fallback
+        self.columns = dict((name, []) for name in COLUMNS)
+        self.tags = []
+        self.libtypes = []
+        self.rest = []
+
+    def __len__(self):
+        return len(self.tags)
+
+    def append(self, elem):
+        """
+        Adds an element as a new row and returns its CompactItem. Raises UnknownType like buildItem() does.
+        Column attributes are removed from the element.
+        """
+        attrib = elem.attrib
+        libtype = elem.tag if self.bytag else attrib.get('type')
+        if not libtype and self.tagFallback:
+            libtype = elem.tag
+
+        if libtype not in plexobjects.LIBRARY_TYPES:
+            raise exceptions.UnknownType('Unknown library type: {0}'.format(libtype))
+
+        for name, column in self.columns.items():
+            value = attrib.pop(name, None)
+            if value is not None and name in INTERNED:
+                value = sys.intern(value)
+            column.append(value)
+
+        self.tags.append(sys.intern(elem.tag))
+        self.libtypes.append(sys.intern(libtype))
+        # whatever the columns don't cover (other attributes, Media/Genre/... children) is only needed by the full
+        # object
+        self.rest.append(ElementTree.tostring(elem) if attrib or len(elem) else None)
+        return CompactItem(self, len(self.tags) - 1)
+
+    def value(self, row, name):
+        return self.columns[name][row]
+
+    def itemClass(self, row):
+        cls = plexobjects.LIBRARY_TYPES[self.libtypes[row]]
+        # factories decide the class by looking at the element
+        return isinstance(cls, type) and cls or None
+
+    def materialize(self, row):
+        rest = self.rest[row]
+        elem = rest is not None and ElementTree.fromstring(rest) or ElementTree.Element(self.tags[row])
+        for name, column in self.columns.items():
+            if column[row] is not None:
+                elem.set(name, column[row])
+
+        return plexobjects.buildItem(self.server, elem, self.initpath, self.bytag, self.container, self.tagFallback)
+
+
+class ColumnView(object):
+    """
+    Stands in for an item's __dict__ in PlexObject code that checks for attributes that way.
+    """
+    __slots__ = ("item",)
+
+    def __init__(self, item):
+        self.item = item
+
+    def get(self, attr, default=None):
+        value = self.item.get(attr)
+        return value or default
+
+    def __contains__(self, attr):
+        return bool(self.item.get(attr))
+
+
+class CompactItem(object):
+    __slots__ = ("_table", "_row", "_full")
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+        self._full = None
+
+    def __repr__(self):
+        return '<{0}:{1}:{2}>'.format(self.__class__.__name__, self._table.libtypes[self._row],
+                                      self._table.value(self._row, 'ratingKey'))
+
+    @property
+    def __dict__(self):
+        return ColumnView(self)
+
+    @property
+    def server(self):
+        return self._table.server
+
+    @property
+    def container(self):
+        return self._table.container
+
+    @property
+    def initpath(self):
+        return self._full is not None and self._full.initpath or self._table.initpath
+
+    @property
+    def name(self):
+        return self._table.tags[self._row]
+
+    def _local(self, attr):
+        return self.__dict__.get(attr)
+
+    def full(self):
+        """
+        Returns the full PlexObject for this row, building it on first use.
+        """
+        if self._full is None:
+            self._full = self._table.materialize(self._row)
+        return self._full
+
+    def get(self, attr, default=''):
+        if self._full is None and attr in self._table.columns:
+            value = self._table.value(self._row, attr)
+            return plexobjects.PlexValue(value or default, self)
+        return self.full().get(attr, default)
+
+    def __getattr__(self, attr):
+        if attr.startswith('__') or attr in CompactItem.__slots__:
+            raise AttributeError(attr)
+
+        if self._full is not None:
+            return getattr(self._full, attr)
+
+        if attr in self._table.columns:
+            value = self._table.value(self._row, attr)
+            ret = plexobjects.PlexValue(value or '', self)
+            ret.NA = value is None
+            return ret
+
+        cls = self._table.itemClass(self._row)
+        if cls is not None:
+            for klass in cls.__mro__:
+                if attr in klass.__dict__:
+                    obj = klass.__dict__[attr]
+                    if attr in VIEW_ATTRS:
+                        if isinstance(obj, property):
+                            return obj.fget(self)
+                        elif isinstance(obj, types.FunctionType):
+                            return types.MethodType(obj, self)
+                    elif not hasattr(obj, '__get__'):
+                        # plain class attributes such as TYPE
+                        return obj
+                    break
+
+        return getattr(self.full(), attr)
+
+    def __setattr__(self, attr, value):
+        if attr in CompactItem.__slots__:
+            object.__setattr__(self, attr, value)
+        else:
+            setattr(self.full(), attr, value)
+
+
+def fullItem(item):
+    """
+    Returns the full PlexObject for item, which may be a CompactItem.
+    """
+    return isinstance(item, CompactItem) and item.full() or item
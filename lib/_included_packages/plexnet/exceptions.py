@@ -10,6 +10,10 @@ class UnknownType(Exception):
     pass
 
 
+class IncompleteResponse(Exception):
+    pass
+
+
 class Unsupported(Exception):
     pass
 
@@ -1,7 +1,8 @@
 from __future__ import absolute_import
 import threading
+import selectors
 import socket
-import traceback
+import json
 import time
 from . import util
 from . import netif
@@ -11,11 +12,17 @@ from . import plexconnection
 DISCOVERY_PORT = 32414
 WIN_NL = chr(13) + chr(10)
 
+DISCOVERY_TIMEOUT = 5  # seconds to wait for responses
+MIN_DISCOVERY_TIME = 1  # wait at least this long for unknown servers, even if all known servers have answered
+CACHE_TTL = 7 * 24 * 3600  # seconds a discovered server is remembered if there hasn't been a discovery since
+CACHE_REGISTRY = "GDMServers"
+
 
 class GDMDiscovery(object):
     def __init__(self):
         self._close = False
         self.thread = None
+        self.servers = None
 
     # def isActive(self):
     #     util.LOG('GDMDiscovery().isActive() - NOT IMPLEMENTED')
@@ -125,72 +132,133 @@ class GDMDiscovery(object):
         if not util.INTERFACE.getPreference("gdm_discovery", True) or self.isActive():
             return
 
-        self.thread = threading.Thread(target=self._discover)
+        self._close = False
+        self.thread = threading.Thread(target=self._discover, name="GDM-DISCOVERY")
         self.thread.start()
 
+    def _loadCache(self):
+        """
+        Returns {machineID: entry} of the servers found by previous discoveries that haven't expired.
+        """
+        try:
+            cache = json.loads(util.INTERFACE.getRegistry(CACHE_REGISTRY) or "{}")
+        except ValueError:
+            return {}
+
+        now = time.time()
+        return dict((machineID, entry) for machineID, entry in cache.items() if now - entry["seen"] < CACHE_TTL)
+
+    def _storeCache(self, cache):
+        util.INTERFACE.setRegistry(CACHE_REGISTRY, json.dumps(cache))
+
     def _discover(self):
         ifaces = netif.getInterfaces()
         sockets = []
         self.servers = []
+        # machineID: entry
+        cache = self._loadCache()
+        found = {}
 
-        packet = ("M-SEARCH * HTTP/1.1" + WIN_NL + WIN_NL).encode("utf-8")
-
-        for i in ifaces:
-            if not i.broadcast:
-                continue
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.settimeout(0.01)  # 10ms
-            s.bind((i.ip, 0))
-            s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            sockets.append((s, i))
+        # LAN servers are usable right away from the last discoveries; they're tested like any other and whatever
+        # doesn't answer this time is dropped by discoveryFinished
+        for machineID, entry in cache.items():
+            util.DEBUG_LOG("Using cached GDM server {0} at {1}", repr(entry["name"]), entry["host"])
+            self.reportServer(self.createServer(entry["host"], entry["port"], entry["name"], machineID,
+                                                entry["secureHost"]), cached=True)
 
-        success = False
-
-        for attempt in (0, 1):
+        packet = ("M-SEARCH * HTTP/1.1" + WIN_NL + WIN_NL).encode("utf-8")
+        selector = selectors.DefaultSelector()
+
+        try:
+            for i in ifaces:
+                if not i.broadcast:
+                    continue
+                s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                s.setblocking(False)
+                s.bind((i.ip, 0))
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+                sockets.append((s, i))
+                selector.register(s, selectors.EVENT_READ)
+
+            success = False
+
+            for attempt in (0, 1):
+                for s, i in sockets:
+                    if self._close:
+                        return
+                    util.DEBUG_LOG('  o-> Broadcasting to {0}: {1}', i.name, i.broadcast)
+                    try:
+                        s.sendto(packet, (i.broadcast, DISCOVERY_PORT))
+                        success = True
+                    except:
+                        util.ERROR()
+
+                if success:
+                    break
+
+            start = time.time()
+            end = start + DISCOVERY_TIMEOUT
+            while sockets and not self._close:
+                now = time.time()
+                if now >= end:
+                    break
+
+                if cache and now - start >= MIN_DISCOVERY_TIME and all(machineID in found for machineID in cache):
+                    util.DEBUG_LOG("All known GDM servers answered, finishing early")
+                    break
+
+                # wake up now and then to notice close()
+                for key, events in selector.select(min(end - now, 0.25)):
+                    # read everything that has arrived
+                    while True:
+                        try:
+                            message, address = key.fileobj.recvfrom(4096)
+                        except (BlockingIOError, InterruptedError):
+                            break
+                        except socket.error:
+                            util.ERROR()
+                            break
+
+                        entry = self.onSocketEvent(message, address)
+                        if entry:
+                            found[entry[0]] = entry[1]
+        finally:
+            selector.close()
             for s, i in sockets:
-                if self._close:
-                    return
-                util.DEBUG_LOG('  o-> Broadcasting to {0}: {1}', i.name, i.broadcast)
-                try:
-                    s.sendto(packet, (i.broadcast, DISCOVERY_PORT))
-                    success = True
-                except:
-                    util.ERROR()
+                s.close()
 
-            if success:
-                break
+        if self._close:
+            return
 
-        end = time.time() + 5
+        # servers that didn't answer aren't worth waiting for next time
+        if found or cache:
+            self._storeCache(found)
 
-        while time.time() < end:
-            for s, i in sockets:
-                if self._close:
-                    return
-                try:
-                    message, address = s.recvfrom(4096)
-                    self.onSocketEvent(message, address)
-                except socket.timeout:
-                    pass
-                except:
-                    traceback.print_exc()
-
-        self.discoveryFinished()
+        self.discoveryFinished(force=bool(cache))
 
     def onSocketEvent(self, message, addr):
+        """
+        Reports the server in a GDM response and returns (machineID, cache entry) for it, or None.
+        """
         util.DEBUG_LOG('Received GDM message:\n' + str(message))
 
         hostname = addr[0]  # socket.gethostbyaddr(addr[0])[0]
 
         name = parseFieldValue(message, b"Name: ")
-        port = parseFieldValue(message, b"Port: ") or b"32400"
+        port = parseFieldValue(message, b"Port: ") or "32400"
         machineID = parseFieldValue(message, b"Resource-Identifier: ")
         secureHost = parseFieldValue(message, b"Host: ")
 
         util.DEBUG_LOG("Received GDM response for " + repr(name) + " at http://" + hostname + ":" + port)
 
         if not name or not machineID:
-            return
+            return None
 
+        self.reportServer(self.createServer(hostname, port, name, machineID, secureHost))
+        return machineID, {"host": hostname, "port": port, "name": name, "secureHost": secureHost,
+                           "seen": time.time()}
+
+    def createServer(self, hostname, port, name, machineID, secureHost):
         from . import plexserver
         conn = plexconnection.PlexConnection(plexconnection.PlexConnection.SOURCE_DISCOVERED, "http://" + hostname + ":" + port, True, None, bool(secureHost))
         server = plexserver.createPlexServerForConnection(conn)
@@ -209,13 +277,22 @@ class GDMDiscovery(object):
                 )
             )
 
-        self.servers.append(server)
+        return server
+
+    def reportServer(self, server, cached=False):
+        # only servers that answered count for discoveryFinished
+        if not cached:
+            self.servers.append(server)
+
+        from . import plexapp
+        plexapp.SERVERMANAGER.updateFromDiscovery(server)
 
-    def discoveryFinished(self, *args, **kwargs):
-        # Time's up, report whatever we found
+    def discoveryFinished(self, force=False, *args, **kwargs):
+        # Time's up, report whatever we found; force: also when nothing was found, to drop cached servers that
+        # didn't answer
         self.close()
 
-        if self.servers:
+        if self.servers or force:
             util.LOG("Finished GDM discovery, found {0} server(s)", len(self.servers))
             from . import plexapp
             plexapp.SERVERMANAGER.updateFromConnectionType(self.servers, plexconnection.PlexConnection.SOURCE_DISCOVERED)
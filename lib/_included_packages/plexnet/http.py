@@ -7,12 +7,13 @@ import requests
 import socket
 import urllib3
 import datetime
-from . import threadutils
+import threading
 import six.moves.urllib.request, six.moves.urllib.parse, six.moves.urllib.error
 import mimetypes
 import functools
 from . import plexobjects
 from xml.etree import ElementTree
+from collections import deque
 
 from . import asyncadapter
 
@@ -58,11 +59,11 @@ socket.getaddrinfo = pgetaddrinfo
 
 
 def GET(*args, **kwargs):
-    return requests.get(*args, headers=util.BASE_HEADERS.copy(), timeout=DEFAULT_TIMEOUT, **kwargs)
+    return asyncadapter.Session().get(*args, headers=util.BASE_HEADERS.copy(), timeout=DEFAULT_TIMEOUT, **kwargs)
 
 
 def POST(*args, **kwargs):
-    return requests.post(*args, headers=util.BASE_HEADERS.copy(), timeout=DEFAULT_TIMEOUT, **kwargs)
+    return asyncadapter.Session().post(*args, headers=util.BASE_HEADERS.copy(), timeout=DEFAULT_TIMEOUT, **kwargs)
 
 
 def Session():
@@ -73,6 +74,105 @@ def Session():
     return s
 
 
+class RequestDispatcher(object):
+    """
+    Runs async requests on a bounded set of reused worker threads instead of starting a thread per request; bursts
+    (e.g. reachability tests, timeline updates, resource refreshes) beyond MAX_WORKERS are queued and served in
+    order. Connections come from the shared keep-alive pools (asyncadapter.POOLS). Workers are started on demand and
+    go away when they've been idle for a while.
+    """
+    MAX_WORKERS = 32
+    IDLE_TIMEOUT = 30
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._queue = deque()
+        self._workers = []
+        self._idle = 0
+        self._abort = False
+        self.served = 0
+        self.canceled = 0
+        self.maxQueued = 0
+
+    def submit(self, request, args, kwargs):
+        with self._lock:
+            if self._abort:
+                return False
+
+            self._queue.append((request, args, kwargs))
+            self.maxQueued = max(self.maxQueued, len(self._queue))
+            # idle workers count themselves out once they're awake, so only start a new one if there are more queued
+            # requests than idle workers to serve them
+            self._wakeup.notify()
+            if len(self._queue) > self._idle and len(self._workers) < self.MAX_WORKERS:
+                worker = threading.Thread(target=self._work, name="HTTP-ASYNC-{0}".format(len(self._workers)))
+                worker.daemon = True
+                self._workers.append(worker)
+                worker.start()
+        return True
+
+    def _work(self):
+        try:
+            self._serve()
+        finally:
+            with self._lock:
+                self._workers.remove(threading.current_thread())
+
+    def _next(self):
+        with self._lock:
+            while not self._queue:
+                if self._abort:
+                    return None
+
+                self._idle += 1
+                try:
+                    notified = self._wakeup.wait(self.IDLE_TIMEOUT)
+                finally:
+                    self._idle -= 1
+
+                if not notified and not self._queue:
+                    return None
+
+            return self._queue.popleft()
+
+    def _serve(self):
+        while not self._abort:
+            item = self._next()
+            if item is None:
+                return
+
+            request, args, kwargs = item
+            # canceled while queued
+            if request._cancel:
+                self.canceled += 1
+                continue
+
+            try:
+                request._startAsync(*args, **kwargs)
+            except Exception:
+                util.ERROR()
+            self.served += 1
+
+    def stats(self):
+        return {
+            "workers": len(self._workers),
+            "queued": len(self._queue),
+            "maxQueued": self.maxQueued,
+            "served": self.served,
+            "canceled": self.canceled
+        }
+
+    def shutdown(self):
+        with self._lock:
+            self._abort = True
+            self._queue.clear()
+            self._wakeup.notify_all()
+
+
+DISPATCHER = RequestDispatcher()
+
+
 class RequestContext(dict):
     def __getattr__(self, attr):
         return self.get(attr)
@@ -83,7 +183,7 @@ class RequestContext(dict):
 
 class HttpRequest(object):
     __slots__ = ("server", "path", "hasParams", "ignoreResponse", "session", "currentResponse", "method", "url",
-                 "thread", "__dict__")
+                 "__dict__")
     _cancel = False
 
     def __init__(self, url, method=None):
@@ -96,7 +196,6 @@ class HttpRequest(object):
         self.currentResponse = None
         self.method = method
         self.url = url
-        self.thread = None
 
         # Use a specific CA cert bundle if applicable
         if util.USE_CERT_BUNDLE != "system" and url[:5] == "https":
@@ -116,9 +215,7 @@ class HttpRequest(object):
         util.APP.delRequest(self)
 
     def startAsync(self, *args, **kwargs):
-        self.thread = threadutils.KillableThread(target=self._startAsync, args=args, kwargs=kwargs, name='HTTP-ASYNC:{0}'.format(self.url))
-        self.thread.start()
-        return True
+        return DISPATCHER.submit(self, args, kwargs)
 
     def _startAsync(self, body=None, contentType=None, context=None):
         timeout = context and context.timeout or DEFAULT_TIMEOUT
@@ -155,11 +252,15 @@ class HttpRequest(object):
         except asyncadapter.CanceledException:
             return
         except (urllib3.exceptions.ProtocolError, requests.exceptions.ConnectionError):
+            # let the caller know it failed
+            self.onResponse(None, context)
             self.removeAsPending()
             return
         except Exception as e:
             util.ERROR('Request failed {0}'.format(util.cleanToken(self.url)))
             if not hasattr(e, 'response'):
+                self.onResponse(None, context)
+                self.removeAsPending()
                 return
             res = e.response
 
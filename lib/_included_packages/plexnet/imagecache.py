@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+Bounded on-disk cache for images (photos, posters, art) fetched from Plex servers.
+
+Files are content-addressed: the index maps a URL key (the URL without its token, so a different user or a renewed
+token doesn't invalidate it) to the SHA1 of the image data, and identical images requested through different URLs
+share one file. The index is bounded by the total size of the stored files with LRU eviction and persisted across
+sessions. Images can be prefetched by a small pool of worker threads; a synchronous get() for an URL that's being
+prefetched waits for that download instead of starting another one.
+"""
+from __future__ import absolute_import
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict, deque
+
+from . import asyncadapter
+from . import util
+
+# index entry fields
+E_DIGEST, E_SIZE, E_ACCESS = range(3)
+
+TOKEN_RE = re.compile(r'[?&]X-Plex-Token=[^&]*')
+
+
+class ImageCache(object):
+    MAX_SIZE = 200 * 1024 * 1024  # bytes
+    TIMEOUT = 10
+    PREFETCH_WORKERS = 3
+    MAX_PENDING = 200  # queued prefetch downloads; the oldest requests are dropped first
+    INDEX_NAME = "index.json"
+
+    def __init__(self):
+        self._path = None
+        self._index = None
+        self._refs = {}
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._inflight = {}
+        self._pending = deque()
+        self._pendingEvent = threading.Event()
+        self._workers = []
+        self._abort = False
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytesSaved = 0
+        self.bytesLoaded = 0
+        self.prefetched = 0
+        self.evictions = 0
+
+    @property
+    def path(self):
+        if self._path is None:
+            self._path = os.path.join(util.translatePath(util.ADDON.getAddonInfo("profile")), "image_cache")
+            if not os.path.exists(self._path):
+                os.makedirs(self._path)
+        return self._path
+
+    @property
+    def index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._loadIndex()
+        return self._index
+
+    def _loadIndex(self):
+        self._index = OrderedDict()
+        self._refs = {}
+        self.size = 0
+        try:
+            with open(os.path.join(self.path, self.INDEX_NAME)) as f:
+                entries = json.load(f)
+        except (IOError, OSError, ValueError):
+            entries = {}
+
+        # oldest access first
+        for key, entry in sorted(entries.items(), key=lambda x: x[1][E_ACCESS]):
+            if os.path.exists(self._file(entry[E_DIGEST])):
+                self._index[key] = entry
+                self._addRef(entry)
+
+        self._removeOrphans()
+
+    def _removeOrphans(self):
+        # images written after the index was last stored (e.g. Kodi killed us on shutdown) aren't accounted for
+        for name in os.listdir(self.path):
+            digest, ext = os.path.splitext(name)
+            if name == self.INDEX_NAME or ext == ".img" and digest in self._refs:
+                continue
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+
+    def _file(self, digest):
+        return os.path.join(self.path, digest + ".img")
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha1(TOKEN_RE.sub('', url).encode("utf-8")).hexdigest()
+
+    def _addRef(self, entry):
+        digest = entry[E_DIGEST]
+        if digest not in self._refs:
+            self.size += entry[E_SIZE]
+        self._refs[digest] = self._refs.get(digest, 0) + 1
+
+    def _remove(self, key):
+        entry = self.index.pop(key, None)
+        if entry:
+            self._dirty = True
+            self._release(entry)
+
+    def _release(self, entry):
+        digest = entry[E_DIGEST]
+        self._refs[digest] -= 1
+        if self._refs[digest]:
+            return
+
+        del self._refs[digest]
+        self.size -= entry[E_SIZE]
+        try:
+            os.remove(self._file(digest))
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self.size > self.MAX_SIZE and self.index:
+            self._remove(next(iter(self.index)))
+            self.evictions += 1
+
+    def lookup(self, url):
+        """
+        Returns the local path for url if it's cached, without touching the network.
+        """
+        if not url:
+            return None
+
+        key = self.key(url)
+        with self._lock:
+            entry = self.index.get(key)
+            path = entry and self._file(entry[E_DIGEST])
+            if not path or not os.path.exists(path):
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            entry[E_ACCESS] = time.time()
+            self.index.move_to_end(key)
+            self._dirty = True
+            self.hits += 1
+            self.bytesSaved += entry[E_SIZE]
+            return path
+
+    def get(self, url):
+        """
+        Returns the local path for url, downloading the image if it isn't cached. Returns None on failure.
+        """
+        return self.lookup(url) or url and self._fetch(url) or None
+
+    def _fetch(self, url):
+        key = self.key(url)
+        with self._lock:
+            event = self._inflight.get(key)
+            if event is None:
+                self._inflight[key] = threading.Event()
+
+        if event is not None:
+            # somebody else is downloading this already
+            event.wait(self.TIMEOUT)
+            entry = self.index.get(key)
+            return entry and self._file(entry[E_DIGEST]) or None
+
+        try:
+            return self._download(key, url)
+        finally:
+            with self._lock:
+                self._inflight.pop(key).set()
+
+    def _download(self, key, url):
+        try:
+            res = asyncadapter.Session().get(url, headers=util.BASE_HEADERS.copy(), timeout=self.TIMEOUT)
+            res.raise_for_status()
+            data = res.content
+        except Exception as e:
+            util.WARN_LOG("Couldn't load image {0}: {1}", util.cleanToken(url), e)
+            return None
+
+        if not data:
+            return None
+
+        digest = hashlib.sha1(data).hexdigest()
+        path = self._file(digest)
+        with self._lock:
+            # load the index (and with it _refs) before writing, or the new file would be dropped as an orphan
+            old = self.index.get(key)
+            if digest not in self._refs:
+                try:
+                    tmp = path + ".tmp"
+                    with open(tmp, "wb") as f:
+                        f.write(data)
+                    os.rename(tmp, path)
+                except (IOError, OSError):
+                    util.ERROR("Couldn't write image cache entry")
+                    return None
+
+            if old and old[E_DIGEST] == digest:
+                old[E_ACCESS] = time.time()
+                self.index.move_to_end(key)
+                self._dirty = True
+                return path
+
+            # reference the new file before releasing the old entry, which might share it
+            entry = [digest, len(data), time.time()]
+            self._addRef(entry)
+            if old:
+                del self.index[key]
+                self._release(old)
+            self.index[key] = entry
+            self.bytesLoaded += len(data)
+            self._dirty = True
+            self._evict()
+
+        return path
+
+    def prefetch(self, urls, callback=None):
+        """
+        Downloads urls that aren't cached in the background. callback(url, path) is called from a worker thread
+        for each image that was downloaded successfully.
+        """
+        with self._lock:
+            if self._abort:
+                # shut down
+                return
+
+            # newest requests are served first, in the order given
+            for url in reversed(urls):
+                if url and self.key(url) not in self.index:
+                    self._pending.append((url, callback))
+
+            while len(self._pending) > self.MAX_PENDING:
+                self._pending.popleft()
+
+            if not self._pending:
+                return
+
+            self._pendingEvent.set()
+            self._workers = [w for w in self._workers if w.is_alive()]
+            for x in range(len(self._workers), self.PREFETCH_WORKERS):
+                worker = threading.Thread(target=self._prefetchLoop, name="IMAGE-PREFETCH-{0}".format(x))
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+
+    def cancelPrefetch(self):
+        with self._lock:
+            self._pending.clear()
+
+    def _prefetchLoop(self):
+        while not self._abort:
+            with self._lock:
+                if self._pending:
+                    url, callback = self._pending.pop()
+                else:
+                    url = None
+                    self._pendingEvent.clear()
+
+            if url is None:
+                # idle workers go away
+                if not self._pendingEvent.wait(10):
+                    return
+                continue
+
+            if self.key(url) in self.index:
+                continue
+
+            path = self._fetch(url)
+            if path:
+                self.prefetched += 1
+                if callback and not self._abort:
+                    try:
+                        callback(url, path)
+                    except Exception:
+                        util.ERROR()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.index),
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytesSaved": self.bytesSaved,
+            "bytesLoaded": self.bytesLoaded,
+            "prefetched": self.prefetched,
+            "evictions": self.evictions,
+            "hitRatio": total and float(self.hits) / total or 0.0
+        }
+
+    def store(self):
+        with self._lock:
+            if not self._dirty or self._index is None:
+                return
+
+            try:
+                with open(os.path.join(self.path, self.INDEX_NAME), "w") as f:
+                    json.dump(self._index, f)
+                self._dirty = False
+            except (IOError, OSError):
+                util.ERROR("Couldn't write image cache index")
+
+        util.DEBUG_LOG("Image cache stats: {0}", lambda: self.stats())
+
+    def shutdown(self):
+        self._abort = True
+        self.cancelPrefetch()
+        self._pendingEvent.set()
+        self.store()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self.index.keys()):
+                self._remove(key)
+            self.store()
+
+
+CACHE = ImageCache()
@@ -1,20 +1,25 @@
 # Most of this is ported from Roku code and much of it is currently unused
 # TODO: Perhaps remove unnecessary code
 from __future__ import absolute_import
+import json
 import time
+import threading
+from collections import OrderedDict
 
 from . import util
-from six import moves
-import six.moves.urllib.request, six.moves.urllib.parse, six.moves.urllib.error
-import six.moves.urllib.parse
 from . import plexrequest
 from . import callback
-from . import http
+
+# seconds between periodic timeline updates by playback state; state changes are always sent right away
+TIMELINE_INTERVALS = {"playing": 15, "buffering": 15, "paused": 30}
+DEFAULT_TIMELINE_INTERVAL = 15
+MAX_TIMELINE_INTERVAL = 120
+SLOW_RTT = 1.0  # seconds; slower servers get fewer updates
 
 
 class ServerTimeline(util.AttributeDict):
-    def reset(self):
-        self.expires = time.time() + 15
+    def reset(self, interval=DEFAULT_TIMELINE_INTERVAL):
+        self.expires = time.time() + interval
 
     def isExpired(self):
         return time.time() > self.get('expires', 0)
@@ -61,6 +66,135 @@ class TimelineData(util.AttributeDict):
                 self.controllableStr += name
 
 
+class TimelineReporter(object):
+    """
+    Sends the timeline updates for one server, one request at a time. Updates submitted while a request is in
+    flight are queued, and a newer update for the same timeline type replaces the queued one. Final (stopped)
+    updates the server couldn't be reached for are persisted and replayed once it's reachable again, so
+    scrobbles don't get lost. Nothing here blocks the caller on the network.
+    """
+    REGISTRY_KEY = "PendingTimelines"
+    MAX_REPLAY = 20
+    RTT_WEIGHT = 0.3
+    WATCHDOG_GRACE = 5  # seconds past the request timeout after which a request without response counts as failed
+
+    def __init__(self, server):
+        self.server = server
+        self.lock = threading.RLock()
+        self.inFlight = False
+        self.current = None
+        self.pending = OrderedDict()
+        self.rtt = None
+        self.failures = 0
+        self.superseded = 0
+
+    def interval(self, state):
+        interval = TIMELINE_INTERVALS.get(state, DEFAULT_TIMELINE_INTERVAL)
+        if self.rtt is not None and self.rtt > SLOW_RTT:
+            interval *= 2
+        return min(MAX_TIMELINE_INTERVAL, interval * 2 ** min(self.failures, 3))
+
+    def submit(self, timelineType, params, playQueue=None):
+        with self.lock:
+            if timelineType in self.pending:
+                self.superseded += 1
+                del self.pending[timelineType]
+            self.pending[timelineType] = (params, playQueue)
+            if not self.inFlight:
+                self._sendNext()
+
+    def _sendNext(self):
+        if not self.pending:
+            return
+
+        slot, (params, playQueue) = self.pending.popitem(last=False)
+        self.inFlight = True
+
+        request = plexrequest.PlexRequest(self.server, "/:/timeline" + util.joinArgs(params))
+        context = request.createRequestContext("timelineUpdate", callback.Callable(self.onResponse))
+        context.playQueue = playQueue
+        context.timelineParams = params
+        context.replay = slot.startswith("replay")
+        context.sentAt = time.time()
+        self.current = context
+        # canceled requests don't call back; don't wait for them forever
+        util.SCHEDULER.callLater(context.timeout + self.WATCHDOG_GRACE, self.onWatchdog, context)
+        util.APP.startRequest(request, context)
+
+    def onWatchdog(self, context):
+        with self.lock:
+            if self.current is not context:
+                return
+
+        util.WARN_LOG("Timeline: no response from {0}, giving up on the request", self.server.name)
+        self.onResponse(None, None, context)
+
+    def onResponse(self, request, response, context):
+        status = response and response.getStatus() or 0
+        # 4xx: the server got it and didn't like it, retrying won't help
+        delivered = 200 <= status < 500
+
+        with self.lock:
+            if self.current is not context:
+                # the watchdog gave up on it already
+                return
+
+            self.current = None
+            self.inFlight = False
+            if delivered:
+                rtt = time.time() - context.sentAt
+                self.rtt = rtt if self.rtt is None else self.rtt + self.RTT_WEIGHT * (rtt - self.rtt)
+                self.failures = 0
+            else:
+                self.failures += 1
+                if context.timelineParams.get("state") == "stopped":
+                    util.DEBUG_LOG("Timeline: couldn't report stopped state to {0}, storing it for later",
+                                   self.server.name)
+                    self.store([context.timelineParams])
+
+        if not context.replay and response is not None:
+            self.server.trigger("np:timelineResponse", response=response)
+
+            if context.playQueue and context.playQueue.refreshOnTimeline:
+                context.playQueue.refreshOnTimeline = False
+                context.playQueue.refresh(False)
+
+        with self.lock:
+            if delivered and not self.pending:
+                self.queueReplays()
+            if not self.inFlight:
+                self._sendNext()
+
+    def _loadStored(self):
+        try:
+            return json.loads(util.INTERFACE.getRegistry(self.REGISTRY_KEY, "{}"))
+        except ValueError:
+            return {}
+
+    def store(self, timelines):
+        stored = self._loadStored()
+        entries = stored.get(self.server.uuid, []) + timelines
+        stored[self.server.uuid] = entries[-self.MAX_REPLAY:]
+        util.INTERFACE.setRegistry(self.REGISTRY_KEY, json.dumps(stored))
+
+    def queueReplays(self):
+        stored = self._loadStored()
+        entries = stored.pop(self.server.uuid, None)
+        if not entries:
+            return
+
+        util.LOG("Timeline: replaying {0} stored timeline updates to {1}", len(entries), self.server.name)
+        util.INTERFACE.setRegistry(self.REGISTRY_KEY, json.dumps(stored))
+        for i, params in enumerate(entries):
+            self.pending["replay{0}".format(i)] = (params, None)
+
+    def replay(self):
+        with self.lock:
+            self.queueReplays()
+            if not self.inFlight:
+                self._sendNext()
+
+
 class NowPlayingManager(object):
     def __init__(self):
         # Constants
@@ -71,6 +205,7 @@ class NowPlayingManager(object):
         self.TIMELINE_TYPES = ["video", "music", "photo"]
 
         # Members
+        self.reporters = {}
         self.serverTimelines = util.AttributeDict()
         self.subscribers = util.AttributeDict()
         self.pollReplies = util.AttributeDict()
@@ -130,7 +265,8 @@ class NowPlayingManager(object):
         if itemsEqual and timeline.state == serverTimeline.state and not serverTimeline.isExpired() and not force:
             return
 
-        serverTimeline.reset()
+        reporter = self.getReporter(server)
+        serverTimeline.reset(reporter.interval(timeline.state))
         serverTimeline.itemData = timeline.itemData
         serverTimeline.state = timeline.state
 
@@ -140,28 +276,37 @@ class NowPlayingManager(object):
         if t > duration:
             t = duration
 
-        params = util.AttributeDict()
-        params["time"] = t
-        params["duration"] = duration
-        params["state"] = timeline.state
-        params["guid"] = timeline.itemData.guid
-        params["ratingKey"] = timeline.itemData.ratingKey
-        params["url"] = timeline.itemData.url
-        params["key"] = timeline.itemData.key
-        params["containerKey"] = timeline.itemData.containerKey
-        if timeline.playQueue:
-            params["playQueueItemID"] = timeline.playQueue.selectedId
-
-        path = "/:/timeline"
-        for paramKey in params:
-            if params[paramKey]:
-                path = http.addUrlParam(path, paramKey + "=" + six.moves.urllib.parse.quote(str(params[paramKey])))
-
-        request = plexrequest.PlexRequest(server, path)
-
-        context = request.createRequestContext("timelineUpdate", callback.Callable(self.onTimelineResponse))
-        context.playQueue = timeline.playQueue
-        util.APP.startRequest(request, context)
+        params = {
+            "time": t,
+            "duration": duration,
+            "state": timeline.state,
+            "guid": timeline.itemData.guid,
+            "ratingKey": timeline.itemData.ratingKey,
+            "url": timeline.itemData.url,
+            "key": timeline.itemData.key,
+            "containerKey": timeline.itemData.containerKey,
+            "playQueueItemID": timeline.playQueue and timeline.playQueue.selectedId
+        }
+        # plain strings, so the update can be persisted if it needs to be replayed
+        params = dict((k, str(v)) for k, v in params.items() if v)
+
+        reporter.submit(timelineType, params, timeline.playQueue)
+
+    def getReporter(self, server):
+        reporter = self.reporters.get(server.uuid)
+        if not reporter or reporter.server is not server:
+            reporter = self.reporters[server.uuid] = TimelineReporter(server)
+        return reporter
+
+    def replayTimelines(self, server):
+        """
+        Sends timeline updates stored while server was unreachable.
+        """
+        self.getReporter(server).replay()
+
+    def onSelectedServerChanged(self, server=None, **kwargs):
+        if server:
+            self.replayTimelines(server)
 
     def getServerTimeline(self, timelineType):
         if not self.serverTimelines.get(timelineType):
@@ -174,11 +319,3 @@ class NowPlayingManager(object):
 
     def nowPlayingSetControllable(self, timelineType, name, isControllable):
         self.timelines[timelineType].setControllable(name, isControllable)
-
-    def onTimelineResponse(self, request, response, context):
-        context.request.server.trigger("np:timelineResponse", response=response)
-
-        if not context.playQueue or not context.playQueue.refreshOnTimeline:
-            return
-        context.playQueue.refreshOnTimeline = False
-        context.playQueue.refresh(False)
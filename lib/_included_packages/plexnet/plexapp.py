@@ -39,6 +39,7 @@ class App(signalsmixin.SignalsMixin):
         self.timers = []
         from . import nowplayingmanager
         self.nowplayingmanager = nowplayingmanager.NowPlayingManager()
+        self.on('change:selectedServer', self.nowplayingmanager.onSelectedServerChanged)
 
     def addTimer(self, timer):
         self.timers.append(timer)
@@ -113,14 +114,22 @@ class App(signalsmixin.SignalsMixin):
                 if p:
                     p.request.cancel()
 
+        util.DEBUG_LOG('Async request stats: {0}', lambda: http.DISPATCHER.stats())
+        http.DISPATCHER.shutdown()
+
         if self.timers:
             util.DEBUG_LOG('Canceling App() timers...')
             self.cancelAllTimers()
+        util.DEBUG_LOG('Timer stats: {0}', lambda: util.SCHEDULER.stats())
 
         if SERVERMANAGER.selectedServer:
             util.DEBUG_LOG('Closing server...')
             SERVERMANAGER.selectedServer.close()
 
+        from . import asyncadapter
+        util.DEBUG_LOG('HTTP pool stats: {0}', lambda: asyncadapter.POOLS.stats())
+        asyncadapter.POOLS.close()
+
     def shutdown(self):
         if self.timers:
             util.DEBUG_LOG('Waiting for {0} App() timers: Started', lambda: len(self.timers))
@@ -132,6 +141,8 @@ class App(signalsmixin.SignalsMixin):
 
             util.DEBUG_LOG('Waiting for App() timers: Finished')
 
+        util.SCHEDULER.shutdown()
+
 
 class DeviceInfo(object):
     def getCaptionsOption(self, key):
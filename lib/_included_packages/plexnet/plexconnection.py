@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 import random
 import socket
+import time
 
 from . import http
 from . import callback
@@ -60,6 +61,9 @@ class PlexConnection(object):
     SCORE_LOCAL = 2
     SCORE_SECURE = 1
 
+    # weight of the newest sample in the smoothed reachability latency
+    LATENCY_WEIGHT = 0.3
+
     SOURCE_BY_VAL = {
         1: SOURCE_MANUAL,
         2: SOURCE_DISCOVERED,
@@ -84,7 +88,10 @@ class PlexConnection(object):
         self.request = None
 
         self.lastTestedAt = 0
+        self.testStartedAt = 0
+        self.latency = None
         self.hasPendingRequest = False
+        self.aborted = False
 
         self.isSecureButLocal = False
 
@@ -240,6 +247,8 @@ class PlexConnection(object):
                                                         timeout=util.CONN_CHECK_TIMEOUT)
             context.server = server
             util.addPlexHeaders(self.request, server.getToken())
+            self.testStartedAt = time.time()
+            self.aborted = False
             self.hasPendingRequest = util.APP.startRequest(self.request, context)
             util.DEBUG_LOG("Testing insecure connection for: {0}", server)
             return True
@@ -251,6 +260,20 @@ class PlexConnection(object):
             self.request.ignoreResponse = True
             self.request.cancel()
 
+    def abortReachability(self):
+        """
+        Cancels a pending reachability test whose result isn't needed anymore, because another connection of the
+        server already won. A result that still arrives is dropped.
+        """
+        if not self.hasPendingRequest:
+            return False
+
+        self.aborted = True
+        self.hasPendingRequest = False
+        self.cancelReachability()
+        util.DEBUG_LOG("Aborted reachability test for {0}", self.address)
+        return True
+
     def onReachabilityResponse(self, request, response, context):
         self.hasPendingRequest = False
         # It's possible we may have a result pending before we were able
@@ -259,10 +282,15 @@ class PlexConnection(object):
         # if request.ignoreResponse:
         #     return
 
+        if self.aborted:
+            self.aborted = False
+            return
+
         if response.isSuccess():
             data = response.getBodyXml()
             if data is not None and context.server.collectDataFromRoot(data):
                 self.state = self.STATE_REACHABLE
+                self.updateLatency(time.time() - self.testStartedAt)
             else:
                 # This is unexpected, but treat it as unreachable
                 util.ERROR_LOG("Unable to parse root response from {0}".format(context.server))
@@ -272,6 +300,10 @@ class PlexConnection(object):
         else:
             self.state = self.STATE_UNREACHABLE
 
+        if self.state == self.STATE_UNREACHABLE:
+            # don't prefer this connection next time
+            self.latency = None
+
         self.getScore(True)
 
         context.server.onReachabilityResult(self)
@@ -302,14 +334,25 @@ class PlexConnection(object):
 
         return '{0}{1}{2}'.format(self.address, path, param)
 
+    def updateLatency(self, latency):
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += (latency - self.latency) * self.LATENCY_WEIGHT
+
     def getScore(self, recalc=False):
         if recalc:
-            self.score = 0
-            if self.state == self.STATE_REACHABLE:
-                self.score += self.SCORE_REACHABLE
-            if self.isSecure:
-                self.score += self.SCORE_SECURE
-            if self.isLocal:
-                self.score += self.SCORE_LOCAL + (not self.isSecure and util.LOCAL_OVER_SECURE and 2 or 0)
+            self.score = self.getPotentialScore(self.state == self.STATE_REACHABLE)
 
         return self.score
+
+    def getPotentialScore(self, reachable=True):
+        """
+        The score this connection would have if it turned out to be reachable.
+        """
+        score = reachable and self.SCORE_REACHABLE or 0
+        if self.isSecure:
+            score += self.SCORE_SECURE
+        if self.isLocal:
+            score += self.SCORE_LOCAL + (not self.isSecure and util.LOCAL_OVER_SECURE and 2 or 0)
+        return score
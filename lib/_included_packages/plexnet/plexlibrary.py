@@ -10,6 +10,7 @@ from . import media
 from . import exceptions
 from . import util
 from . import signalsmixin
+from . import querycache
 from lib.path_mapping import pmm, norm_sep
 from lib.exceptions import NoDataException
 from six.moves import map
@@ -19,11 +20,15 @@ class Library(plexobjects.PlexObject):
     def __repr__(self):
         return '<Library:{0}>'.format(self.title1.encode('utf8'))
 
-    def sections(self):
+    def sections(self, cache=None):
         items = []
 
         path = '/library/sections'
-        for elem in self.server.query(path):
+        data = self.server.query(path, cache=cache)
+        if data is None:
+            return None if cache == querycache.CACHE_ONLY else items
+
+        for elem in data:
             stype = elem.attrib['type']
             if stype in SECTION_TYPES:
                 cls = SECTION_TYPES[stype]
@@ -170,15 +175,16 @@ class LibrarySection(plexobjects.PlexObject):
 
         return plexobjects.PlexObject.getAbsolutePath(self, key)
 
-    def all(self, start=None, size=None, filter_=None, sort=None, unwatched=False, type_=None):
+    def all(self, start=None, size=None, filter_=None, sort=None, unwatched=False, type_=None, stream=False,
+            compact=False):
         if self.key.startswith('/'):
             path = '{0}/all'.format(self.key)
         else:
             path = '/library/sections/{0}/all'.format(self.key)
         
-        return self.items(path, start, size, filter_, sort, unwatched, type_, False)
+        return self.items(path, start, size, filter_, sort, unwatched, type_, False, stream, compact)
     
-    def folder(self, start=None, size=None, subDir=False):
+    def folder(self, start=None, size=None, subDir=False, stream=False, compact=False):
         if self.key.startswith('/'):
             path = self.key
         else:
@@ -187,9 +193,9 @@ class LibrarySection(plexobjects.PlexObject):
         if not subDir:
             path = '{0}/folder'.format(path)
         
-        return self.items(path, start, size, None, None, False, None, True)
+        return self.items(path, start, size, None, None, False, None, True, stream, compact)
 
-    def items(self, path, start, size, filter_, sort, unwatched, type_, tag_fallback):
+    def items(self, path, start, size, filter_, sort, unwatched, type_, tag_fallback, stream=False, compact=False):
 
         args = {}
 
@@ -214,6 +220,9 @@ class LibrarySection(plexobjects.PlexObject):
         if args:
             path += util.joinArgs(args, '?' not in path)
 
+        if stream:
+            return plexobjects.iterItems(self.server, path, tag_fallback=tag_fallback, compact=compact)
+
         return plexobjects.listItems(self.server, path, tag_fallback=tag_fallback)
 
     def jumpList(self, filter_=None, sort=None, unwatched=False, type_=None):
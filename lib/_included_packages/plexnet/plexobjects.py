@@ -1,4 +1,6 @@
 from __future__ import absolute_import
+import copy
+import functools
 from datetime import datetime
 
 from . import exceptions
@@ -20,6 +22,12 @@ SEARCHTYPES = {
 
 LIBRARY_TYPES = {}
 
+# rating keys per /library/metadata/{keys} request when reloading items in batches, see reloadItems
+BATCH_RELOAD_SIZE = 50
+
+# names resolved on each PlexObject class (methods, properties, slots, class attributes), see PlexObject._setAttribs
+CLASS_ATTRS = {}
+
 
 def registerLibType(cls):
     LIBRARY_TYPES[cls.TYPE] = cls
@@ -33,13 +41,41 @@ def registerLibFactory(ftype):
     return wrap
 
 
+@functools.lru_cache(maxsize=4096)
+def parseDatetime(value):
+    """
+    Parses a timestamp or YYYY-MM-DD date. Memoized, as the same dates are parsed over and over while redrawing lists,
+    also for values that aren't the same PlexValue (e.g. of compact items); pass plain strings.
+    """
+    if value.isdigit():
+        return datetime.fromtimestamp(int(value))
+
+    if len(value) == 10 and value[4] == value[7] == '-' and value[:4].isdigit():
+        # the common case, without going through strptime
+        try:
+            return datetime(year=int(value[:4]), month=int(value[5:7]), day=int(value[8:]))
+        except ValueError:
+            pass
+
+    # dt = datetime.strptime(self, '%Y-%m-%d')
+    # Avoid datetime.strptime to avoid
+    # https://github.com/python/cpython/issues/71587
+    try:
+        return datetime.fromtimestamp(time.mktime(time.strptime(value, '%Y-%m-%d')))
+    except OverflowError:
+        # special case for dates before 1970-01-02 (yes, there are shows that old), mktime fails on those
+        year, month, day = (int(p) for p in value.split("-"))
+        return datetime(year=year, month=month, day=day)
+
+
 class PlexValue(six.text_type):
-    __slots__ = ("parent", "NA")
+    __slots__ = ("parent", "NA", "_conv")
 
     def __new__(cls, value, parent=None):
         self = super(PlexValue, cls).__new__(cls, value)
         self.parent = parent
         self.NA = False
+        self._conv = None
         return self
 
     def __call__(self, default):
@@ -51,36 +87,39 @@ class PlexValue(six.text_type):
     def __deepcopy__(self, memodict=None):
         return self.__class__(self)
 
+    def _converted(self, key, convert):
+        # values are immutable, so each conversion (keyed by type or date format) is only done once
+        conv = self._conv
+        if conv is None:
+            conv = self._conv = {}
+        elif key in conv:
+            return conv[key]
+
+        value = conv[key] = convert()
+        return value
+
     def asBool(self):
         return self == '1'
 
     def asInt(self, default=0):
-        return int(self or default)
+        if not self:
+            return int(default)
+        return self._converted(int, lambda: int(self))
 
     def asFloat(self, default=0):
-        return float(self or default)
+        if not self:
+            return float(default)
+        return self._converted(float, lambda: float(self))
 
     def asDatetime(self, format_=None):
         if not self:
             return None
 
-        if self.isdigit():
-            dt = datetime.fromtimestamp(int(self))
-        else:
-            # dt = datetime.strptime(self, '%Y-%m-%d')
-            # Avoid datetime.strptime to avoid
-            # https://github.com/python/cpython/issues/71587
-            try:
-                dt = datetime.fromtimestamp(time.mktime(time.strptime(self, '%Y-%m-%d')))
-            except OverflowError:
-                # special case for dates before 1970-01-02 (yes, there are shows that old), mktime fails on those
-                year, month, day = (int(p) for p in str(self).split("-"))
-                dt = datetime(year=year, month=month, day=day)
-
+        dt = self._converted(datetime, lambda: parseDatetime(str(self)))
         if not format_:
             return dt
 
-        return dt.strftime(format_)
+        return self._converted(format_, lambda: dt.strftime(format_))
 
     def asURL(self, includeToken=False):
         return self.parent.server.buildUrl(self, includeToken)
@@ -155,9 +194,11 @@ class Checks(object):
 
 
 class PlexObject(Checks):
-    __slots__ = ("initpath", "key", "server", "container", "mediaChoice", "titleSort", "deleted", "_reloaded", "data")
+    __slots__ = ("initpath", "key", "server", "container", "mediaChoice", "titleSort", "deleted", "_reloaded", "data",
+                 "_attrib")
 
     def __init__(self, data, initpath=None, server=None, container=None):
+        self._attrib = None
         self.initpath = initpath
         self.key = None
         self.server = server
@@ -180,29 +221,88 @@ class PlexObject(Checks):
             return
 
         self.name = data.tag
-        for k, v in data.attrib.items():
-            if k in ("container",):
-                k = "attrib_%s" % k
-
-            setattr(self, k, PlexValue(v, self))
+        self._setAttribs(data.attrib, rename=("container",))
+
+    def _setAttribs(self, attrib, rename=()):
+        """
+        Makes the element's attributes available as PlexValue attributes. Most attributes of listed items are never
+        read, so the attribute dict is kept as is and PlexValues are only created on first access (see __getattr__).
+        Attributes that wouldn't end up in __getattr__ (names the class defines, attributes already set on the
+        object) are set right away, like any attribute renamed to attrib_<name>.
+        """
+        cls = self.__class__
+        classAttrs = CLASS_ATTRS.get(cls)
+        if classAttrs is None:
+            classAttrs = CLASS_ATTRS[cls] = frozenset(dir(cls))
+
+        instanceAttrs = self.__dict__
+        for k, v in attrib.items():
+            if k in rename:
+                setattr(self, "attrib_%s" % k, PlexValue(v, self))
+            elif k in classAttrs or k in instanceAttrs:
+                setattr(self, k, PlexValue(v, self))
+
+        if self._attrib:
+            # reloaded; attributes missing from the new data keep their old values
+            merged = dict(self._attrib)
+            merged.update(attrib)
+            attrib = merged
+        self._attrib = attrib
 
     def __getattr__(self, attr):
+        try:
+            attrib = object.__getattribute__(self, "_attrib")
+        except AttributeError:
+            attrib = None
+
+        if attrib and attr in attrib:
+            value = self.__dict__[attr] = PlexValue(attrib[attr], self)
+            return value
+
+        # missing attributes aren't stored on the object; probes for optional attributes are common enough that
+        # keeping them around noticeably adds to the size of large listings
         a = PlexValue('', self)
         a.NA = True
+        return a
+
+    def __delattr__(self, attr):
+        # drop the raw value too, or it'd come back on the next access and survive a reload (see _setAttribs)
+        attrib = self._attrib
+        inAttrib = bool(attrib) and attr in attrib
+        if inAttrib:
+            # the dict might still be the element's own
+            self._attrib = dict(attrib)
+            del self._attrib[attr]
 
         try:
-            setattr(self, attr, a)
+            object.__delattr__(self, attr)
         except AttributeError:
-            util.LOG('Failed to set attribute: {0} ({1})', attr, self.__class__)
-
-        return a
+            if not inAttrib:
+                raise
+
+    def _local(self, attr):
+        """
+        Returns the value of an instance (not class) attribute, or None; the lazy version of self.__dict__.get(attr).
+        """
+        ret = self.__dict__.get(attr)
+        if ret is None and self._attrib and attr in self._attrib and attr not in CLASS_ATTRS[self.__class__]:
+            # not materialized yet; the others were set by _setAttribs
+            ret = getattr(self, attr)
+        return ret
+
+    def _materialize(self):
+        if self._attrib:
+            for attr in self._attrib:
+                self._local(attr)
 
     def exists(self, *args, **kwargs):
         # Used for media items - for others we just return True
         return True
 
     def get(self, attr, default=''):
-        ret = self.__dict__.get(attr, getattr(self, attr) if attr in self.__slots__ else None)
+        ret = self._local(attr)
+        if ret is None and attr in self.__slots__:
+            ret = getattr(self, attr)
         return ret is not None and ret or PlexValue(default, self)
 
     def set(self, attr, value):
@@ -223,33 +323,40 @@ class PlexObject(Checks):
 
     @property
     def defaultThumb(self):
-        return self.__dict__.get('thumb') and self.thumb or PlexValue('', self)
+        return self._local('thumb') and self.thumb or PlexValue('', self)
 
     @property
     def defaultArt(self):
-        return self.__dict__.get('art') and self.art or PlexValue('', self)
+        return self._local('art') and self.art or PlexValue('', self)
 
     def refresh(self):
         import requests
         self.server.query('%s/refresh' % self.key, method=requests.put)
 
-    def reload(self, _soft=False, **kwargs):
-        """ Reload the data for this object from PlexServer XML. """
+    def reload(self, _soft=False, _data=None, **kwargs):
+        """
+        Reload the data for this object from PlexServer XML.
+        _data: the object's element, already fetched (see reloadItems)
+        """
         if _soft and self._reloaded:
             return self
 
-        try:
-            if self.get('ratingKey'):
-                data = self.server.query('/library/metadata/{0}'.format(self.ratingKey), params=kwargs)
-            else:
-                data = self.server.query(self.key, params=kwargs)
+        if _data is not None:
+            data = [_data]
             self._reloaded = True
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            util.ERROR(err=e)
-            self.initpath = self.key
-            return self
+        else:
+            try:
+                if self.get('ratingKey'):
+                    data = self.server.query('/library/metadata/{0}'.format(self.ratingKey), params=kwargs)
+                else:
+                    data = self.server.query(self.key, params=kwargs)
+                self._reloaded = True
+            except Exception as e:
+                import traceback
+                traceback.print_exc()
+                util.ERROR(err=e)
+                self.initpath = self.key
+                return self
 
         self.initpath = self.key
 
@@ -410,6 +517,7 @@ class PlexObject(Checks):
         import json
         odict = {}
         if full:
+            self._materialize()
             for k, v in self.__dict__.items():
                 if k not in ('server', 'container', 'media', 'initpath', '_data') and v:
                     odict[k] = v
@@ -566,11 +674,7 @@ def listItems(server, path, libtype=None, watched=None, bytag=False, data=None,
 
     if data:
         for elem in data:
-            if libtype and elem.attrib.get('type') != libtype:
-                continue
-            if watched is True and elem.attrib.get('viewCount', 0) == 0:
-                continue
-            if watched is False and elem.attrib.get('viewCount', 0) >= 1:
+            if not _wantedElem(elem, libtype, watched):
                 continue
             try:
                 items.append(buildItem(server, elem, path, bytag, container, tag_fallback))
@@ -580,6 +684,81 @@ def listItems(server, path, libtype=None, watched=None, bytag=False, data=None,
     return items
 
 
+def iterItems(server, path, libtype=None, watched=None, bytag=False, offset=None, limit=None, tag_fallback=False,
+              compact=False, **kwargs):
+    """
+    Generator counterpart of listItems() built on PlexServer.iterQuery(). Items are yielded as soon as their
+    element has been parsed from the response stream, so the first item is available before the whole container
+    has been received. With compact=True the items are compactitems.CompactItem rows instead of full objects.
+    """
+    elems = server.iterQuery(path, offset=offset, limit=limit, **kwargs)
+    container = None
+    table = None
+    for elem in elems:
+        if container is None:
+            container = PlexContainer(elem, path, server, path)
+            if compact:
+                from . import compactitems
+                table = compactitems.ItemTable(server, path, container, bytag, tag_fallback)
+            continue
+
+        if not _wantedElem(elem, libtype, watched):
+            continue
+        try:
+            if table is not None:
+                yield table.append(elem)
+            else:
+                yield buildItem(server, elem, path, bytag, container, tag_fallback)
+        except exceptions.UnknownType:
+            pass
+
+
+def reloadItems(items, chunkSize=BATCH_RELOAD_SIZE, **kwargs):
+    """
+    Reloads items of the same server with one /library/metadata/{key1,key2,...} request per chunkSize items, instead
+    of one request per item. kwargs are passed as query parameters and to each item's reload(). Returns the reloaded
+    items; items without a ratingKey or that weren't returned by the server are left alone. Request errors are raised.
+    """
+    byKey = {}
+    for item in items:
+        if item.get('ratingKey'):
+            sameKey = byKey.setdefault(str(item.ratingKey), [])
+            if not any(i is item for i in sameKey):
+                sameKey.append(item)
+
+    if not byKey:
+        return []
+
+    server = items[0].server
+    keys = list(byKey)
+    reloaded = []
+    for offset in range(0, len(keys), chunkSize):
+        chunk = keys[offset:offset + chunkSize]
+        data = server.query('/library/metadata/{0}'.format(','.join(chunk)), params=kwargs)
+        if data is None:
+            continue
+
+        for elem in data:
+            for i, item in enumerate(byKey.get(elem.attrib.get('ratingKey'), ())):
+                # objects keep references into their element; don't share one
+                item.reload(_data=copy.deepcopy(elem) if i else elem, **kwargs)
+                reloaded.append(item)
+
+    util.DEBUG_LOG("Reloaded {0} of {1} items in {2} requests", len(reloaded), len(items),
+                   (len(keys) + chunkSize - 1) // chunkSize)
+    return reloaded
+
+
+def _wantedElem(elem, libtype, watched):
+    if libtype and elem.attrib.get('type') != libtype:
+        return False
+    if watched is True and elem.attrib.get('viewCount', 0) == 0:
+        return False
+    if watched is False and elem.attrib.get('viewCount', 0) >= 1:
+        return False
+    return True
+
+
 def searchType(libtype):
     searchtypesstrs = [str(k) for k in SEARCHTYPES.keys()]
     if libtype in SEARCHTYPES + searchtypesstrs:
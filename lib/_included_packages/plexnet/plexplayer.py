@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 import re
 from . import util
+from . import bif
 from . import captions
 from . import http
 from . import plexrequest
@@ -40,6 +41,7 @@ class PlexPlayer(BasePlayer):
         self.decision = None
         self.seekValue = seekValue
         self.metadata = None
+        self.bifKeys = {}
         self.init(item, forceUpdate)
 
     def init(self, item, forceUpdate=False):
@@ -138,6 +140,7 @@ class PlexPlayer(BasePlayer):
             partObj.partDuration = part.duration.asInt()
             partObj.path = str(part.file)
             partObj.size = part.size and int(part.size) or ''
+            partObj.partId = part.id.asInt()
 
             if part.isIndexed():
                 partObj.sdBifPath = part.getIndexPath("sd")
@@ -590,21 +593,46 @@ class PlexPlayer(BasePlayer):
 
         util.LOG("Next part set for playback: {0}", self.metadata)
 
-    def getBifUrl(self, offset=0):
-        server = self.item.getServer()
+    def _getBifPart(self, offset):
         startOffset = 0
         for part in self.media.parts:
             duration = part.duration.asInt()
             if startOffset <= offset < startOffset + duration:
-                bifUrl = part.getIndexPath("hd") or part.getIndexPath("sd")
-                if bifUrl is not None:
-                    url = server.buildUrl('{0}/{1}'.format(bifUrl, offset - startOffset), True)
-                    return url
+                return part, startOffset
 
             startOffset += duration
 
+        return None, 0
+
+    def getBifUrl(self, offset=0):
+        part, startOffset = self._getBifPart(offset)
+        bifUrl = part and (part.getIndexPath("hd") or part.getIndexPath("sd"))
+        if bifUrl is not None:
+            return self.item.getServer().buildUrl('{0}/{1}'.format(bifUrl, offset - startOffset), True)
+
         return None
 
+    def loadBif(self):
+        """
+        Starts downloading the BIF files of the parts to be played in the background, so seek previews can be
+        served locally.
+        """
+        server = self.item.getServer()
+        self.bifKeys = {}
+        for part in self.media.parts:
+            indexPath = part.getIndexPath("hd") or part.getIndexPath("sd")
+            if indexPath is not None:
+                self.bifKeys[part.id] = bif.MANAGER.load(server, indexPath)
+
+    def getBifImage(self, offset=0):
+        """
+        Returns the seek preview image for offset, from the local BIF file if it's loaded already, otherwise the
+        server URL.
+        """
+        part, startOffset = self._getBifPart(offset)
+        key = part and self.bifKeys.get(part.id)
+        return key and bif.MANAGER.thumbnail(key, offset - startOffset) or self.getBifUrl(offset)
+
     def buildTranscode(self, server, obj, partIndex, directStream, isCurrentPart):
         util.DEBUG_LOG('buildTranscode()')
         obj.transcodeServer = server
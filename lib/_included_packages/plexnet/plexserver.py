@@ -3,7 +3,9 @@ from __future__ import absolute_import
 
 import time
 import re
+import copy
 import json
+import threading
 import urllib3.exceptions
 
 from . import http
@@ -17,6 +19,7 @@ from . import plexobjects
 from . import plexresource
 from . import plexlibrary
 from . import asyncadapter
+from . import querycache
 from six.moves import range
 # from plexapi.client import Client
 # from plexapi.playqueue import PlayQueue
@@ -26,8 +29,64 @@ TOTAL_QUERIES = 0
 DEFAULT_BASEURI = 'http://localhost:32400'
 
 
+class InflightQueries(object):
+    """
+    Merges identical queries: callers asking for a container that's already being fetched wait for that request
+    and get their own copy of its result, instead of issuing the same request again. Query cache changes the
+    request made are credited to them as well (see querycache.QueryCache.changeCount).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.merged = 0
+
+    def query(self, server, path, params=None, cache=None):
+        key = (server.uuid, path, tuple(sorted((params or {}).items())), cache)
+        with self._lock:
+            entry = self._inflight.get(key)
+            leader = entry is None
+            if leader:
+                entry = self._inflight[key] = {"event": threading.Event(), "waiters": 0, "data": None,
+                                               "error": None, "changes": 0}
+            else:
+                entry["waiters"] += 1
+                self.merged += 1
+
+        if not leader:
+            util.DEBUG_LOG("Merged query for {0}", path)
+            entry["event"].wait()
+            querycache.CACHE.addChanges(entry["changes"])
+            if entry["error"] is not None:
+                raise entry["error"]
+            if entry["data"] is None:
+                return None
+            # not "and/or": elements without children are falsy
+            return copy.deepcopy(entry["data"])
+
+        data = None
+        changes = querycache.CACHE.changeCount()
+        try:
+            data = server.query(path, params=params, cache=cache)
+            return data
+        except Exception as e:
+            entry["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                entry["changes"] = querycache.CACHE.changeCount() - changes
+                # the leader's caller owns data, keep a pristine copy for the others
+                if entry["waiters"] and data is not None:
+                    entry["data"] = copy.deepcopy(data)
+            entry["event"].set()
+
+
+INFLIGHT = InflightQueries()
+
+
 class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
     TYPE = 'PLEXSERVER'
+    REACHABILITY_HEAD_START = 0.5  # max seconds the historically fastest connection is tested alone
 
     def __init__(self, data=None):
         signalsmixin.SignalsMixin.__init__(self)
@@ -45,9 +104,13 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
         self.allowChannelAccess = False
         self.activeConnection = None
         self.serverClass = None
+        self.rootAttributes = None
 
         self.pendingReachabilityRequests = 0
         self.pendingSecureRequests = 0
+        self.deferredTests = []
+        self.deferredTestsTimer = None
+        self.deferredTestsLock = threading.Lock()
 
         self.features = {}
         self.librariesByUuid = {}
@@ -104,6 +167,20 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
     def close(self):
         self.session.cancel()
 
+    def prewarm(self):
+        """
+        Opens a keep-alive connection to the active connection, so the first real requests don't have to wait for
+        the TCP and TLS handshakes.
+        """
+        if not self.activeConnection:
+            return
+
+        try:
+            self.session.head(self.buildUrl('/identity', includeToken=True))
+            util.DEBUG_LOG('Prewarmed connection to {0}', self)
+        except Exception as e:
+            util.DEBUG_LOG('Prewarming connection to {0} failed: {1}', self, e)
+
     def get(self, attr, default=None):
         return default
 
@@ -125,7 +202,13 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
         data = self.query(key)
         return plexobjects.buildItem(self, data[0], key, container=self)
 
-    def hubs(self, section=None, count=None, search_query=None, section_ids=None, ignore_hubs=None):
+    def hubs(self, section=None, count=None, search_query=None, section_ids=None, ignore_hubs=None, cache=None,
+             partial_callback=None):
+        """
+        cache: querycache mode; with CACHE_ONLY, returns None unless every container needed is cached
+        partial_callback: called with the section's hubs as soon as they've arrived, if the continue watching hub
+                          (which is fetched concurrently) is still outstanding
+        """
         hubs = []
 
         params = {"includeMarkers": 1}
@@ -141,6 +224,8 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
             q = '/hubs'
             if section:
                 if section == 'playlists':
+                    if cache == querycache.CACHE_ONLY:
+                        return None
                     audio = plexlibrary.AudioPlaylistHub(False, server=self.server)
                     video = plexlibrary.VideoPlaylistHub(False, server=self.server)
                     if audio.items:
@@ -158,24 +243,35 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
             if count is not None:
                 params['count'] = count
 
-        data = self.query(q, params=params)
-        container = plexobjects.PlexContainer(data, initpath=q, server=self, address=q)
-
-        self.currentHubs = {} if self.currentHubs is None else self.currentHubs
-
         newCW = util.INTERFACE.getPreference('hubs_use_new_continue_watching', False) and not search_query \
             and not section
 
+        cwThread = None
+        cwResult = {}
         if newCW:
-            # home, add continueWatching
+            # home, add continueWatching; fetched alongside the other hubs
             cq = '/hubs/continueWatching'
             if section_ids:
                 cq += util.joinArgs(params)
 
-            cdata = self.query(cq, params=params)
-            ccontainer = plexobjects.PlexContainer(cdata, initpath=cq, server=self, address=cq)
-            self.currentHubs[cdata[0].attrib.get('hubIdentifier')] = cdata[0].attrib.get('title')
-            hubs.append(plexlibrary.Hub(cdata[0], server=self, container=ccontainer))
+            def fetchCW():
+                try:
+                    cwResult["data"] = INFLIGHT.query(self, cq, params=params, cache=cache)
+                except Exception as e:
+                    cwResult["error"] = e
+                finally:
+                    # cache changes are counted per thread; hand them over to the caller's
+                    cwResult["changes"] = querycache.CACHE.changeCount()
+
+            cwThread = threading.Thread(target=fetchCW, name="HUBS-CW")
+            cwThread.start()
+
+        data = INFLIGHT.query(self, q, params=params, cache=cache)
+        if data is None and cache == querycache.CACHE_ONLY:
+            return None
+        container = plexobjects.PlexContainer(data, initpath=q, server=self, address=q)
+
+        self.currentHubs = {} if self.currentHubs is None else self.currentHubs
 
         for elem in data:
             hubIdent = elem.attrib.get('hubIdentifier')
@@ -191,16 +287,42 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
 
             hubs.append(plexlibrary.Hub(elem, server=self, container=container))
 
+        self._applyHubFilter(hubs, params, section_ids)
+
+        if newCW:
+            if partial_callback and cwThread.is_alive():
+                partial_callback(list(hubs))
+            cwThread.join()
+            querycache.CACHE.addChanges(cwResult.get("changes"))
+
+            if "error" in cwResult:
+                raise cwResult["error"]
+
+            cdata = cwResult.get("data")
+            if cdata is None and cache == querycache.CACHE_ONLY:
+                return None
+            ccontainer = plexobjects.PlexContainer(cdata, initpath=cq, server=self, address=cq)
+            self.currentHubs[cdata[0].attrib.get('hubIdentifier')] = cdata[0].attrib.get('title')
+            cwHub = plexlibrary.Hub(cdata[0], server=self, container=ccontainer)
+            self._applyHubFilter([cwHub], params, section_ids)
+            hubs.insert(0, cwHub)
+
+        return hubs
+
+    def _applyHubFilter(self, hubs, params, section_ids):
         if section_ids:
             # when we have hidden sections, apply the filter to the hubs keys for subsequent queries
             for hub in hubs:
                 if "pinnedContentDirectoryID" not in hub.key:
                     hub.key += util.joinArgs(params, '?' not in hub.key)
 
-        return hubs
-
-    def playlists(self, start=0, size=10, hub=None):
+    def playlists(self, start=0, size=10, hub=None, cache=None):
         try:
+            if cache:
+                data = self.query('/playlists/all', cache=cache)
+                if data is None:
+                    return None
+                return plexobjects.listItems(self, '/playlists/all', data=data)
             return plexobjects.listItems(self, '/playlists/all')
         except exceptions.BadRequest:
             return None
@@ -230,9 +352,7 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
             util.WARN_LOG("Server connection is None, returning an empty url")
             return ""
 
-    def query(self, path, method=None, **kwargs):
-        method = method or self.session.get
-
+    def _buildQueryUrl(self, path, kwargs):
         limit = kwargs.pop("limit", None)
         params = kwargs.pop("params", None)
         if params:
@@ -260,13 +380,15 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
             url = http.addUrlParam(url, "X-Plex-Container-Start=%s" % offset)
             url = http.addUrlParam(url, "X-Plex-Container-Size=%s" % limit)
 
+        return url
+
+    def _queryResponse(self, url, method, okCodes=(200, 201), **kwargs):
         util.LOG('{0} {1}', method.__name__.upper(), re.sub('X-Plex-Token=[^&]+', 'X-Plex-Token=****', url))
         try:
             response = method(url, **kwargs)
-            if response.status_code not in (200, 201):
+            if response.status_code not in okCodes:
                 codename = http.status_codes.get(response.status_code, ['Unknown'])[0]
                 raise exceptions.BadRequest('({0}) {1}'.format(response.status_code, codename))
-            data = response.text.encode('utf8')
         except asyncadapter.TimeoutException:
             util.ERROR()
             util.MANAGER.refreshResources(True)
@@ -277,8 +399,116 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
         except asyncadapter.CanceledException:
             return None
 
+        return response
+
+    def query(self, path, method=None, cache=None, **kwargs):
+        """
+        cache: one of the querycache.CACHE_* modes to serve GET requests through the on-disk query cache
+        """
+        method = method or self.session.get
+
+        url = self._buildQueryUrl(path, kwargs)
+        if not url:
+            return None
+
+        if cache:
+            return self._cachedQuery(url, cache, **kwargs)
+
+        response = self._queryResponse(url, method, **kwargs)
+        if response is None:
+            return None
+
+        data = response.text.encode('utf8')
         return ElementTree.fromstring(data) if data else None
 
+    def _cachedQuery(self, url, mode, **kwargs):
+        qc = querycache.CACHE
+        key = qc.key(self, url)
+
+        if mode == querycache.CACHE_ONLY or (mode == querycache.CACHE_USE and qc.isFresh(key)):
+            data = qc.get(key)
+            if data is not None:
+                qc.hit()
+                return ElementTree.fromstring(data)
+
+            if mode == querycache.CACHE_ONLY:
+                qc.miss()
+                return None
+
+        response = self._queryResponse(url, self.session.get, okCodes=(200, 201, 304),
+                                       headers=qc.conditionalHeaders(key), **kwargs)
+        if response is None:
+            return None
+
+        if response.status_code == 304:
+            data = qc.get(key)
+            if data is not None:
+                util.DEBUG_LOG("Query cache: not modified: {0}", key)
+                qc.touch(key)
+                qc.revalidated += 1
+                qc.hit()
+                return ElementTree.fromstring(data)
+
+            # entry vanished in the meantime, fetch unconditionally
+            response = self._queryResponse(url, self.session.get, **kwargs)
+            if response is None:
+                return None
+
+        data = response.text.encode('utf8')
+        if not data:
+            return None
+
+        qc.miss()
+        if qc.isUnchanged(key, data):
+            qc.touch(key)
+            qc.revalidated += 1
+        else:
+            qc.set(key, data, response.headers)
+
+        return ElementTree.fromstring(data)
+
+    def iterQuery(self, path, method=None, **kwargs):
+        """
+        Streaming variant of query(). The response body is parsed incrementally: the container element is
+        yielded first (with its attributes, but no children), followed by each direct child as soon as its
+        closing tag has been parsed. Yielded children are detached from the container afterwards, so neither
+        the raw payload nor the full tree is ever held in memory.
+        Raises exceptions.IncompleteResponse if the response ends early (parse or connection error, canceled).
+        """
+        method = method or self.session.get
+
+        url = self._buildQueryUrl(path, kwargs)
+        if not url:
+            return
+
+        response = self._queryResponse(url, method, stream=True, **kwargs)
+        if response is None:
+            return
+
+        try:
+            response.raw.decode_content = True
+            root = None
+            depth = 0
+            for event, elem in ElementTree.iterparse(response.raw, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    if root is None:
+                        root = elem
+                        yield root
+                    continue
+
+                depth -= 1
+                if depth == 1:
+                    yield elem
+                    root.remove(elem)
+        except (ElementTree.ParseError, http.requests.ConnectionError, urllib3.exceptions.HTTPError) as e:
+            util.ERROR()
+            raise exceptions.IncompleteResponse(str(e))
+        except asyncadapter.CanceledException:
+            raise exceptions.IncompleteResponse('Request canceled')
+        finally:
+            response.close()
+
     def getImageTranscodeURL(self, path, width, height, **extraOpts):
         if not path:
             return ''
@@ -355,6 +585,7 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
             util.LOG("Got a reachability response, but from a different server")
             return False
 
+        self.rootAttributes = dict(data.attrib)
         self.serverClass = data.attrib.get('serverClass')
         self.supportsAudioTranscoding = data.attrib.get('transcoderAudio') == '1'
         self.supportsVideoTranscoding = data.attrib.get('transcoderVideo') == '1' or data.attrib.get('transcoderVideoQualities')
@@ -405,6 +636,7 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
         epoch = time.time()
         retrySeconds = 60
         minSeconds = 10
+        candidates = []
         for i in range(len(self.connections)):
             conn = self.connections[i]
             diff = epoch - (conn.lastTestedAt or 0)
@@ -413,18 +645,68 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
             elif (diff < minSeconds or (not self.isSecondary() and self.isReachable() and diff < retrySeconds)) and \
                     not conn.state == "unauthorized":
                 util.DEBUG_LOG("Skip reachability test for {0} (checked {1} secs ago)", conn, diff)
-            elif conn.testReachability(self, allowFallback):
-                self.pendingReachabilityRequests += 1
-                if conn.isSecure:
-                    self.pendingSecureRequests += 1
-
-                if self.pendingReachabilityRequests == 1:
-                    self.trigger("started:reachability")
-
-        if self.pendingReachabilityRequests <= 0:
+            else:
+                candidates.append(conn)
+
+        # Probe the historically fastest connections first. If the fastest one is also as good as any other
+        # candidate could be, give it a head start before racing the rest, which usually makes testing those
+        # unnecessary.
+        candidates.sort(key=lambda c: c.latency is None and float('inf') or c.latency)
+        if len(candidates) > 1 and candidates[0].latency is not None and \
+                candidates[0].getPotentialScore() >= max(c.getPotentialScore() for c in candidates[1:]):
+            first = candidates.pop(0)
+            self.deferReachabilityTests(candidates, allowFallback,
+                                        min(self.REACHABILITY_HEAD_START, first.latency * 2))
+            candidates = [first]
+
+        for conn in candidates:
+            self.testConnectionReachability(conn, allowFallback)
+
+        if self.pendingReachabilityRequests <= 0 and not self.deferredTests:
             self.trigger("completed:reachability")
 
+    def testConnectionReachability(self, conn, allowFallback=False):
+        if conn.testReachability(self, allowFallback):
+            self.pendingReachabilityRequests += 1
+            if conn.isSecure:
+                self.pendingSecureRequests += 1
+
+            if self.pendingReachabilityRequests == 1:
+                self.trigger("started:reachability")
+
+    def deferReachabilityTests(self, conns, allowFallback, delay):
+        with self.deferredTestsLock:
+            self.deferredTests = [(conn, allowFallback) for conn in conns]
+            if self.deferredTestsTimer:
+                self.deferredTestsTimer.cancel()
+
+            from . import plexapp
+            self.deferredTestsTimer = plexapp.createTimer(delay * 1000,
+                                                         lambda: self.startDeferredReachabilityTests())
+            util.APP.addTimer(self.deferredTestsTimer)
+
+        util.DEBUG_LOG("Deferring {0} reachability tests for {1} by {2:.2f}s", len(conns), repr(self.name), delay)
+
+    def startDeferredReachabilityTests(self):
+        with self.deferredTestsLock:
+            tests = self.deferredTests
+            self.deferredTests = []
+            if self.deferredTestsTimer:
+                self.deferredTestsTimer.cancel()
+                self.deferredTestsTimer = None
+
+        for conn, allowFallback in tests:
+            self.testConnectionReachability(conn, allowFallback)
+
+    def dropDeferredReachabilityTests(self):
+        with self.deferredTestsLock:
+            self.deferredTests = []
+            if self.deferredTestsTimer:
+                self.deferredTestsTimer.cancel()
+                self.deferredTestsTimer = None
+
     def cancelReachability(self):
+        self.dropDeferredReachabilityTests()
         for i in range(len(self.connections)):
             conn = self.connections[i]
             conn.cancelReachability()
@@ -464,7 +746,13 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
             else:
                 util.DEBUG_LOG("Found a good connection for {0}, but holding out for better", repr(self.name))
 
-        if self.pendingReachabilityRequests <= 0:
+        if self.activeConnection:
+            self.abortLosingReachabilityTests()
+        elif self.deferredTests:
+            # the head start didn't pay off, race the others right away
+            self.startDeferredReachabilityTests()
+
+        if self.pendingReachabilityRequests <= 0 and not self.deferredTests:
             # Retest the server with fallback enabled. hasFallback will only
             # be True if there are available insecure connections and fallback
             # is allowed.
@@ -479,6 +767,24 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
         from . import plexservermanager
         plexservermanager.MANAGER.updateReachabilityResult(self, bool(self.activeConnection))
 
+    def abortLosingReachabilityTests(self):
+        """
+        Cancels pending and deferred tests of connections that can't beat the active connection's score.
+        """
+        score = self.activeConnection.getScore()
+        # the active connection's own test still has to confirm it (e.g. when restored from the startup snapshot)
+        pending = [c for c in self.connections if c.hasPendingRequest and c is not self.activeConnection]
+        pending += [c for c, allowFallback in self.deferredTests]
+        if any(c.getPotentialScore() > score for c in pending):
+            return
+
+        self.dropDeferredReachabilityTests()
+        for conn in pending:
+            if conn.abortReachability():
+                self.pendingReachabilityRequests -= 1
+                if conn.isSecure:
+                    self.pendingSecureRequests -= 1
+
     def markAsRefreshing(self):
         for i in range(len(self.connections)):
             conn = self.connections[i]
@@ -1,5 +1,7 @@
 from __future__ import absolute_import
 import json
+import threading
+from xml.etree import ElementTree
 
 from . import http
 from . import plexconnection
@@ -31,6 +33,9 @@ class PlexServerManager(signalsmixin.SignalsMixin):
         self.channelServer = None
         self.deferReachabilityTimer = None
         self.reachabilityNeverTested = True
+        # True after the selected server was restored from the startup snapshot, until the UI has consumed it
+        self.snapshotPending = False
+        self._lastSnapshot = None
 
         self.startSelectedServerSearch()
         self.loadState()
@@ -69,6 +74,10 @@ class PlexServerManager(signalsmixin.SignalsMixin):
 
             # Notify anyone who might care.
             util.APP.trigger("change:selectedServer", server=server)
+            self.saveSnapshot()
+
+            if server:
+                threading.Thread(target=server.prewarm, name="SERVER-PREWARM").start()
 
             return True
 
@@ -220,6 +229,9 @@ class PlexServerManager(signalsmixin.SignalsMixin):
         searching = not self.selectedServer and self.searchContext
 
         if reachable:
+            if server == self.selectedServer:
+                self.saveSnapshot()
+
             # If we're in the middle of a search for our selected server, see if
             # this is a candidate.
             self.trigger('reachable:server', server=server)
@@ -351,6 +363,7 @@ class PlexServerManager(signalsmixin.SignalsMixin):
                 isFallback = hasSecureConn and conn['address'][:5] != "https" and not util.LOCAL_OVER_SECURE
                 sources = plexconnection.PlexConnection.SOURCE_BY_VAL[conn['sources']]
                 connection = plexconnection.PlexConnection(sources, conn['address'], conn['isLocal'], conn['token'], isFallback)
+                connection.latency = conn.get('latency')
 
                 # Keep the secure connection on top
                 if connection.isSecure and not util.LOCAL_OVER_SECURE:
@@ -398,7 +411,8 @@ class PlexServerManager(signalsmixin.SignalsMixin):
                         'address': conn.address,
                         'isLocal': conn.isLocal,
                         'isSecure': conn.isSecure,
-                        'token': conn.token
+                        'token': conn.token,
+                        'latency': conn.latency
                     })
 
                 obj['servers'].append(serverObj)
@@ -412,6 +426,74 @@ class PlexServerManager(signalsmixin.SignalsMixin):
 
     def clearState(self):
         util.INTERFACE.setRegistry("PlexServerManager", '')
+        util.INTERFACE.setRegistry("PlexServerManagerSnapshot", '')
+        self._lastSnapshot = None
+
+    def saveSnapshot(self):
+        """
+        Remembers the selected server and the connection that works for it, so the next start can use them right
+        away instead of waiting for resources and reachability tests. Sections and hubs are rendered from the query
+        cache on such a start.
+        """
+        server = self.selectedServer
+        conn = server and server.activeConnection
+        if not conn or conn.state != conn.STATE_REACHABLE or not server.rootAttributes:
+            return
+
+        jstring = json.dumps({
+            'account': plexapp.ACCOUNT.ID,
+            'uuid': server.uuid,
+            'address': conn.address,
+            'root': server.rootAttributes
+        })
+        if jstring != self._lastSnapshot:
+            util.INTERFACE.setRegistry("PlexServerManagerSnapshot", jstring)
+            self._lastSnapshot = jstring
+
+    def restoreSnapshot(self):
+        """
+        Selects the last known good server and connection from the startup snapshot, if they're still known. The
+        connection is assumed reachable; the reachability tests that are already running reconcile that.
+        """
+        if self.selectedServer:
+            return self.selectedServer
+
+        jstring = util.INTERFACE.getRegistry("PlexServerManagerSnapshot")
+        if not jstring:
+            return None
+
+        try:
+            snapshot = json.loads(jstring)
+        except:
+            util.ERROR()
+            return None
+
+        if snapshot.get('account') != plexapp.ACCOUNT.ID:
+            return None
+
+        server = self.serversByUuid.get(snapshot['uuid'])
+        if not server:
+            return None
+
+        for conn in server.connections:
+            if conn.address == snapshot['address']:
+                break
+        else:
+            return None
+
+        if conn.state not in (conn.STATE_UNKNOWN, conn.STATE_REACHABLE) or \
+                not server.collectDataFromRoot(ElementTree.Element('MediaContainer', snapshot['root'])) or \
+                not server.isSupported:
+            return None
+
+        conn.state = conn.STATE_REACHABLE
+        conn.getScore(True)
+        server.activeConnection = conn
+        util.LOG("Restored selected server from startup snapshot: {0}", server)
+
+        self.snapshotPending = True
+        self.setSelectedServer(server, True)
+        return self.selectedServer
 
     def isValidForTranscoding(self, server):
         return server and server.activeConnection and server.owned and not server.synced and not server.isSecondary()
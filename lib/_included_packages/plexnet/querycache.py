@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disk cache for PlexServer.query responses.
+
+Entries are keyed by server UUID and the request path (including the token, so different users don't share
+entries), stored as raw container XML and bounded by total size with LRU eviction. Entries are revalidated with
+conditional requests (ETag/Last-Modified) when the server provides validators, and otherwise are considered fresh
+for TTL seconds.
+"""
+from __future__ import absolute_import
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from . import util
+
+# cache modes for PlexServer.query(cache=...)
+CACHE_USE = 1  # return fresh entries without touching the network, revalidate stale ones
+CACHE_ONLY = 2  # return whatever is cached, never touch the network
+CACHE_REFRESH = 3  # always revalidate against the server
+
+# index entry fields
+# E_UPDATED is unused, kept so existing indexes stay readable
+E_SIZE, E_ACCESS, E_STORED, E_ETAG, E_LASTMOD, E_UPDATED, E_DIGEST = range(7)
+
+HOST_RE = re.compile(r'^\w+://[^/]+')
+
+
+class QueryCache(object):
+    MAX_SIZE = 50 * 1024 * 1024  # bytes
+    TTL = 300  # seconds
+    INDEX_NAME = "index.json"
+
+    def __init__(self):
+        self._path = None
+        self._index = None
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+    @property
+    def path(self):
+        if self._path is None:
+            self._path = os.path.join(util.translatePath(util.ADDON.getAddonInfo("profile")), "query_cache")
+            if not os.path.exists(self._path):
+                os.makedirs(self._path)
+        return self._path
+
+    @property
+    def index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._loadIndex()
+        return self._index
+
+    def _loadIndex(self):
+        index = OrderedDict()
+        size = 0
+        try:
+            with open(os.path.join(self.path, self.INDEX_NAME)) as f:
+                entries = json.load(f)
+        except (IOError, OSError, ValueError):
+            entries = {}
+
+        # oldest access first
+        for key, entry in sorted(entries.items(), key=lambda x: x[1][E_ACCESS]):
+            if os.path.exists(self._file(key)):
+                index[key] = entry
+                size += entry[E_SIZE]
+
+        self._removeOrphans(index)
+        # publish only once complete, readers outside the lock take the fast path in index
+        self.size = size
+        self._index = index
+
+    def _removeOrphans(self, index):
+        # entries written after the index was last stored (e.g. Kodi killed us on shutdown) aren't accounted for
+        for name in os.listdir(self.path):
+            key, ext = os.path.splitext(name)
+            if name == self.INDEX_NAME or ext == ".xml" and key in index:
+                continue
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+
+    def _file(self, key):
+        return os.path.join(self.path, key + ".xml")
+
+    @staticmethod
+    def key(server, url):
+        return hashlib.sha1("{0}:{1}".format(server.uuid, HOST_RE.sub('', url)).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the cached body for key, or None.
+        """
+        with self._lock:
+            entry = self.index.get(key)
+            if not entry:
+                return None
+
+            try:
+                with open(self._file(key), "rb") as f:
+                    data = f.read()
+            except (IOError, OSError):
+                self._remove(key)
+                return None
+
+            entry[E_ACCESS] = time.time()
+            self.index.move_to_end(key)
+            self._dirty = True
+            return data
+
+    def isFresh(self, key):
+        entry = self.index.get(key)
+        return bool(entry) and time.time() - entry[E_STORED] < self.TTL
+
+    def conditionalHeaders(self, key):
+        entry = self.index.get(key)
+        headers = {}
+        if not entry:
+            return headers
+
+        if entry[E_ETAG]:
+            headers["If-None-Match"] = entry[E_ETAG]
+        if entry[E_LASTMOD]:
+            headers["If-Modified-Since"] = entry[E_LASTMOD]
+        return headers
+
+    def isUnchanged(self, key, data):
+        """
+        Checks whether a freshly received body matches the cached entry by content digest. The container's
+        updatedAt attribute isn't enough, as it doesn't change with watch state.
+        """
+        entry = self.index.get(key)
+        if not entry:
+            return False
+
+        return hashlib.sha1(data).hexdigest() == entry[E_DIGEST]
+
+    def touch(self, key):
+        """
+        Marks an entry as revalidated by the server.
+        """
+        with self._lock:
+            entry = self.index.get(key)
+            if entry:
+                entry[E_STORED] = entry[E_ACCESS] = time.time()
+                self.index.move_to_end(key)
+                self._dirty = True
+
+    def set(self, key, data, headers=None):
+        headers = headers or {}
+        with self._lock:
+            # load the index before writing, or the new file would be dropped as an orphan
+            old = self.index.pop(key, None)
+            if old:
+                self.size -= old[E_SIZE]
+
+            try:
+                with open(self._file(key), "wb") as f:
+                    f.write(data)
+            except (IOError, OSError):
+                util.ERROR("Couldn't write query cache entry")
+                self._dirty = True
+                return
+
+            t = time.time()
+            self.index[key] = [len(data), t, t, headers.get("ETag"), headers.get("Last-Modified"),
+                               None, hashlib.sha1(data).hexdigest()]
+            self.size += len(data)
+            self._dirty = True
+            self._local.changes = self.changeCount() + 1
+            self._evict()
+
+    def _remove(self, key):
+        entry = self.index.pop(key, None)
+        if entry:
+            self.size -= entry[E_SIZE]
+            self._dirty = True
+        try:
+            os.remove(self._file(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self.size > self.MAX_SIZE and self.index:
+            key = next(iter(self.index))
+            self._remove(key)
+            self.evictions += 1
+
+    def changeCount(self):
+        """
+        Number of entries the calling thread has stored with new data. Callers refreshing cached data in the
+        background compare this before and after to decide whether anything needs to be re-rendered.
+        """
+        return getattr(self._local, "changes", 0)
+
+    def addChanges(self, count):
+        """
+        Credits the calling thread with changes another thread stored on its behalf (merged or concurrent queries).
+        """
+        if count:
+            self._local.changes = self.changeCount() + count
+
+    def hit(self):
+        self.hits += 1
+
+    def miss(self):
+        self.misses += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.index),
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "evictions": self.evictions,
+            "hitRatio": total and float(self.hits) / total or 0.0
+        }
+
+    def store(self):
+        with self._lock:
+            if not self._dirty or self._index is None:
+                return
+
+            try:
+                with open(os.path.join(self.path, self.INDEX_NAME), "w") as f:
+                    json.dump(self._index, f)
+                self._dirty = False
+            except (IOError, OSError):
+                util.ERROR("Couldn't write query cache index")
+
+        util.DEBUG_LOG("Query cache stats: {0}", lambda: self.stats())
+
+    def clear(self):
+        with self._lock:
+            for key in list(self.index.keys()):
+                self._remove(key)
+            self.store()
+
+
+CACHE = QueryCache()
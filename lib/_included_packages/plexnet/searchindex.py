@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+Client side search index over the library sections of a server, for instant results while typing.
+
+The index is built in the background from the section listings and kept per server. Items are stored as
+compactitems rows; titles, sort titles and years are indexed by word, with a sorted word list for prefix lookups
+and title trigrams for matches inside words. Actor and director names from the listings are indexed by word, so
+searching for a name finds their movies. Server side search results are merged in by the caller afterwards.
+"""
+from __future__ import absolute_import
+import re
+import time
+import heapq
+import bisect
+import threading
+import unicodedata
+from array import array
+
+from . import util
+from . import plexobjects
+from . import compactitems
+from . import exceptions
+
+SECTION_TYPES = ('movie', 'show', 'artist')
+HUB_TITLES = {'movie': 'Movies', 'show': 'Shows', 'artist': 'Artists'}
+NAME_TAGS = ('Role', 'Director')
+# attributes kept for showing and opening results; everything else in the listings is dropped to save memory
+KEEP_ATTRS = frozenset(('ratingKey', 'key', 'type', 'title', 'year', 'thumb', 'parentTitle', 'index'))
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    if text.isascii():
+        return text.lower()
+    text = unicodedata.normalize('NFKD', text)
+    return u''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def words(text):
+    return WORD_RE.findall(normalize(text))
+
+
+def _add(postings, key, itemID):
+    # most keys only ever point to one item; don't spend an array on those
+    ids = postings.get(key)
+    if ids is None:
+        postings[key] = itemID
+    elif isinstance(ids, int):
+        if ids != itemID:
+            postings[key] = array('I', (ids, itemID))
+    elif ids[-1] != itemID:
+        ids.append(itemID)
+
+
+def _ids(value):
+    return isinstance(value, int) and (value,) or value
+
+
+class ResultHub(object):
+    """
+    Quacks like the plexlibrary.Hub objects the search dialog shows.
+    """
+    def __init__(self, hubType, title, items):
+        self.type = hubType
+        self.hubIdentifier = 'local.' + hubType
+        self.title = title
+        self.items = items
+        self.size = plexobjects.PlexValue(str(len(items)))
+
+    def __repr__(self):
+        return '<{0}:{1}>'.format(self.__class__.__name__, self.hubIdentifier)
+
+
+class SearchIndex(object):
+    MAX_AGE = 3600  # seconds until the index is rebuilt
+    MAX_CANDIDATES = 2000  # per prefix lookup
+
+    def __init__(self, server):
+        self.server = server
+        self.ready = False
+        self.builtAt = 0
+        self._thread = None
+        self._abort = False
+        self._data = None
+        self.stats = {}
+
+    def ensureBuilt(self):
+        """
+        Starts building the index in the background if it doesn't exist yet or is outdated.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        if self.ready and time.time() - self.builtAt < self.MAX_AGE:
+            return
+
+        self._abort = False
+        self._thread = threading.Thread(target=self._build, name="SEARCH-INDEX")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def abort(self):
+        self._abort = True
+
+    def _build(self):
+        try:
+            self.build()
+        except Exception:
+            util.ERROR("Couldn't build search index")
+
+    def build(self):
+        start = time.time()
+        items = []
+        titles = []
+        sections = array('H')
+        sectionKeys = []
+        sectionTypes = []
+        tokens = {}
+        trigrams = {}
+
+        for section in self.server.library.sections():
+            if section.type not in SECTION_TYPES:
+                continue
+
+            sectionIdx = len(sectionKeys)
+            sectionKeys.append(str(section.key))
+            sectionTypes.append(str(section.type))
+            path = '/library/sections/{0}/all'.format(section.key)
+            table = None
+            expected = received = 0
+            for elem in self.server.iterQuery(path):
+                if self._abort:
+                    return
+
+                if table is None:
+                    container = plexobjects.PlexContainer(elem, path, self.server, path)
+                    table = compactitems.ItemTable(self.server, path, container)
+                    expected = int(elem.attrib.get('size', 0))
+                    continue
+
+                received += 1
+
+                attrib = elem.attrib
+                title = normalize(attrib.get('title', ''))
+                titleWords = WORD_RE.findall(title)
+                otherWords = words(u' '.join((attrib.get('titleSort', ''), attrib.get('year', ''))))
+                for child in list(elem):
+                    if child.tag in NAME_TAGS:
+                        otherWords += words(child.attrib.get('tag', ''))
+                    # the rest of the listing data isn't needed for search results
+                    elem.remove(child)
+
+                for name in [name for name in attrib if name not in KEEP_ATTRS]:
+                    del attrib[name]
+
+                try:
+                    items.append(table.append(elem))
+                except exceptions.UnknownType:
+                    continue
+
+                itemID = len(items) - 1
+                for word in titleWords:
+                    _add(tokens, word, itemID)
+                    for i in range(len(word) - 2):
+                        _add(trigrams, word[i:i + 3], itemID)
+
+                for word in otherWords:
+                    _add(tokens, word, itemID)
+
+                titles.append(title)
+                sections.append(sectionIdx)
+
+            if received < expected:
+                # don't settle for a partial index until it's rebuilt
+                raise exceptions.IncompleteResponse(
+                    'Section {0}: got {1} of {2} items'.format(section.key, received, expected))
+
+        self._data = (items, titles, sections, sectionKeys, sectionTypes, tokens, sorted(tokens), trigrams)
+        self.ready = True
+        self.builtAt = time.time()
+        self.stats = {
+            "items": len(items),
+            "words": len(tokens),
+            "trigrams": len(trigrams),
+            "postings": sum(len(_ids(v)) for v in tokens.values()) + sum(len(_ids(v)) for v in trigrams.values()),
+            "buildTime": round(self.builtAt - start, 2)
+        }
+        util.LOG("Search index for {0} built: {1}", self.server.name, self.stats)
+
+    def _match(self, word, data):
+        items, titles, sections, sectionKeys, sectionTypes, tokens, sortedTokens, trigrams = data
+        ids = set()
+        # words starting with word; very short prefixes match most of the library, so stop early for those, the
+        # next keystroke will narrow it down
+        i = bisect.bisect_left(sortedTokens, word)
+        while i < len(sortedTokens) and sortedTokens[i].startswith(word) and len(ids) < self.MAX_CANDIDATES:
+            ids.update(_ids(tokens[sortedTokens[i]]))
+            i += 1
+
+        # titles containing word: check the titles having the word's rarest trigram
+        if len(word) > 2:
+            postings = [trigrams.get(word[i:i + 3]) for i in range(len(word) - 2)]
+            if all(p is not None for p in postings):
+                rarest = min((_ids(p) for p in postings), key=len)
+                ids.update(itemID for itemID in rarest if word in titles[itemID])
+
+        return ids
+
+    def search(self, query, sectionID=None, limit=10):
+        """
+        Returns a ResultHub per section type with the best matching items for query; an empty list while the index
+        isn't ready.
+        """
+        data = self._data
+        qwords = words(query)
+        if not data or not qwords:
+            return []
+
+        items, titles, sections, sectionKeys, sectionTypes, tokens, sortedTokens, trigrams = data
+        ids = None
+        for word in qwords:
+            matched = self._match(word, data)
+            ids = matched if ids is None else ids & matched
+            if not ids:
+                return []
+
+        byType = {}
+        sectionID = sectionID is not None and str(sectionID) or None
+        for itemID in ids:
+            sectionIdx = sections[itemID]
+            if sectionID is None or sectionKeys[sectionIdx] == sectionID:
+                byType.setdefault(sectionTypes[sectionIdx], []).append(itemID)
+
+        phrase = u' '.join(qwords)
+
+        def rank(itemID):
+            title = titles[itemID]
+            return not title.startswith(phrase), phrase not in title, len(title), itemID
+
+        for hubType, typeIDs in byType.items():
+            byType[hubType] = [items[itemID] for itemID in heapq.nsmallest(limit, typeIDs, key=rank)]
+
+        return [ResultHub(t, HUB_TITLES.get(t, t.capitalize()), byType[t]) for t in SECTION_TYPES if t in byType]
+
+
+class SearchIndexes(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes = {}
+
+    def get(self, server):
+        """
+        Returns the search index for server, and starts (re)building it if necessary.
+        """
+        with self._lock:
+            index = self._indexes.get(server.uuid)
+            if index is None:
+                index = self._indexes[server.uuid] = SearchIndex(server)
+            else:
+                # connections might have changed
+                index.server = server
+
+        index.ensureBuilt()
+        return index
+
+    def abort(self):
+        with self._lock:
+            for index in self._indexes.values():
+                index.abort()
+
+
+INDEXES = SearchIndexes()
@@ -8,6 +8,8 @@ import sys
 import time
 import platform
 import uuid
+import heapq
+import itertools
 import threading
 import six
 import math
@@ -319,6 +321,153 @@ class CompatEvent(Event):
         return self.isSet()
 
 
+class TimerScheduler(object):
+    """
+    Runs all Timers (and deferred calls) on one thread instead of a sleeping thread per timer. Due times are kept
+    in a heap; canceled and rescheduled entries are invalidated in place and skipped when they reach the top, so
+    scheduling, canceling and resetting are O(log n). Callbacks run one after another on the scheduler thread; how
+    late they ran is tracked for diagnostics, see stats().
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._heap = []
+        self._seq = itertools.count()
+        self._thread = None
+        self._abort = False
+        self.scheduled = 0
+        self.fired = 0
+        self.lateness = 0.0
+        self.maxLateness = 0.0
+
+    def _push(self, due, target):
+        # call with the lock held
+        entry = [due, next(self._seq), target]
+        heapq.heappush(self._heap, entry)
+        self.scheduled += 1
+        if self._heap[0] is entry:
+            self._wakeup.notify()
+
+        if not self._thread or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="TIMERS")
+            self._thread.daemon = True
+            self._thread.start()
+        return entry
+
+    def _invalidate(self, timer):
+        # call with the lock held
+        if timer._entry:
+            timer._entry[2] = None
+            timer._entry = None
+            self.scheduled -= 1
+
+    def schedule(self, timer, delay):
+        with self._lock:
+            self._invalidate(timer)
+            if not self._abort:
+                timer._entry = self._push(time.monotonic() + delay, timer)
+                return
+
+        # shut down; don't leave anybody joining the timer waiting
+        timer._finish()
+
+    def unschedule(self, timer):
+        """
+        Drops the timer's pending run and has the scheduler thread finish it.
+        """
+        with self._lock:
+            self._invalidate(timer)
+            if timer._done.isSet():
+                return
+            if not self._abort:
+                timer._entry = self._push(time.monotonic(), timer)
+                return
+
+        timer._finish()
+
+    def callLater(self, delay, function, *args, **kwargs):
+        with self._lock:
+            if not self._abort:
+                self._push(time.monotonic() + delay, (function, args, kwargs))
+
+    def isSchedulerThread(self):
+        return threading.current_thread() is self._thread
+
+    def shutdown(self):
+        """
+        Drops everything scheduled, finishes the pending timers and lets the scheduler thread end.
+        """
+        with self._lock:
+            self._abort = True
+            timers = [entry[2] for entry in self._heap if isinstance(entry[2], Timer)]
+            self._heap = []
+            self.scheduled = 0
+            self._wakeup.notify_all()
+
+        for timer in timers:
+            timer._entry = None
+            timer.event.set()
+            timer._finish()
+
+    def _next(self):
+        with self._lock:
+            while True:
+                if self._abort:
+                    return None
+
+                heap = self._heap
+                while heap and heap[0][2] is None:
+                    heapq.heappop(heap)
+
+                now = time.monotonic()
+                if heap and heap[0][0] <= now:
+                    due, _, target = heapq.heappop(heap)
+                    self.scheduled -= 1
+                    if isinstance(target, Timer):
+                        target._entry = None
+                    return target, now - due
+
+                self._wakeup.wait(heap[0][0] - now if heap else None)
+
+    def _run(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+
+            target, late = item
+            try:
+                if isinstance(target, Timer):
+                    if target.event.isSet() or target.shouldAbort():
+                        target._finish()
+                        continue
+
+                    self._ran(late)
+                    target._fire()
+                else:
+                    self._ran(late)
+                    function, args, kwargs = target
+                    function(*args, **kwargs)
+            except:
+                ERROR()
+
+    def _ran(self, late):
+        self.fired += 1
+        self.lateness += late
+        self.maxLateness = max(self.maxLateness, late)
+
+    def stats(self):
+        return {
+            "timers": self.scheduled,
+            "fired": self.fired,
+            "avgLateness": self.fired and round(self.lateness / self.fired * 1000, 1) or 0.0,
+            "maxLateness": round(self.maxLateness * 1000, 1)
+        }
+
+
+SCHEDULER = TimerScheduler()
+
+
 class Timer(object):
     def __init__(self, timeout, function, repeat=False, name=None, fname=None, *args, **kwargs):
         self.function = function
@@ -326,56 +475,72 @@ class Timer(object):
         self.repeat = repeat
         self.args = args
         self.kwargs = kwargs
-        self._reset = False
         self.name = name or 'TIMER:{0}'.format(self.function)
         self.fname = fname or repr(self.function)
         self.event = CompatEvent()
+        self._done = CompatEvent()
+        self._entry = None
+        self._due = 0
         self.start()
 
-    def start(self):
+    def start(self, _reset=False):
         self.event.clear()
-        self.thread = threading.Thread(target=self.run, name=self.name, *self.args, **self.kwargs)
-        self.thread.start()
+        self._done.clear()
+        DEBUG_LOG('Timer {0}: {1}'.format(self.fname, _reset and 'RESET' or 'STARTED'))
+        self._due = time.monotonic() + self.timeout
+        SCHEDULER.schedule(self, self.timeout)
 
-    def run(self):
-        DEBUG_LOG('Timer {0}: {1}'.format(self.fname, self._reset and 'RESET'or 'STARTED'))
+    def _fire(self):
+        # runs on the scheduler thread
         try:
-            while not self.event.isSet() and not self.shouldAbort():
-                while not self.event.wait(self.timeout) and not self.shouldAbort():
-                    if self._reset:
-                        return
+            self.function(*self.args, **self.kwargs)
+        except:
+            self._finish()
+            raise
+
+        if self._entry:
+            # reset or canceled meanwhile
+            return
+
+        if not self.repeat or self.event.isSet():
+            self._finish()
+            return
+
+        # keep the pace, but don't try to catch up on runs we've missed
+        now = time.monotonic()
+        self._due += self.timeout
+        if self._due < now:
+            self._due = now + self.timeout
+        SCHEDULER.schedule(self, self._due - now)
+
+    def _finish(self):
+        if self._done.isSet():
+            return
 
-                    self.function(*self.args, **self.kwargs)
-                    if not self.repeat:
-                        return
-        finally:
-            if not self._reset:
-                if self in APP.timers:
-                    APP.timers.remove(self)
-
-                DEBUG_LOG('Timer {0}: FINISHED'.format(self.fname))
+        self.event.set()
+        if self in APP.timers:
+            APP.timers.remove(self)
 
-            self._reset = False
+        DEBUG_LOG('Timer {0}: FINISHED'.format(self.fname))
+        self._done.set()
 
     def cancel(self):
         self.event.set()
+        SCHEDULER.unschedule(self)
 
     def reset(self):
-        self._reset = True
-        self.cancel()
-        if self.thread and self.thread.is_alive():
-            self.thread.join()
-        self.start()
+        self.start(_reset=True)
 
     def is_alive(self):
-        return self.thread and self.thread.is_alive()
+        return not self._done.isSet()
 
     def shouldAbort(self):
         return False
 
     def join(self, timeout=None):
-        if self.thread.is_alive():
-            self.thread.join(timeout=timeout)
+        # callbacks joining their own timer would wait forever
+        if not SCHEDULER.isSchedulerThread():
+            self._done.wait(timeout)
 
     def isExpired(self):
         return self.event.isSet()
@@ -598,8 +598,13 @@ class Show(Video, media.RelatedMixin, SectionOnDeckMixin):
     def playbackSettings(self):
         return util.INTERFACE.playbackManager(self)
 
-    def seasons(self):
+    def seasons(self, cache=None):
         path = self.key
+        if cache:
+            data = self.server.query(path, cache=cache)
+            if data is None:
+                return None
+            return plexobjects.listItems(self.server, path, Season.TYPE, data=data)
         return plexobjects.listItems(self.server, path, Season.TYPE)
 
     def season(self, title):
@@ -1,6 +1,8 @@
 from __future__ import absolute_import
 import six.moves.queue
 import heapq
+import itertools
+import threading
 from kodi_six import xbmc
 from . import util
 from plexnet import threadutils
@@ -8,10 +10,11 @@ from six.moves import range
 
 
 class Tasks(list):
+    """
+    A group of tasks belonging to one window; cancelling the group drops its queued tasks from the threader.
+    """
     def add(self, task):
-        for t in self:
-            if not t.isValid():
-                self.remove(t)
+        self[:] = [t for t in self if t.isValid()]
 
         if isinstance(task, list):
             self += task
@@ -19,8 +22,11 @@ class Tasks(list):
             self.append(task)
 
     def cancel(self):
-        while self:
-            self.pop().cancel()
+        tasks = self[:]
+        del self[:]
+        for t in tasks:
+            t.cancel()
+        BGThreader.removeTasks(tasks)
 
     def kill(self):
         self.cancel()
@@ -65,22 +71,63 @@ class Task:
         return not self.finished and not self._canceled
 
 
-class MutablePriorityQueue(six.moves.queue.PriorityQueue):
-    def _get(self, heappop=heapq.heappop):
-        self.queue.sort()
-        return heappop(self.queue)
+class IndexedPriorityQueue(object):
+    """
+    Task heap with an index from task to heap entry, so queued tasks can be reprioritized or removed in O(log n).
+    Superseded entries are invalidated in place and skipped when they reach the top of the heap.
+    """
+    REMOVED = None
+
+    def __init__(self):
+        self.mutex = threading.Lock()
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def empty(self):
+        return not self._entries
+
+    def put(self, task):
+        """Queue task at task._priority, or reprioritize it if it's already queued."""
+        with self.mutex:
+            self._remove(task)
+            entry = [task._priority, next(self._counter), task]
+            self._entries[task] = entry
+            heapq.heappush(self._heap, entry)
+
+    def _remove(self, task):
+        entry = self._entries.pop(task, None)
+        if entry is not None:
+            entry[-1] = self.REMOVED
+
+    def remove(self, task):
+        with self.mutex:
+            self._remove(task)
+
+    def get_nowait(self):
+        with self.mutex:
+            while self._heap:
+                task = heapq.heappop(self._heap)[-1]
+                if task is not self.REMOVED:
+                    del self._entries[task]
+                    return task
+        raise six.moves.queue.Empty
+
+    def task_done(self):
+        pass
 
     def lowest(self):
-        """Return the lowest priority item in the queue (not reliable!)."""
-        self.mutex.acquire()
-        try:
-            lowest = self.queue and min(self.queue) or None
-        except:
-            lowest = None
-            util.ERROR()
-        finally:
-            self.mutex.release()
-        return lowest
+        """Return the lowest priority task in the queue."""
+        with self.mutex:
+            while self._heap and self._heap[0][-1] is self.REMOVED:
+                heapq.heappop(self._heap)
+            return self._heap and self._heap[0][-1] or None
+
+    def __contains__(self, task):
+        return task in self._entries
 
 
 class BackgroundWorker:
@@ -151,15 +198,20 @@ class BackgroundWorker:
 class BackgroundThreader:
     def __init__(self, name=None, worker_count=5):
         self.name = name
-        self._queue = MutablePriorityQueue()
+        self._queue = IndexedPriorityQueue()
         self._abort = False
         self._priority = -1
+        self._frontPriority = 0
         self.workers = [BackgroundWorker(self._queue, 'queue.{0}:worker.{1}'.format(self.name, x)) for x in range(worker_count)]
 
     def _nextPriority(self):
         self._priority += 1
         return self._priority
 
+    def _nextFrontPriorities(self, count):
+        self._frontPriority -= count
+        return self._frontPriority
+
     def abort(self):
         self._abort = True
         for w in self.workers:
@@ -188,11 +240,8 @@ class BackgroundThreader:
         self.startWorkers()
 
     def addTasksToFront(self, tasks):
-        lowest = self.getLowestPrority()
-        if lowest is None:
-            return self.addTasks(tasks)
-
-        p = lowest - len(tasks)
+        """Queue tasks ahead of everything else, keeping their order. Already queued tasks are moved."""
+        p = self._nextFrontPriorities(len(tasks))
         for t in tasks:
             t._priority = p
             self._queue.put(t)
@@ -200,9 +249,20 @@ class BackgroundThreader:
 
         self.startWorkers()
 
+    def removeTasks(self, tasks):
+        for t in tasks:
+            self._queue.remove(t)
+
     def startWorkers(self):
+        # only spin up as many idle workers as there are queued tasks; running workers might be busy with a long
+        # task or about to exit, so they don't count
+        needed = len(self._queue)
         for w in self.workers:
-            w.start()
+            if needed <= 0:
+                break
+            if not w.working():
+                w.start()
+                needed -= 1
 
     def working(self):
         return not self._queue.empty() or self.hasTask()
@@ -218,11 +278,10 @@ class BackgroundThreader:
         return lowest._priority
 
     def moveToFront(self, qitem):
-        lowest = self.getLowestPrority()
-        if lowest is None:
+        if qitem not in self._queue:
             return
 
-        qitem._priority = lowest - 1
+        self.addTasksToFront([qitem])
 
     def kill(self):
         for w in self.workers:
@@ -40,8 +40,11 @@ class KodiCacheManager(object):
 
     def __init__(self):
         if KODI_BUILD_NUMBER >= 2090821:
-            self.memorySize = rpc.Settings.GetSettingValue(setting='filecache.memorysize')['value']
-            self.readFactor = rpc.Settings.GetSettingValue(setting='filecache.readfactor')['value'] / 100.0
+            with rpc.batch() as batch:
+                memorySize = batch.Settings.GetSettingValue(setting='filecache.memorysize')
+                readFactor = batch.Settings.GetSettingValue(setting='filecache.readfactor')
+            self.memorySize = memorySize.result()['value']
+            self.readFactor = readFactor.result()['value'] / 100.0
             if self.readFactor % 1 == 0:
                 self.readFactor = int(self.readFactor)
             DEBUG_LOG("Not using advancedsettings.xml for cache/buffer management, we're at least Kodi 21 non-alpha")
@@ -3,9 +3,11 @@
 import os
 import json
 import time
-import copy
 import zlib
+import sqlite3
+import threading
 
+import six
 from kodi_six import xbmcvfs
 
 from plexnet import plexapp
@@ -14,77 +16,132 @@ from . util import translatePath, ADDON, ERROR, DEBUG_LOG, LOG
 
 
 class DataCacheManager(object):
-    # store arbitrary data in JSON on disk
-    DATA_CACHES_VERSION = 2
-    DATA_CACHES = {
-        "general": {},
-        "cache": {}
-    }
-    DC_LAST_UPDATE = None
-    DC_PATH = os.path.join(translatePath(ADDON.getAddonInfo("profile")), "data_cache.json")
+    # store arbitrary data in an SQLite database on disk, one row per (server, context, identifier)
+    DATA_CACHES_VERSION = 3
+    DC_PATH = os.path.join(translatePath(ADDON.getAddonInfo("profile")), "data_cache.db")
+    DC_LEGACY_PATH = os.path.join(translatePath(ADDON.getAddonInfo("profile")), "data_cache.json")
     DC_LRU_TIMEOUT = 30
     DC_LRUP_TIMEOUT = 90
     USE_GZ = False
 
     def __init__(self):
         self._currentServerUUID = None
+        self._lock = threading.Lock()
+        self._db = None
         plexapp.util.APP.on('change:selectedServer', self.setServerUUID)
-        if self.USE_GZ:
-            self.DC_PATH += "z"
-        if xbmcvfs.exists(self.DC_PATH):
-            try:
-                f = xbmcvfs.File(self.DC_PATH)
-                d = f.readBytes() if self.USE_GZ else f.read()
-                f.close()
-
-                tdc = json.loads(zlib.decompress(d).decode("utf-8") if self.USE_GZ else d)
-                old_ver = tdc["general"].get("version", 0)
-                if old_ver < self.DATA_CACHES_VERSION:
-                    # this is where we migrate
-                    if old_ver == 1:
-                        tdc = self.DATA_CACHES.copy()
-                    tdc["general"]["version"] = self.DATA_CACHES_VERSION
-                    tdc["general"]["updated"] = time.time()
-                    self.DATA_CACHES = tdc
-                    self.storeDataCache()
-                else:
-                    tdc["general"]["version"] = self.DATA_CACHES_VERSION
-                    self.DATA_CACHES.update(tdc)
-                self.dataCacheCleanup()
-                self.DC_LAST_UPDATE = self.DATA_CACHES["general"]["updated"]
-            except:
-                ERROR("Couldn't read data_cache.json")
-                self.DATA_CACHES["general"]["updated"] = time.time()
-                self.storeDataCache()
+        try:
+            self._db = sqlite3.connect(self.DC_PATH, check_same_thread=False)
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS general (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS cache (
+                    server TEXT NOT NULL,
+                    context TEXT NOT NULL,
+                    identifier TEXT NOT NULL,
+                    data TEXT,
+                    updated REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (server, context, identifier)
+                );
+                CREATE INDEX IF NOT EXISTS cache_last_access ON cache (last_access);
+            """)
+            if self._getGeneral("version") is None:
+                self.migrateLegacyCache()
+                self._setGeneral("version", self.DATA_CACHES_VERSION)
+                self._db.commit()
+            self.dataCacheCleanup()
+        except sqlite3.Error:
+            ERROR("Couldn't open data_cache.db")
+            self._db = None
 
     def deinit(self):
         plexapp.util.APP.off('change:selectedServer', self.setServerUUID)
+        with self._lock:
+            if self._db:
+                self._db.close()
+                self._db = None
+                self._db = None
+
+    def _getGeneral(self, key):
+        row = self._db.execute("SELECT value FROM general WHERE key = ?", (key,)).fetchone()
+        return row and json.loads(row[0])
+
+    def _setGeneral(self, key, value):
+        self._db.execute("INSERT OR REPLACE INTO general (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def migrateLegacyCache(self):
+        """
+        One-time import of the old data_cache.json(z) file
+        """
+        path = self.DC_LEGACY_PATH + (self.USE_GZ and "z" or "")
+        if not xbmcvfs.exists(path):
+            return
+
+        try:
+            f = xbmcvfs.File(path)
+            d = f.readBytes() if self.USE_GZ else f.read()
+            f.close()
+
+            tdc = json.loads(zlib.decompress(d).decode("utf-8") if self.USE_GZ else d)
+            # version 1 caches were discarded on upgrade as well
+            if tdc["general"].get("version", 0) >= 2:
+                rows = []
+                for server, contexts in tdc["cache"].items():
+                    for context, identifiers in contexts.items():
+                        for identifier, iddata in identifiers.items():
+                            rows.append((server, context, identifier, json.dumps(iddata["data"]), iddata["updated"],
+                                         iddata["last_access"]))
+
+                self._db.executemany("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?)", rows)
+                LOG("Migrated {} entries from data_cache.json", len(rows))
+        except:
+            ERROR("Couldn't migrate data_cache.json")
+
+        xbmcvfs.delete(path)
 
     def getCacheData(self, context, identifier):
-        ret = self.DATA_CACHES["cache"].get(self._currentServerUUID, {}).get(context, {}).get(identifier, {})
-        if "data" in ret and ret["data"]:
-            # purge old data (> X days last updated)
-            if ret["updated"] < time.time() - self.DC_LRUP_TIMEOUT * 3600 * 24:
-                del self.DATA_CACHES["cache"][self._currentServerUUID][context][identifier]
+        if not self._db:
+            return None
+
+        key = (self._currentServerUUID or "", context, six.text_type(identifier))
+        with self._lock:
+            # deinit might have closed the database in the meantime
+            if not self._db:
+                return None
+
+            try:
+                row = self._db.execute("SELECT data, updated FROM cache WHERE server = ? AND context = ? AND "
+                                       "identifier = ?", key).fetchone()
+                if not row:
+                    return None
+
+                # purge old data (> X days last updated)
+                if row[1] < time.time() - self.DC_LRUP_TIMEOUT * 3600 * 24:
+                    self._db.execute("DELETE FROM cache WHERE server = ? AND context = ? AND identifier = ?", key)
+                    return None
+
+                self._db.execute("UPDATE cache SET last_access = ? WHERE server = ? AND context = ? AND "
+                                 "identifier = ?", (time.time(),) + key)
+            except sqlite3.Error:
+                ERROR("Couldn't read from data_cache.db")
                 return None
 
-            self.DATA_CACHES["cache"][self._currentServerUUID][context][identifier]["last_access"] = time.time()
-            return ret["data"]
+        return json.loads(row[0]) or None
 
     def setCacheData(self, context, identifier, value):
-        if self._currentServerUUID not in self.DATA_CACHES["cache"]:
-            self.DATA_CACHES["cache"][self._currentServerUUID] = {}
-        if context not in self.DATA_CACHES["cache"][self._currentServerUUID]:
-            self.DATA_CACHES["cache"][self._currentServerUUID][context] = {}
-        if identifier not in self.DATA_CACHES["cache"][self._currentServerUUID][context]:
-            self.DATA_CACHES["cache"][self._currentServerUUID][context][identifier] = {}
+        if not self._db:
+            return
+
         t = time.time()
-        self.DATA_CACHES["general"]["updated"] = t
-        self.DATA_CACHES["cache"][self._currentServerUUID][context][identifier] = {
-            "updated": t,
-            "last_access": t,
-            "data": value
-        }
+        with self._lock:
+            if not self._db:
+                return
+
+            try:
+                self._db.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?)",
+                                 (self._currentServerUUID or "", context, six.text_type(identifier), json.dumps(value),
+                                  t, t))
+            except sqlite3.Error:
+                ERROR("Couldn't write to data_cache.db")
 
     def setServerUUID(self, server=None, **kwargs):
         if not server and not plexapp.SERVERMANAGER.selectedServer:
@@ -92,30 +149,29 @@ class DataCacheManager(object):
         self._currentServerUUID = (server if server is not None else plexapp.SERVERMANAGER.selectedServer).uuid[-8:]
 
     def dataCacheCleanup(self):
-        d = copy.deepcopy(self.DATA_CACHES)
-        t = time.time()
-        for k, contexts in d["cache"].items():
-            for context, identifiers in contexts.items():
-                for identifier, iddata in identifiers.items():
-                    # clean up anything not accessed during the last X days
-                    if iddata["last_access"] < t - self.DC_LRU_TIMEOUT * 3600 * 24:
-                        DEBUG_LOG("Clearing cached data for: {}: {}".format(context, identifier))
-                        del self.DATA_CACHES["cache"][k][context][identifier]
+        # clean up anything not accessed during the last X days
+        with self._lock:
+            if not self._db:
+                return
+
+            count = self._db.execute("DELETE FROM cache WHERE last_access < ?",
+                                     (time.time() - self.DC_LRU_TIMEOUT * 3600 * 24,)).rowcount
+        if count:
+            DEBUG_LOG("Cleared {} expired data cache entries", count)
 
     def storeDataCache(self):
-        lu = self.DATA_CACHES["general"].get("updated")
-        if self.DATA_CACHES and lu and self.DC_LAST_UPDATE != lu:
-            try:
-                dcf = xbmcvfs.File(self.DC_PATH, "w")
-                self.dataCacheCleanup()
-                d = json.dumps(self.DATA_CACHES)
-                if self.USE_GZ:
-                    d = zlib.compress(d.encode("utf-8"))
-                dcf.write(d)
-                dcf.close()
-                LOG("Data cache written to: addon_data/script.zidooplexmod/data_cache.json")
-            except:
-                ERROR("Couldn't write data_cache.json")
+        if not self._db:
+            return
+
+        try:
+            self.dataCacheCleanup()
+            with self._lock:
+                if not self._db:
+                    return
+                self._db.commit()
+            LOG("Data cache written to: addon_data/script.zidooplexmod/data_cache.db")
+        except sqlite3.Error:
+            ERROR("Couldn't write data_cache.db")
 
 
 dcm = DataCacheManager()
@@ -1,6 +1,19 @@
 from __future__ import absolute_import
 from kodi_six import xbmc
 import json
+import threading
+
+
+def _command(method, params, cid=1):
+    command = {
+        'jsonrpc': '2.0',
+        'id': cid,
+        'method': method
+    }
+
+    if params:
+        command['params'] = params
+    return command
 
 
 class JSONRPCMethod:
@@ -8,22 +21,26 @@ class JSONRPCMethod:
     class Exception(Exception):
         pass
 
-    def __init__(self):
-        self.family = None
+    def __init__(self, family=None):
+        self.family = family
+        self.handlers = {}
 
     def __getattr__(self, method):
-        def handler(**kwargs):
-            command = {
-                'jsonrpc': '2.0',
-                'id': 1,
-                'method': '{0}.{1}'.format(self.family, method)
-            }
+        if method.startswith('__'):
+            raise AttributeError(method)
+
+        handler = self.handlers.get(method)
+        if handler:
+            return handler
 
-            if kwargs:
-                command['params'] = kwargs
+        fullMethod = '{0}.{1}'.format(self.family, method)
 
+        def handler(**kwargs):
             # xbmc.log(json.dumps(command))
-            ret = json.loads(xbmc.executeJSONRPC(json.dumps(command)))
+            ret = json.loads(xbmc.executeJSONRPC(json.dumps(_command(fullMethod, kwargs))))
+
+            if fullMethod == 'Settings.SetSettingValue':
+                SETTINGS.invalidate(kwargs.get('setting'))
 
             if ret:
                 if 'error' in ret:
@@ -33,21 +50,198 @@ class JSONRPCMethod:
             else:
                 return None
 
+        self.handlers[method] = handler
         return handler
 
     def __call__(self, family):
+        return JSONRPCMethod(family)
+
+
+class RPCFuture(object):
+    """
+    Result of a call in a batch; available once the batch has been sent.
+    """
+    def __init__(self, method, params):
+        self.method = method
+        self.params = params
+        self._event = threading.Event()
+        self._result = None
+        self._error = None
+
+    def set(self, response):
+        if response is None:
+            self._error = 'No response'
+        elif 'error' in response:
+            self._error = response['error']
+        else:
+            self._result = response.get('result')
+        self._event.set()
+
+    def done(self):
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        """
+        Returns the call's result, waiting up to timeout seconds for the batch if it's sent in the background.
+        Raises JSONRPCMethod.Exception if the call failed.
+        """
+        if not self._event.wait(timeout):
+            raise JSONRPCMethod.Exception('Timed out waiting for {0}'.format(self.method))
+        if self._error is not None:
+            raise JSONRPCMethod.Exception(self._error)
+        return self._result
+
+
+class BatchFamily(object):
+    def __init__(self, batch, family):
+        self.batch = batch
         self.family = family
+
+    def __getattr__(self, method):
+        if method.startswith('__'):
+            raise AttributeError(method)
+        return lambda **kwargs: self.batch.call('{0}.{1}'.format(self.family, method), kwargs)
+
+
+class Batch(object):
+    """
+    Collects calls and sends them as one JSON-RPC batch request, instead of one executeJSONRPC round-trip each:
+
+        with rpc.batch() as batch:
+            memorySize = batch.Settings.GetSettingValue(setting='filecache.memorysize')
+            readFactor = batch.Settings.GetSettingValue(setting='filecache.readfactor')
+        memorySize.result()['value']
+    """
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, family):
+        if family.startswith('__'):
+            raise AttributeError(family)
+        return BatchFamily(self, family)
+
+    def __enter__(self):
         return self
 
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.send()
+
+    def call(self, method, params=None):
+        future = RPCFuture(method, params)
+        self.calls.append(future)
+        return future
+
+    def send(self, wait=True):
+        """
+        Sends the collected calls; with wait=False in a background thread, in which case the futures' result() waits
+        for it.
+        """
+        calls, self.calls = self.calls, []
+        if not calls:
+            return
+
+        if not wait:
+            threading.Thread(target=self._send, args=(calls,), name="JSONRPC-BATCH").start()
+            return
+        self._send(calls)
+
+    @staticmethod
+    def _send(calls):
+        try:
+            ret = json.loads(xbmc.executeJSONRPC(json.dumps([_command(f.method, f.params, idx)
+                                                               for idx, f in enumerate(calls)])))
+        except Exception as e:
+            ret = {'error': str(e)}
+
+        if not isinstance(ret, list):
+            # batches not supported; fall back to single calls
+            for future in calls:
+                try:
+                    future.set(json.loads(xbmc.executeJSONRPC(json.dumps(_command(future.method, future.params)))))
+                except Exception as e:
+                    future.set({'error': str(e)})
+            return
+
+        responses = dict((r.get('id'), r) for r in ret if isinstance(r, dict))
+        for idx, future in enumerate(calls):
+            future.set(responses.get(idx))
+            if future.method == 'Settings.SetSettingValue':
+                SETTINGS.invalidate(future.params.get('setting'))
+
+
+class SettingsCache(object):
+    """
+    Memoizes the Kodi setting values we read during startup (formats, locale, device name, ...), so they're only
+    requested once. Values can be prefetched in one batch.
+
+    Invalidated when settings change through Settings.SetSettingValue, on Monitor.onSettingsChanged (our own
+    settings) and when the addon is re-initialized (util.reInitAddon), as the user might have changed Kodi's settings
+    in the meantime.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def get(self, setting):
+        """
+        Returns the value of a Kodi setting; raises JSONRPCMethod.Exception if it couldn't be retrieved.
+        """
+        with self._lock:
+            if setting in self._values:
+                return self._values[setting]
+
+        value = rpc.Settings.GetSettingValue(setting=setting)['value']
+        with self._lock:
+            self._values[setting] = value
+        return value
+
+    def prefetch(self, settings):
+        with self._lock:
+            missing = [s for s in settings if s not in self._values]
+
+        if not missing:
+            return
+
+        with Batch() as batch:
+            futures = [(s, batch.Settings.GetSettingValue(setting=s)) for s in missing]
+
+        with self._lock:
+            for setting, future in futures:
+                try:
+                    self._values[setting] = future.result()['value']
+                except (JSONRPCMethod.Exception, KeyError, TypeError):
+                    # get() will try again and raise
+                    pass
+
+    def invalidate(self, setting=None):
+        with self._lock:
+            if setting is None:
+                self._values = {}
+            else:
+                self._values.pop(setting, None)
+
 
 class KodiJSONRPC:
     def __init__(self):
         self.methodHandler = JSONRPCMethod()
+        self.families = {}
+        self.settings = SETTINGS
 
     def __getattr__(self, family):
-        return self.methodHandler(family)
+        if family.startswith('__'):
+            raise AttributeError(family)
+
+        handler = self.families.get(family)
+        if handler is None:
+            handler = self.families[family] = self.methodHandler(family)
+        return handler
+
+    def batch(self):
+        return Batch()
 
 
+SETTINGS = SettingsCache()
 rpc = KodiJSONRPC()
 
 
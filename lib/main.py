@@ -4,6 +4,7 @@ from __future__ import absolute_import
 import gc
 import atexit
 import threading
+import time
 import six
 import sys
 
@@ -16,7 +17,7 @@ sys.modules['_asyncio'] = None
 
 from . import plex
 
-from plexnet import plexapp
+from plexnet import plexapp, querycache, imagecache, bif, searchindex
 from .templating import render_templates
 from .windows import background, userselect, home, windowutils, kodigui
 from . import player
@@ -148,6 +149,10 @@ def _main():
                     try:
                         selectedServer = plexapp.SERVERMANAGER.selectedServer
 
+                        if not selectedServer and not fromSwitch:
+                            # use the last known good server right away; reachability reconciles in the background
+                            selectedServer = plexapp.SERVERMANAGER.restoreSnapshot()
+
                         if not selectedServer:
                             background.setBusy()
                             util.DEBUG_LOG('Main: Waiting for selected server...')
@@ -165,6 +170,8 @@ def _main():
                                 background.setBusy(False)
 
                         util.DEBUG_LOG('Main: STARTING WITH SERVER: {0}', selectedServer)
+                        if util.STARTED_AT:
+                            util.LOG('Startup: server selected after {0:.2f}s', time.time() - util.STARTED_AT)
 
                         windowutils.HOME = home.HomeWindow.create()
                         if windowutils.HOME.waitForOpen(base_win_id=BACKGROUND._winID):
@@ -210,6 +217,10 @@ def _main():
         util.DEBUG_LOG('Main: SHUTTING DOWN...')
         dcm.storeDataCache()
         dcm.deinit()
+        querycache.CACHE.store()
+        imagecache.CACHE.shutdown()
+        bif.MANAGER.close()
+        searchindex.INDEXES.abort()
         plexapp.util.INTERFACE.playbackManager.deinit()
         background.setShutdown()
         player.shutdown()
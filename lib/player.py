@@ -1252,6 +1252,8 @@ class PlexPlayer(xbmc.Player, signalsmixin.SignalsMixin):
         url = meta.streamUrls[0]
 
         bifURL = self.playerObject.getBifUrl()
+        if bifURL:
+            self.playerObject.loadBif()
         util.DEBUG_LOG('Playing URL(+{1}ms): {0}{2}', plexnetUtil.cleanToken(url), offset, bifURL and ' - indexed' or '')
 
         self.ignoreStopEvents = True
@@ -2189,6 +2191,8 @@ class ZidooPlayer(xbmc.Player, signalsmixin.SignalsMixin):
         url = meta.streamUrls[0]
 
         bifURL = self.playerObject.getBifUrl()
+        if bifURL:
+            self.playerObject.loadBif()
         util.DEBUG_LOG('Playing URL(+{1}ms): {0}'.format(plexnetUtil.cleanToken(url), offset))
 
         self.stopAndWait()  # Stop before setting up the handler to prevent player events from causing havoc
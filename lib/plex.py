@@ -77,7 +77,7 @@ def defaultUserAgent():
 
 
 def getFriendlyName():
-    fn = util.rpc.Settings.GetSettingValue(setting='services.devicename').get('value', 'Kodi')
+    fn = util.rpc.settings.get('services.devicename')
     if fn:
         fn = fn.strip()
     return fn or 'Kodi'
@@ -1,6 +1,9 @@
 # coding=utf-8
 import os
+import io
 import glob
+import json
+import hashlib
 
 from pprint import pformat
 from kodi_six import xbmcvfs, xbmc
@@ -48,20 +51,101 @@ def prepare_template_data(thm, context):
     return ContextDict(template_context)
 
 
+def hash_data(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def hash_context(template_context):
+    return hash_data(json.dumps(template_context, sort_keys=True, default=repr).encode("utf-8"))
+
+
+class TrackingFileLoader(ibis.loaders.FileLoader):
+    """
+    FileLoader that records which templates are requested while rendering (extends, includes, including the ones
+    with names only known at render time), so we know what a rendered file depends on.
+    """
+    def __init__(self, *base_dirs, **kwargs):
+        ibis.loaders.FileLoader.__init__(self, *base_dirs, **kwargs)
+        self.recorded = None
+
+    def __call__(self, filename):
+        if self.recorded is not None:
+            self.recorded.add(filename)
+        return ibis.loaders.FileLoader.__call__(self, filename)
+
+    def record(self):
+        self.recorded = set()
+
+    def stop_recording(self):
+        recorded, self.recorded = self.recorded, None
+        return recorded
+
+    def source_hash(self, filename):
+        """
+        Hash of the file the loader would use for filename, including its location, as a custom template
+        shadowing a default one has to count as a change. None if it doesn't exist.
+        """
+        for base_dir in self.base_dirs:
+            path = os.path.join(base_dir, filename)
+            if os.path.isfile(path):
+                with io.open(path, "rb") as f:
+                    return hash_data(path.encode("utf-8") + b"\0" + f.read())
+
+
+class BuildManifest(object):
+    """
+    Records for each rendered file the hashes of its inputs (template sources and the template context) and of the
+    output, so unchanged files can be skipped on the next run.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+
+    def load(self):
+        try:
+            with io.open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            with io.open(self.path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(self.entries, sort_keys=True))
+            self.dirty = False
+        except (IOError, OSError):
+            ERROR("Couldn't write template build manifest")
+
+    def update(self, template, entry):
+        self.entries[template] = entry
+        self.dirty = True
+
+    def invalidate(self, template):
+        if self.entries.pop(template, None):
+            self.dirty = True
+
+
 class TemplateEngine(object):
     loader = None
     target_dir = None
     template_dir = None
     custom_template_dir = None
+    manifest = None
+    cache_dir = None
     initialized = False
     context = None
     debug_log = None
     TEMPLATES = None
 
-    def init(self, target_dir, template_dir, custom_template_dir):
+    def init(self, target_dir, template_dir, custom_template_dir, manifest_path=None, cache_dir=None):
         self.target_dir = target_dir
         self.template_dir = template_dir
         self.custom_template_dir = custom_template_dir
+        self.cache_dir = cache_dir
+        self.manifest = manifest_path and BuildManifest(manifest_path) or None
         self.get_available_templates()
         paths = [custom_template_dir, template_dir]
 
@@ -76,13 +160,41 @@ class TemplateEngine(object):
         self.TEMPLATES = tpls
 
     def prepare_loader(self, fns):
-        self.loader = ibis.loaders.FileLoader(*fns)
+        # templates are compiled to Python code, which is cached in cache_dir
+        self.loader = TrackingFileLoader(*fns, compiled=True, cache_dir=self.cache_dir)
         ibis.loader = self.loader
 
     def compile(self, fn, data):
         template = self.loader(fn)
         return template.render(data)
 
+    def target_path(self, template):
+        return os.path.join(self.target_dir, "script-plex-{}.xml".format(template))
+
+    def output_hash(self, template):
+        try:
+            with io.open(self.target_path(template), "rb") as f:
+                return hash_data(f.read())
+        except (IOError, OSError):
+            return None
+
+    def is_current(self, template, fn, key, source_hashes):
+        """
+        Whether the rendered file for template is up to date: it's been rendered from fn with the same build key, none
+        of the templates it used changed and the file on disk is what we wrote.
+        """
+        entry = self.manifest.entries.get(template)
+        if not entry or entry.get("fn") != fn or entry.get("key") != key:
+            return False
+
+        for dep, dep_hash in entry.get("deps", {}).items():
+            if dep not in source_hashes:
+                source_hashes[dep] = self.loader.source_hash(dep)
+            if source_hashes[dep] != dep_hash:
+                return False
+
+        return self.output_hash(template) == entry.get("output")
+
     def write(self, template, data, retry=0):
         def ensure_file_exists(file_name, expected_size):
             if xbmcvfs.exists(file_name):
@@ -95,7 +207,7 @@ class TemplateEngine(object):
         expected_len = len(data)
         # write final file
         count = 0
-        fn = os.path.join(self.target_dir, "script-plex-{}.xml".format(template))
+        fn = self.target_path(template)
         f = xbmcvfs.File(fn, "w")
 
         try:
@@ -121,11 +233,20 @@ class TemplateEngine(object):
             return self.write(template, data, retry=1)
         return True
 
-    def apply(self, theme, update_callback, templates=None):
+    def apply(self, theme, update_callback, templates=None, build_id=None):
+        """
+        Renders templates with theme. With a build manifest, templates whose inputs didn't change since the last run
+        are skipped; build_id should change whenever the rendering code itself does (e.g. the addon version).
+        """
         templates = self.TEMPLATES if templates is None else templates
         template_context = prepare_template_data(theme, self.context)
         self.debug_log("Final template context: {}".format(pformat(template_context)))
 
+        key = hash_data("{}:{}".format(build_id, hash_context(template_context)).encode("utf-8"))
+        source_hashes = {}
+        if self.manifest:
+            self.manifest.load()
+
         progress = {"at": 0, "steps": len(templates)}
 
         def step(message):
@@ -142,18 +263,50 @@ class TemplateEngine(object):
                 LOG("No custom templates found in: {}", self.custom_template_dir)
 
         applied = []
-        for template in templates:
-            fn = "script-plex-{}{}.xml.tpl".format(template, ".custom" if theme == "custom" and
-                                                   template in custom_templates else "")
-            compiled_template = self.compile(fn, template_context)
-            if self.write(template, compiled_template):
-                applied.append(template)
-            else:
-                raise Exception("Couldn't write script-plex-{}.xml", template)
-            step(template)
+        skipped = []
+        try:
+            for template in templates:
+                fn = "script-plex-{}{}.xml.tpl".format(template, ".custom" if theme == "custom" and
+                                                       template in custom_templates else "")
+                if self.manifest and self.is_current(template, fn, key, source_hashes):
+                    skipped.append(template)
+                    step(template)
+                    continue
+
+                self.loader.record()
+                try:
+                    compiled_template = self.compile(fn, template_context)
+                finally:
+                    deps = self.loader.stop_recording()
+
+                if self.manifest:
+                    # don't trust the old entry should writing fail halfway
+                    self.manifest.invalidate(template)
+
+                if self.write(template, compiled_template):
+                    applied.append(template)
+                else:
+                    raise Exception("Couldn't write script-plex-{}.xml", template)
+
+                if self.manifest:
+                    for dep in deps:
+                        if dep not in source_hashes:
+                            source_hashes[dep] = self.loader.source_hash(dep)
+                    self.manifest.update(template, {
+                        "fn": fn,
+                        "key": key,
+                        "deps": dict((dep, source_hashes[dep]) for dep in deps),
+                        "output": hash_data(compiled_template.encode("utf-8"))
+                    })
+                step(template)
+        finally:
+            if self.manifest:
+                self.manifest.save()
 
         update_callback(progress["steps"], progress["steps"], "complete")
         LOG('Using theme {} for: {}', theme, applied)
+        if skipped:
+            LOG('Unchanged, skipped: {}', skipped)
 
 
 engine = TemplateEngine()
@@ -43,7 +43,9 @@ def render_templates(theme=None, templates=None, force=False):
 
     if not engine.initialized:
         engine.init(target_dir, os.path.join(target_dir, "templates"),
-                    os.path.join(translatePath(PROFILE), "templates"))
+                    os.path.join(translatePath(PROFILE), "templates"),
+                    os.path.join(translatePath(PROFILE), "template_manifest.json"),
+                    os.path.join(translatePath(PROFILE), "template_cache"))
 
     engine.context = context
     engine.debug_log = DEBUG_LOG
@@ -75,7 +77,8 @@ def render_templates(theme=None, templates=None, force=False):
             }
             deep_update(context, overrides)
 
-            engine.apply(theme, update_progress, templates=templates)
+            engine.apply(theme, update_progress, templates=templates,
+                         build_id="{}:{}".format(ADDON.getAddonInfo('version'), THEME_VERSION))
             end = time.time()
             MONITOR.waitForAbort(0.1)
 
@@ -45,6 +45,7 @@ from plexnet import signalsmixin
 
 DEBUG = True
 _SHUTDOWN = False
+STARTED_AT = time.time()  # for startup timing
 
 ADDON = xbmcaddon.Addon()
 
@@ -62,6 +63,11 @@ xbmc.log('script.plex: Kodi {0}.{1} (build {2})'.format(KODI_VERSION_MAJOR, KODI
          xbmc.LOGINFO)
 
 
+# Kodi settings we read during startup; get them in one round-trip. They're re-read in reInitAddon
+rpc.settings.prefetch(("locale.language", "locale.timeformat", "locale.shortdateformat", "videoplayer.seeksteps",
+                       "slideshow.staytime", "services.devicename"))
+
+
 def getChannelMapping():
     data = rpc.Settings.GetSettings(filter={"section": "system", "category": "audio"})["settings"]
     return list(filter(lambda i: i["id"] == "audiooutput.channels", data))[0]["options"]
@@ -75,7 +81,7 @@ except:
 
 
 def getLanguageCode(add_def=None):
-    data = rpc.Settings.GetSettingValue(setting='locale.language')['value'].replace('resource.language.', '')
+    data = rpc.settings.get('locale.language').replace('resource.language.', '')
     lang = ""
     if "_" in data:
         base, variant = data.split("_")
@@ -353,8 +359,7 @@ class UtilityMonitor(xbmc.Monitor, signalsmixin.SignalsMixin):
         #self.stopPlayback()
 
     def onSettingsChanged(self):
-        """ unused stub, but works if needed """
-        pass
+        rpc.settings.invalidate()
 
 
 MONITOR = UtilityMonitor()
@@ -373,11 +378,15 @@ def getAdvancedSettings():
 
 
 def reInitAddon():
-    global ADDON
+    global ADDON, kodiSkipSteps, slideshowInterval
+    # Kodi doesn't notify us about changes to its own settings; re-read them
+    rpc.settings.invalidate()
     # reinit the ADDON reference so we get the updated addon settings
     ADDON = xbmcaddon.Addon()
     getAdvancedSettings()
     populateTimeFormat()
+    kodiSkipSteps = getKodiSkipSteps()
+    slideshowInterval = getKodiSlideshowInterval()
 
 
 def setSetting(key, value):
@@ -634,14 +643,14 @@ def timeInDayLocalSeconds():
 
 def getKodiSkipSteps():
     try:
-        return rpc.Settings.GetSettingValue(setting="videoplayer.seeksteps")["value"]
+        return rpc.settings.get("videoplayer.seeksteps")
     except:
         return
 
 
 def getKodiSlideshowInterval():
     try:
-        return rpc.Settings.GetSettingValue(setting="slideshow.staytime")["value"]
+        return rpc.settings.get("slideshow.staytime")
     except:
         return 3
 
@@ -797,7 +806,7 @@ def getTimeFormat():
     nonPadIF = "%-I" if sys.platform != "win32" else "%#I"
 
     try:
-        fmt = rpc.Settings.GetSettingValue(setting="locale.timeformat")["value"]
+        fmt = rpc.settings.get("locale.timeformat")
     except:
         DEBUG_LOG("Couldn't get locale.timeformat setting, falling back to legacy detection")
 
@@ -844,7 +853,7 @@ timeFormat, timeFormatKN, padHour = getTimeFormat()
 
 def getShortDateFormat():
     try:
-        return (rpc.Settings.GetSettingValue(setting="locale.shortdateformat")["value"]
+        return (rpc.settings.get("locale.shortdateformat")
                 .replace("DD", "%d").replace("MM", "%m").replace("YYYY", "%Y"))
     except:
         DEBUG_LOG("Couldn't get locale.shortdateformat setting, falling back to MM/DD/YYYY")
@@ -986,30 +995,82 @@ def addURLParams(url, params):
 
 
 OSS_CHUNK = 65536
+OSS_HASH_CACHE_SIZE = 50
 
 
-def getOpenSubtitlesHash(size, url):
-    long_long_format = "q"  # long long
-    byte_size = struct.calcsize(long_long_format)
-    hash_ = filesize = size
-    if filesize < OSS_CHUNK * 2:
-        return
+class OpenSubtitlesHasher(object):
+    """
+    Computes OpenSubtitles hashes (file size plus the 64 bit little-endian words of the first and last 64KB of the
+    file) of remote files. Both ranges are requested at the same time over a shared, pooled session and results are
+    cached per part.
+    """
+    TIMEOUT = 10
 
-    buffer = b''
-    for _range in ((0, OSS_CHUNK), (filesize-OSS_CHUNK, filesize)):
+    def __init__(self):
+        self._session = None
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._order = []
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+        return self._session
+
+    def _fetch(self, url, start, end, results, idx):
         try:
-            r = requests.get(url, headers={"range": "bytes={0}-{1}".format(*_range)}, stream=True)
-        except:
+            r = self.session.get(url, headers={"range": "bytes={0}-{1}".format(start, end - 1)}, stream=True,
+                                 timeout=self.TIMEOUT)
+            r.raise_for_status()
+            results[idx] = r.raw.read(OSS_CHUNK)
+            r.close()
+        except Exception as e:
+            DEBUG_LOG("OpenSubtitles hash: Couldn't fetch range {0}-{1}: {2}", start, end, e)
+
+    @staticmethod
+    def checksum(size, data):
+        return format((size + sum(struct.unpack("<{0}Q".format(len(data) // 8), data))) & 0xFFFFFFFFFFFFFFFF, "016x")
+
+    def get(self, size, url, key=None):
+        if size < OSS_CHUNK * 2:
+            return
+
+        key = (key or url, size)
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+
+        results = [None, None]
+        tail = threading.Thread(target=self._fetch, args=(url, size - OSS_CHUNK, size, results, 1), name="OSS-HASH")
+        tail.start()
+        self._fetch(url, 0, OSS_CHUNK, results, 0)
+        tail.join()
+
+        if not all(r and len(r) == OSS_CHUNK for r in results):
             return ''
-        buffer += r.raw.read(OSS_CHUNK)
 
-    for x in range(int(OSS_CHUNK / byte_size) * 2):
-        size = x * byte_size
-        (l_value,) = struct.unpack(long_long_format, buffer[size:size + byte_size])
-        hash_ += l_value
-        hash_ = hash_ & 0xFFFFFFFFFFFFFFFF
+        hash_ = self.checksum(size, results[0] + results[1])
+        with self._lock:
+            self._cache[key] = hash_
+            self._order.append(key)
+            while len(self._order) > OSS_HASH_CACHE_SIZE:
+                self._cache.pop(self._order.pop(0), None)
+        return hash_
+
 
-    return format(hash_, "016x")
+OSS_HASHER = OpenSubtitlesHasher()
+
+
+def getOpenSubtitlesHash(size, url, key=None):
+    """
+    Returns the OpenSubtitles hash of the file at url, '' if it couldn't be fetched, or None if the file is too small.
+    key identifies the file for caching, e.g. its part ID; defaults to url.
+    """
+    return OSS_HASHER.get(size, url, key)
 
 SETTING_RE = re.compile(r'<setting id="(?P<name>.+?)"[^>]*?>', re.MULTILINE | re.DOTALL)
 
@@ -3,7 +3,7 @@ from __future__ import absolute_import
 import requests.exceptions
 from kodi_six import xbmc
 from kodi_six import xbmcgui
-from plexnet import plexapp, playlist, plexplayer
+from plexnet import plexapp, playlist, plexplayer, plexobjects
 
 from lib import backgroundthread
 from lib import metadata
@@ -25,11 +25,13 @@ from . import windowutils
 from .mixins import SeasonsMixin, RatingsMixin, SpoilersMixin, PlaybackBtnMixin
 
 VIDEO_RELOAD_KW = dict(includeExtras=1, includeExtrasCount=10, includeChapters=1)
+# episodes per reload request/task
+EPISODE_RELOAD_CHUNK = 20
 
 
 class EpisodeReloadTask(backgroundthread.Task):
-    def setup(self, episode, callback, with_progress=False):
-        self.episode = episode
+    def setup(self, episodes, callback, with_progress=False):
+        self.episodes = episodes
         self.callback = callback
         self.withProgress = with_progress
         return self
@@ -43,10 +45,17 @@ class EpisodeReloadTask(backgroundthread.Task):
             return
 
         try:
-            self.episode.reload(checkFiles=1, includeChapters=1, fromMediaChoice=self.episode.mediaChoice is not None)
+            # fromMediaChoice: re-select the media/streams of episodes that have a media choice
+            plexobjects.reloadItems(self.episodes, chunkSize=EPISODE_RELOAD_CHUNK, checkFiles=1, includeChapters=1,
+                                    includeMarkers=1, fromMediaChoice=1)
+        except Exception:
+            # keep showing what we have, like a failed single reload would
+            util.ERROR("Couldn't reload episodes")
+
+        try:
             if self.isCanceled():
                 return
-            self.callback(self, self.episode, with_progress=self.withProgress)
+            self.callback(self, self.episodes, with_progress=self.withProgress)
         except requests.exceptions.RequestException:
             raise util.NoDataException
         except:
@@ -1344,7 +1353,8 @@ class EpisodesWindow(kodigui.ControlledWindow, windowutils.UtilMixin, SeasonsMix
         self.reloadItems(items, with_progress=True)
 
     def reloadItems(self, items, with_progress=False, skip_progress_for=None):
-        tasks = []
+        # one batch reload per chunk of episodes (and progress mode) instead of a request per episode
+        batches = {True: [], False: []}
         for mli in items:
             if not mli.dataSource:
                 continue
@@ -1353,16 +1363,22 @@ class EpisodesWindow(kodigui.ControlledWindow, windowutils.UtilMixin, SeasonsMix
             if skip_progress_for:
                 item_progress = False if mli.dataSource.ratingKey in skip_progress_for else with_progress
 
-            task = EpisodeReloadTask().setup(mli.dataSource, self.reloadItemCallback, with_progress=item_progress)
-            self.tasks.add(task)
-            tasks.append(task)
+            batches[bool(item_progress)].append(mli.dataSource)
+
+        tasks = []
+        for item_progress, episodes in batches.items():
+            for offset in range(0, len(episodes), EPISODE_RELOAD_CHUNK):
+                task = EpisodeReloadTask().setup(episodes[offset:offset + EPISODE_RELOAD_CHUNK],
+                                                 self.reloadItemCallback, with_progress=item_progress)
+                self.tasks.add(task)
+                tasks.append(task)
 
         backgroundthread.BGThreader.addTasks(tasks)
 
     def getPlayButtonID(self, mli, base=None):
         return (base and base or self.PLAY_BUTTON_ID) + (mli.getProperty('media.multiple') and 1000 or 0)
 
-    def reloadItemCallback(self, task, episode, with_progress=False):
+    def reloadItemCallback(self, task, episodes, with_progress=False):
         self.tasks.remove(task)
         del task
 
@@ -1371,8 +1387,17 @@ class EpisodesWindow(kodigui.ControlledWindow, windowutils.UtilMixin, SeasonsMix
 
         selected = self.episodeListControl.getSelectedItem()
 
+        # ratingKey -> list item, instead of scanning the list for every episode
+        index = {}
         for mli in self.episodeListControl:
-            if mli.dataSource == episode:
+            if mli.dataSource:
+                index.setdefault(mli.dataSource.ratingKey, []).append(mli)
+
+        for episode in episodes:
+            for mli in index.get(episode.ratingKey, ()):
+                if mli.dataSource is not episode:
+                    continue
+
                 if not episode.mediaChoice:
                     episode.setMediaChoice()
 
@@ -8,7 +8,7 @@ import math
 import plexnet
 from kodi_six import xbmc
 from kodi_six import xbmcgui
-from plexnet import plexapp, plexresource
+from plexnet import plexapp, plexlibrary, plexresource, querycache
 from six.moves import range
 
 from lib import backgroundthread
@@ -71,12 +71,25 @@ class SectionHubsTask(backgroundthread.Task):
             # Could happen during sign-out for instance
             return
 
+        server = plexapp.SERVERMANAGER.selectedServer
         try:
-            hubs = HubsList(plexapp.SERVERMANAGER.selectedServer.hubs(self.section.key, count=HUB_PAGE_SIZE,
-                                                                      section_ids=self.section_keys,
-                                                                      ignore_hubs=self.ignore_hubs)).init()
+            # render from the query cache first, then refresh in the background and only re-render on change
+            cached = server.hubs(self.section.key, count=HUB_PAGE_SIZE, section_ids=self.section_keys,
+                                 ignore_hubs=self.ignore_hubs, cache=querycache.CACHE_ONLY)
+            if cached:
+                if self.isCanceled():
+                    return
+                self.callback(self.section, HubsList(cached).init(), reselect_pos_dict=self.reselect_pos_dict)
+
+            changes = querycache.CACHE.changeCount()
+            hubs = HubsList(server.hubs(self.section.key, count=HUB_PAGE_SIZE, section_ids=self.section_keys,
+                                        ignore_hubs=self.ignore_hubs, cache=querycache.CACHE_REFRESH,
+                                        partial_callback=not cached and self.partialCallback or None)).init()
             if self.isCanceled():
                 return
+            if cached and querycache.CACHE.changeCount() == changes:
+                util.DEBUG_LOG('Cached hubs for section {0} are up to date', repr(self.section.title))
+                return
             self.callback(self.section, hubs, reselect_pos_dict=self.reselect_pos_dict)
         except plexnet.exceptions.BadRequest:
             util.DEBUG_LOG('404 on section: {0}', repr(self.section.title))
@@ -90,6 +103,11 @@ class SectionHubsTask(backgroundthread.Task):
             hubs.invalid = True
             self.callback(self.section, hubs)
 
+    def partialCallback(self, hubs):
+        # render what we have while the rest is still loading
+        if not self.isCanceled():
+            self.callback(self.section, HubsList(hubs).init(), reselect_pos_dict=self.reselect_pos_dict)
+
 
 class UpdateHubTask(backgroundthread.Task):
     def setup(self, hub, callback, reselect_pos=None):
@@ -162,6 +180,31 @@ class ExtendHubTask(backgroundthread.Task):
             util.DEBUG_LOG('Something went wrong when extending hub: {0}', repr(self.hub.hubIdentifier))
 
 
+class SectionsRefreshTask(backgroundthread.Task):
+    """
+    Revalidates the cached sections and playlists the home screen was drawn from on a startup snapshot start, and
+    calls back if anything changed.
+    """
+    def setup(self, callback):
+        self.callback = callback
+        return self
+
+    def run(self):
+        server = plexapp.SERVERMANAGER.selectedServer
+        if self.isCanceled() or not server:
+            return
+
+        try:
+            changes = querycache.CACHE.changeCount()
+            plexlibrary.Library(None, server=server).sections(cache=querycache.CACHE_REFRESH)
+            server.playlists(cache=querycache.CACHE_REFRESH)
+            if self.isCanceled() or querycache.CACHE.changeCount() == changes:
+                return
+            self.callback()
+        except:
+            util.ERROR()
+
+
 class HomeSection(object):
     key = None
     type = 'home'
@@ -394,6 +437,7 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
         SpoilersMixin.__init__(self, *args, **kwargs)
         self.lastSection = home_section
         self.tasks = []
+        self.preloadTasks = []
         self.closeOption = None
         self.hubControls = None
         self.backgroundSet = False
@@ -418,6 +462,7 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
         self.hubSettings = None
         self.anyLibraryHidden = False
         self.wantedSections = None
+        self.fromSnapshot = False
         self.movingSection = False
         self._initialMovingSectionPos = None
         self.go_root = False
@@ -1039,7 +1084,9 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
 
     def fullyRefreshHome(self, *args, **kwargs):
         section = kwargs.pop("section", None)
-        self.showSections(focus_section=section or home_section)
+        self.fromSnapshot = plexapp.SERVERMANAGER.snapshotPending
+        plexapp.SERVERMANAGER.snapshotPending = False
+        self.showSections(focus_section=section or home_section, fromSnapshot=self.fromSnapshot)
         self.backgroundSet = False
         self.showHubs(section if section else home_section)
 
@@ -1092,9 +1139,8 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
     @busy.dialog()
     def serverRefresh(self, section=None):
         backgroundthread.BGThreader.reset()
-        if self.tasks:
-            for task in self.tasks:
-                task.cancel()
+        for task in self.tasks + self.preloadTasks:
+            task.cancel()
 
         with self.lock:
             self.setProperty('hub.focus', '')
@@ -1508,20 +1554,28 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
                         self._lastSelectedItem = (controlID, last_item_index)
                         self.updateBackgroundFrom(control[last_item_index].dataSource)
                     else:
-                        task = ExtendHubTask().setup(control.dataSource, self.extendHubCallback,
-                                                     canceledCallback=lambda hub: mli.setBoolProperty('is.updating',
-                                                                                                      False),
-                                                     reselect_pos=(None, -1))
-                        self.tasks.append(task)
-                        backgroundthread.BGThreader.addTask(task)
+                        self.extendHub(control.dataSource,
+                                       canceledCallback=lambda hub: mli.setBoolProperty('is.updating', False),
+                                       reselect_pos=(None, -1))
                     return
                 self._lastSelectedItem = (controlID, mlipos)
             return
 
         mli.setBoolProperty('is.updating', True)
         self.cleanTasks()
-        task = ExtendHubTask().setup(control.dataSource, self.extendHubCallback,
-                                     canceledCallback=lambda hub: mli.setBoolProperty('is.updating', False))
+        self.extendHub(control.dataSource, canceledCallback=lambda hub: mli.setBoolProperty('is.updating', False))
+
+    def extendHub(self, hub, **kwargs):
+        """
+        Fetches the next page of hub in the background, unless that's already happening; requests for a hub that
+        arrive while one is in flight are merged into it.
+        """
+        for task in self.tasks:
+            if isinstance(task, ExtendHubTask) and task.hub is hub and task:
+                util.DEBUG_LOG('Hub {0} is already being extended', hub.hubIdentifier)
+                return
+
+        task = ExtendHubTask().setup(hub, self.extendHubCallback, **kwargs)
         self.tasks.append(task)
         backgroundthread.BGThreader.addTask(task)
 
@@ -1593,6 +1647,7 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
             util.DEBUG_LOG('Section changed ({0}): {1}', section.key, repr(section.title))
             self.lastSection = section
             self.showHubs(section)
+            self.preloadAdjacentSections()
 
         # timing issue
         cur_sel_ds = self.sectionList.getSelectedItem().dataSource
@@ -1603,7 +1658,52 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
                             cur_sel_ds.key))
             self.checkSectionItem(force=True)
 
+    def preloadAdjacentSections(self):
+        """
+        Refreshes the hubs of the sections next to the selected one in the background if they're stale or still
+        queued, so switching to them is instant.
+        """
+        if not plexapp.SERVERMANAGER.selectedServer.hasHubs():
+            return
+
+        self.preloadTasks = [t for t in self.preloadTasks if t]
+        pos = self.sectionList.getSelectedPos()
+        if pos is None:
+            return
+
+        for adjacent in (pos - 1, pos + 1):
+            if not self.sectionList.positionIsValid(adjacent):
+                continue
+
+            section = self.sectionList[adjacent].dataSource
+            if not section or section.key is False:
+                continue
+
+            hubs = self.sectionHubs.get(section.key)
+            if hubs is None:
+                # initial load still pending
+                for task in self.tasks:
+                    if isinstance(task, SectionHubsTask) and task.section == section and task:
+                        backgroundthread.BGThreader.moveToFront(task)
+                        break
+                continue
+
+            if hubs.invalid or time.time() - hubs.lastUpdated <= HUBS_REFRESH_INTERVAL or \
+                    any(t.section == section for t in self.preloadTasks):
+                continue
+
+            util.DEBUG_LOG('Preloading hubs of adjacent section: {0}', repr(section.title))
+            task = SectionHubsTask().setup(section, self.sectionHubsCallback, self.wantedSections,
+                                           ignore_hubs=self.ignoredHubs)
+            self.preloadTasks.append(task)
+            backgroundthread.BGThreader.addTask(task)
+
     def sectionHubsCallback(self, section, hubs, reselect_pos_dict=None):
+        if util.STARTED_AT and section == home_section:
+            util.LOG('Startup: time to first paint: {0:.2f}s (from snapshot: {1})', time.time() - util.STARTED_AT,
+                     self.fromSnapshot)
+            util.STARTED_AT = None
+
         with self.lock:
             update = bool(self.sectionHubs.get(section.key))
             self.sectionHubs[section.key] = hubs
@@ -1636,9 +1736,25 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
                                                                             reselect_pos))
         self.updateHubCallback(hub, items, reselect_pos=reselect_pos)
 
-    def showSections(self, focus_section=None):
+    def onSectionsChanged(self):
+        util.DEBUG_LOG('Sections changed since the startup snapshot, refreshing')
+        with self.lock:
+            # the hub tasks of the outdated sections would call back into the redrawn ones
+            for task in self.tasks:
+                task.cancel()
+            backgroundthread.BGThreader.removeTasks(self.tasks)
+            self.tasks = []
+            self.showSections(focus_section=self.lastSection)
+            self.showHubs(self.lastSection)
+
+    def showSections(self, focus_section=None, fromSnapshot=False):
+        """
+        :param fromSnapshot: draw the sections from the query cache only and revalidate them in the background
+        """
         self.sectionHubs = {}
         items = []
+        server = plexapp.SERVERMANAGER.selectedServer
+        cache = fromSnapshot and querycache.CACHE_ONLY or None
 
         homemli = kodigui.ManagedListItem(T(32332, 'Home'), data_source=home_section)
         homemli.setProperty('is.home', '1')
@@ -1647,19 +1763,27 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
 
         sections = []
 
-        if "playlists" not in self.librarySettings \
-                or ("playlists" in self.librarySettings and self.librarySettings["playlists"].get("show", True)):
-            pl = plexapp.SERVERMANAGER.selectedServer.playlists()
-            if pl:
-                sections.append(playlists_section)
-
         try:
-            _sections = plexapp.SERVERMANAGER.selectedServer.library.sections()
+            _sections = None
+            if fromSnapshot:
+                _sections = plexlibrary.Library(None, server=server).sections(cache=cache)
+            if _sections is None:
+                # no snapshot to draw from, load everything (including the playlists) as on a normal start
+                fromSnapshot = False
+                cache = None
+                _sections = server.library.sections(cache=querycache.CACHE_USE)
         except plexnet.exceptions.BadRequest:
             self.setFocusId(self.SERVER_BUTTON_ID)
             util.messageDialog("Error", "Bad request")
             return
 
+        if "playlists" not in self.librarySettings \
+                or ("playlists" in self.librarySettings and self.librarySettings["playlists"].get("show", True)):
+            # normal starts store the playlists, so the next snapshot start can draw them from the cache
+            pl = server.playlists(cache=cache or querycache.CACHE_REFRESH)
+            if pl:
+                sections.append(playlists_section)
+
         self.wantedSections = []
         for section in _sections:
             if section.key in self.librarySettings and not self.librarySettings[section.key].get("show", True):
@@ -1677,11 +1801,14 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
         if not self.anyLibraryHidden:
             self.wantedSections = None
 
-        if plexapp.SERVERMANAGER.selectedServer.hasHubs():
+        if server.hasHubs():
             self.tasks = [SectionHubsTask().setup(s, self.sectionHubsCallback, self.wantedSections, self.ignoredHubs)
                           for s in [home_section] + sections]
             backgroundthread.BGThreader.addTasks(self.tasks)
 
+        if fromSnapshot:
+            backgroundthread.BGThreader.addTask(SectionsRefreshTask().setup(self.onSectionsChanged))
+
         show_pm_indicator = util.getSetting('path_mapping_indicators', True)
         for section in sections:
             mli = kodigui.ManagedListItem(section.title,
@@ -2140,11 +2267,9 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
                     size = max(math.ceil((pos + 2 - control.size()) / HUB_PAGE_SIZE), 1) * HUB_PAGE_SIZE
                     util.DEBUG_LOG("Hub {}: Reselect: Hub position for {} out of bounds ({}), "
                                    "expanding hub ", identifier, rk, pos)
-                    task = ExtendHubTask().setup(control.dataSource, self.extendHubCallback,
-                                                 canceledCallback=lambda h: mli.setBoolProperty('is.updating', False),
-                                                 size=size, reselect_pos=reselect_pos)
-                    self.tasks.append(task)
-                    backgroundthread.BGThreader.addTask(task)
+                    self.extendHub(control.dataSource,
+                                   canceledCallback=lambda h: mli.setBoolProperty('is.updating', False),
+                                   size=size, reselect_pos=reselect_pos)
                 else:
                     control.selectItem(control.size() - 1)
                     if self.updateBackgroundFrom(control[control.size() - 1].dataSource):
@@ -2338,6 +2463,5 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
         self.processCommand(opener.handleOpen(musicplayer.MusicPlayerWindow))
 
     def finished(self):
-        if self.tasks:
-            for task in self.tasks:
-                task.cancel()
+        for task in self.tasks + self.preloadTasks:
+            task.cancel()
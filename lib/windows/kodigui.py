@@ -420,6 +420,17 @@ class ControlledDialog(ControlledBase, BaseDialog):
 
 
 DUMMY_LIST_ITEM = xbmcgui.ListItem()
+# Kodi 20+ sets all properties of a list item in one call
+BATCH_PROPERTIES = hasattr(DUMMY_LIST_ITEM, "setProperties")
+
+
+def setListItemProperties(li, properties):
+    if BATCH_PROPERTIES:
+        li.setProperties(properties)
+        return
+
+    for k, v in properties.items():
+        li.setProperty(k, v)
 
 
 class DummyDataSource(object):
@@ -497,13 +508,14 @@ class ManagedListItem(object):
         return li
 
     def _updateListItem(self):
-        self.listItem.setProperty('__ID__', self._ID)
-        self.listItem.setLabel(self.label)
-        self.listItem.setLabel2(self.label2)
-        self.listItem.setArt({"thumb": self.thumbnailImage, "icon": self.iconImage})
-        self.listItem.setPath(self.path)
-        for k in self._manager._properties.keys():
-            self.listItem.setProperty(k, self.properties.get(k) or '')
+        li = self.listItem
+        li.setLabel(self.label)
+        li.setLabel2(self.label2)
+        li.setArt({"thumb": self.thumbnailImage, "icon": self.iconImage})
+        li.setPath(self.path)
+        properties = dict((k, self.properties.get(k) or '') for k in self._manager._properties)
+        properties['__ID__'] = self._ID
+        setListItemProperties(li, properties)
 
     def clear(self):
         self.label = ''
@@ -606,8 +618,19 @@ class ManagedListItem(object):
 
 
 class ManagedControlList(object):
+    """
+    Refreshing the Kodi list items (_updateItems) is virtualized: only the items around the selected position are
+    updated right away, the others are marked pending and updated by a background thread, nearest to the selected
+    position first, or as soon as they're accessed. Positions of items and data sources are looked up in an index
+    that is rebuilt after the items change.
+    """
     __slots__ = ("controlID", "control", "items", "_sortKey", "_idCounter", "_maxViewIndex", "_properties",
-                 "dataSource")
+                 "dataSource", "_pending", "_lock", "_syncThread", "_positions", "_dataSourcePositions")
+
+    # items on either side of the selected one that are updated right away
+    SYNC_MARGIN = 50
+    # pending items updated per round by the background thread
+    SYNC_CHUNK = 50
 
     def __init__(self, window, control_id, max_view_index, data_source=None):
         self.controlID = control_id
@@ -618,6 +641,12 @@ class ManagedControlList(object):
         self._maxViewIndex = max_view_index
         self._properties = {}
         self.dataSource = data_source
+        # id(mli): mli
+        self._pending = {}
+        self._lock = threading.RLock()
+        self._syncThread = None
+        self._positions = None
+        self._dataSourcePositions = None
 
     def __getattr__(self, name):
         return getattr(self.control, name)
@@ -646,25 +675,115 @@ class ManagedControlList(object):
             bottom = 0
             top = self.size()
 
-        try:
+        self._itemsChanged()
+        with self._lock:
+            # all properties have to be known before updating any list item, so stale ones get cleared
+            self._properties['index'] = 1
             for idx in range(bottom, top):
+                mli = self.items[idx]
+                mli._manager = self
+                mli.properties['index'] = str(idx)
+                self._properties.update(mli.properties)
+
+            try:
+                selected = self.control.getSelectedPosition()
+            except RuntimeError:
+                selected = bottom
+
+            try:
+                for idx in range(bottom, top):
+                    mli = self.items[idx]
+                    if abs(idx - selected) <= self.SYNC_MARGIN:
+                        self._syncItem(mli, idx)
+                    else:
+                        # updated by _syncPending, or when accessed
+                        mli._listItem = None
+                        self._pending[id(mli)] = mli
+            except RuntimeError:
+                #xbmc.log('kodigui.ManagedControlList._updateItems: Runtime error', xbmc.LOGINFO)
+                util.ERROR('kodigui.ManagedControlList._updateItems: Runtime error')
+                return False
+
+            if self._pending and not (self._syncThread and self._syncThread.is_alive()):
+                self._syncThread = threading.Thread(target=self._syncPending, name="LIST-SYNC")
+                self._syncThread.daemon = True
+                self._syncThread.start()
+
+        return True
+
+    def _syncItem(self, mli, idx, li=None):
+        # call with the lock held
+        self._pending.pop(id(mli), None)
+        try:
+            li = li or self.control.getListItem(idx)
+        except RuntimeError:
+            return None
+
+        mli._listItem = li
+        mli.properties['index'] = str(idx)
+        mli._updateListItem()
+        return li
+
+    def _syncPending(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return
+
                 try:
-                    li = self.control.getListItem(idx)
+                    selected = self.control.getSelectedPosition()
                 except RuntimeError:
-                    continue
+                    # the control is gone
+                    self._pending.clear()
+                    return
 
+                positions = []
+                for key, mli in list(self._pending.items()):
+                    idx = self._lookup("_positions", mli)
+                    if idx is None:
+                        del self._pending[key]
+                    else:
+                        positions.append((abs(idx - selected), idx, mli))
+
+                positions.sort(key=lambda x: x[:2])
+                for distance, idx, mli in positions[:self.SYNC_CHUNK]:
+                    self._syncItem(mli, idx)
+
+            # let the UI have the lock between chunks
+            time.sleep(0)
+
+    def _itemsChanged(self):
+        self._positions = None
+        self._dataSourcePositions = None
+
+    def _buildIndex(self):
+        positions = {}
+        dataSourcePositions = {}
+        for idx, mli in enumerate(self.items):
+            positions[id(mli)] = idx
+            dataSourcePositions.setdefault(id(mli.dataSource), idx)
+        self._positions = positions
+        self._dataSourcePositions = dataSourcePositions
+
+    def _lookup(self, index, obj, attr=None):
+        # returns the position of obj from the index, verifying it's still accurate; None if it's not in there
+        for attempt in (0, 1):
+            if getattr(self, index) is None or attempt:
+                self._buildIndex()
+
+            idx = getattr(self, index).get(id(obj))
+            if idx is None:
+                return None
+
+            try:
                 mli = self.items[idx]
-                self._properties.update(mli.properties)
-                mli._manager = self
-                mli._listItem = li
-                mli._updateListItem()
-                mli.setProperty('index', str(idx))
-        except RuntimeError:
-            #xbmc.log('kodigui.ManagedControlList._updateItems: Runtime error', xbmc.LOGINFO)
-            util.ERROR('kodigui.ManagedControlList._updateItems: Runtime error')
-            return False
+            except IndexError:
+                continue
 
-        return True
+            if (getattr(mli, attr) if attr else mli) is obj:
+                return idx
+
+        return None
 
     def _nextID(self):
         self._idCounter += 1
@@ -673,27 +792,34 @@ class ManagedControlList(object):
     def reInit(self, window, control_id):
         self.controlID = control_id
         self.control = window.getControl(control_id)
-        self.control.addItems([i._takeListItem(self, self._nextID()) for i in self.items])
+        with self._lock:
+            self._pending.clear()
+            self.control.addItems([i._takeListItem(self, self._nextID()) for i in self.items])
 
     def setSort(self, sort):
         self._sortKey = sort
 
     def addItem(self, managed_item):
         self.items.append(managed_item)
+        self._itemsChanged()
         self.control.addItem(managed_item._takeListItem(self, self._nextID()))
 
     def addItems(self, managed_items):
         self.items += managed_items
+        self._itemsChanged()
         self.control.addItems([i._takeListItem(self, self._nextID()) for i in managed_items])
 
     def replaceItem(self, pos, mli):
-        self[pos].onDestroy()
-        self[pos].invalidate()
-        self.items[pos] = mli
-        li = self.control.getListItem(pos)
-        mli._manager = self
-        mli._listItem = li
-        mli._updateListItem()
+        with self._lock:
+            self[pos].onDestroy()
+            self[pos].invalidate()
+            self._pending.pop(id(self.items[pos]), None)
+            self.items[pos] = mli
+            self._itemsChanged()
+            li = self.control.getListItem(pos)
+            mli._manager = self
+            mli._listItem = li
+            mli._updateListItem()
 
     def replaceItems(self, managed_items):
         if not self.items:
@@ -702,11 +828,13 @@ class ManagedControlList(object):
 
         oldSize = self.size()
 
-        for i in self.items:
-            i.onDestroy()
-            i.invalidate()
+        with self._lock:
+            for i in self.items:
+                i.onDestroy()
+                i.invalidate()
 
-        self.items = managed_items
+            self._pending.clear()
+            self.items = managed_items
         size = self.size()
         if size != oldSize:
             pos = self.getSelectedPosition()
@@ -732,10 +860,20 @@ class ManagedControlList(object):
     def getListItem(self, pos):
         li = self.control.getListItem(pos)
         mli = self.items[pos]
+        if id(mli) in self._pending:
+            with self._lock:
+                if id(mli) in self._pending:
+                    self._syncItem(mli, pos, li)
+                    return mli
         mli._listItem = li
         return mli
 
     def getListItemByDataSource(self, data_source):
+        idx = self._lookup("_dataSourcePositions", data_source, "dataSource")
+        if idx is not None:
+            return self.items[idx]
+
+        # data sources that are equal, but not the same
         for mli in self:
             if data_source == mli.dataSource:
                 return mli
@@ -776,7 +914,10 @@ class ManagedControlList(object):
         self.setSelectedItem(self.getListItemByDataSource(data_source))
 
     def removeItem(self, index):
-        old = self.items.pop(index)
+        with self._lock:
+            old = self.items.pop(index)
+            self._pending.pop(id(old), None)
+            self._itemsChanged()
         old.onDestroy()
         old.invalidate()
 
@@ -798,6 +939,7 @@ class ManagedControlList(object):
             self.addItem(managed_item)
         else:
             self.items.insert(index, managed_item)
+            self._itemsChanged()
             self.control.addItem(managed_item._takeListItem(self, self._nextID()))
             self._updateItems(index, self.size())
 
@@ -822,17 +964,19 @@ class ManagedControlList(object):
         if not self.positionIsValid(pos1) or not self.positionIsValid(pos2):
             return False
 
-        item1 = self.items[pos1]
-        item2 = self.items[pos2]
-        li1 = item1._listItem
-        li2 = item2._listItem
-        item1._listItem = li2
-        item2._listItem = li1
+        with self._lock:
+            item1 = self.items[pos1]
+            item2 = self.items[pos2]
+            li1 = item1.listItem
+            li2 = item2.listItem
+            item1._listItem = li2
+            item2._listItem = li1
 
-        item1._updateListItem()
-        item2._updateListItem()
-        self.items[pos1] = item2
-        self.items[pos2] = item1
+            item1._updateListItem()
+            item2._updateListItem()
+            self.items[pos1] = item2
+            self.items[pos2] = item1
+            self._itemsChanged()
 
         return True
 
@@ -867,10 +1011,13 @@ class ManagedControlList(object):
 
     def reset(self):
         self.dataSource = None
-        for i in self.items:
-            i.onDestroy()
-            i.invalidate()
-        self.items = []
+        with self._lock:
+            for i in self.items:
+                i.onDestroy()
+                i.invalidate()
+            self._pending.clear()
+            self.items = []
+            self._itemsChanged()
         self.control.reset()
 
     def size(self):
@@ -902,13 +1049,19 @@ class ManagedControlList(object):
         self._updateItems(0, self.size())
 
     def getManagedItemPosition(self, mli):
-        return self.items.index(mli)
+        idx = self._lookup("_positions", mli)
+        if idx is None:
+            raise ValueError('{0} is not in list'.format(mli))
+        return idx
 
     def isLastItem(self, mli=None):
         return self.getManagedItemPosition(mli or self.getSelectedItem()) + 1 == len(self)
 
     def getListItemFromManagedItem(self, mli):
-        pos = self.items.index(mli)
+        pos = self.getManagedItemPosition(mli)
+        with self._lock:
+            if id(mli) in self._pending:
+                return self._syncItem(mli, pos)
         return self.control.getListItem(pos)
 
     def topHasFocus(self):
@@ -918,8 +1071,10 @@ class ManagedControlList(object):
         return self.getSelectedPosition() == self.size() - 1
 
     def invalidate(self):
-        for item in self.items:
-            item._listItem = DUMMY_LIST_ITEM
+        with self._lock:
+            self._pending.clear()
+            for item in self.items:
+                item._listItem = DUMMY_LIST_ITEM
 
     def newControl(self, window=None, control_id=None):
         self.controlID = control_id or self.controlID
@@ -1,9 +1,12 @@
 from __future__ import absolute_import
 
+import collections
 import json
+import math
 import os
 import random
 import threading
+import time
 
 import plexnet
 import six
@@ -12,6 +15,8 @@ import six.moves.urllib.parse
 import six.moves.urllib.request
 from kodi_six import xbmc
 from kodi_six import xbmcgui
+from plexnet import compactitems
+from plexnet import imagecache
 from plexnet import playqueue
 from six.moves import range
 
@@ -206,18 +211,105 @@ class ChunkRequestTask(backgroundthread.Task):
             elif ITEM_TYPE == 'track':
                 type_ = 10
 
+            # items are parsed from the response stream while the callback consumes them
             if ITEM_TYPE == 'folder':
-                items = self.section.folder(self.start, self.size, self.subDir)
+                items = self.section.folder(self.start, self.size, self.subDir, stream=True, compact=True)
             else:
-                items = self.section.all(self.start, self.size, self.filter, self.sort, self.unwatched, type_=type_)
+                items = self.section.all(self.start, self.size, self.filter, self.sort, self.unwatched, type_=type_,
+                                         stream=True, compact=True)
 
             if self.isCanceled():
                 return
-            self.callback(items, self.start)
+            self.callback(items, self.start, self)
         except plexnet.exceptions.BadRequest:
             util.DEBUG_LOG('404 on section: {0}', repr(self.section.title))
 
 
+class ChunkPrefetcher(object):
+    """
+    Tracks the scroll velocity of the library panel to decide how many chunks to request ahead of the viewport
+    and how many chunks to merge into a single request, based on the measured chunk latency. Also keeps the chunk
+    latency and blank item (time a position was visible before its chunk arrived) metrics.
+    """
+    HISTORY_TIME = 1.0  # seconds of position history used for the velocity
+    MAX_AHEAD = 4  # max chunks to prefetch in the direction of travel
+    MAX_MERGE = 4  # max chunks per request
+    DEFAULT_LATENCY = 0.5
+
+    def __init__(self):
+        self.history = collections.deque()
+        self.latencies = collections.deque(maxlen=10)
+        self.requested = {}
+        self.blankSince = {}
+        self.blankTime = 0.0
+        self.blankCount = 0
+
+    @property
+    def position(self):
+        return self.history and self.history[-1][1] or 0
+
+    def reset(self):
+        self.history.clear()
+        self.requested = {}
+        self.blankSince = {}
+
+    def track(self, pos):
+        now = time.time()
+        self.history.append((now, pos))
+        while self.history and now - self.history[0][0] > self.HISTORY_TIME:
+            self.history.popleft()
+
+    @property
+    def velocity(self):
+        """Items per second; negative when scrolling backwards"""
+        if len(self.history) < 2:
+            return 0.0
+
+        (t0, p0), (t1, p1) = self.history[0], self.history[-1]
+        return t1 > t0 and (p1 - p0) / (t1 - t0) or 0.0
+
+    @property
+    def latency(self):
+        return self.latencies and sum(self.latencies) / len(self.latencies) or self.DEFAULT_LATENCY
+
+    def chunksAhead(self, chunkSize):
+        # cover the distance we'll travel while a chunk request is in flight
+        distance = abs(self.velocity) * self.latency
+        return min(self.MAX_AHEAD, 1 + int(math.ceil(distance / float(chunkSize))))
+
+    def mergeCount(self):
+        # slow servers get fewer, bigger requests
+        return min(self.MAX_MERGE, max(1, int(self.latency)))
+
+    def onRequested(self, start):
+        self.requested[start] = time.time()
+
+    def onBlank(self, start):
+        if start not in self.blankSince:
+            self.blankSince[start] = time.time()
+
+    def onLoaded(self, starts):
+        now = time.time()
+        for start in starts:
+            requested = self.requested.pop(start, None)
+            if requested is not None:
+                self.latencies.append(now - requested)
+            blank = self.blankSince.pop(start, None)
+            if blank is not None:
+                self.blankTime += now - blank
+                self.blankCount += 1
+
+    def onCanceled(self, start):
+        self.requested.pop(start, None)
+
+    def stats(self):
+        return {
+            "chunkLatency": round(self.latency, 3),
+            "blankTime": round(self.blankTime, 3),
+            "blankCount": self.blankCount
+        }
+
+
 class PhotoPropertiesTask(backgroundthread.Task):
     def setup(self, photo, callback):
         self.photo = photo
@@ -331,6 +423,7 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
         self.keyItems = {}
         self.firstOfKeyItems = {}
         self.tasks = backgroundthread.Tasks()
+        self.prefetcher = ChunkPrefetcher()
         self.backgroundSet = False
         self.showPanelControl = None
         self.keyListControl = None
@@ -360,6 +453,7 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
         self.sortDesc = self.librarySettings.getSetting('sort.desc', False)
 
         self.alreadyFetchedChunkList = set()
+        self.loadedChunkList = set()
         self.finalChunkPosition = 0
 
         self.CHUNK_SIZE = util.addonSettings.libraryChunkSize
@@ -378,7 +472,9 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
 
     @busy.dialog()
     def doClose(self):
+        util.DEBUG_LOG('Library chunk stats: {0}', lambda: self.prefetcher.stats())
         self.tasks.kill()
+        imagecache.CACHE.cancelPrefetch()
         kodigui.MultiWindow.doClose(self)
 
     def onFirstInit(self):
@@ -424,7 +520,7 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
             if action.getId() in MOVE_SET:
                 mli = self.showPanelControl.getSelectedItem()
                 if mli:
-                    self.requestChunk(mli.pos())
+                    self.prefetchChunks(mli.pos())
 
                 if util.addonSettings.dynamicBackgrounds:
                     if mli and mli.dataSource:
@@ -946,6 +1042,9 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
         if not mli or not mli.dataSource:
             return
 
+        # chunks are loaded as compact items, the windows we open get the full object
+        mli.dataSource = compactitems.fullItem(mli.dataSource)
+
         sectionType = self.section.TYPE
 
         updateUnwatchedAndProgress = False
@@ -1091,7 +1190,9 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
         self.firstOfKeyItems = {}
         totalSize = 0
         self.alreadyFetchedChunkList = set()
+        self.loadedChunkList = set()
         self.finalChunkPosition = 0
+        self.prefetcher.reset()
 
         type_ = None
         if ITEM_TYPE == 'episode':
@@ -1191,6 +1292,7 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
                 self.finalChunkPosition = (totalSize // self.CHUNK_SIZE) * self.CHUNK_SIZE
                 # Keep track of the chunks we've already fetched by storing the chunk's starting position
                 self.alreadyFetchedChunkList.add(startChunkPosition)
+                self.prefetcher.onRequested(startChunkPosition)
                 break
 
         self.tasks.add(tasks)
@@ -1314,126 +1416,236 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
         if keys:
             util.setGlobalProperty('key', keys[0])
 
-    def _chunkCallback(self, items, start):
-        if not self.showPanelControl or not items:
+    def _chunkCallback(self, items, start, task):
+        """
+        Applies the items of a chunk request to the panel as they're parsed from the response stream. The stream
+        is consumed outside of the window lock; only updating a row takes it.
+        """
+        if not self.showPanelControl:
             return
 
-        with self.lock:
-            pos = start
-            self.setBackground(items, pos, randomize=not util.addonSettings.dynamicBackgrounds)
+        pos = start
+        loaded = []
+        thumbs = {}
+
+        thumbDim = TYPE_KEYS.get(self.section.type, TYPE_KEYS['movie'])['thumb_dim']
+        artDim = TYPE_KEYS.get(self.section.type, TYPE_KEYS['movie']).get('art_dim', (256, 256))
 
-            thumbDim = TYPE_KEYS.get(self.section.type, TYPE_KEYS['movie'])['thumb_dim']
-            artDim = TYPE_KEYS.get(self.section.type, TYPE_KEYS['movie']).get('art_dim', (256, 256))
+        try:
+            for obj in items:
+                if task.isCanceled():
+                    return
 
-            if ITEM_TYPE == 'episode':
-                for offset, obj in enumerate(items):
+                with self.lock:
                     if not self.showPanelControl:
                         return
+                    self._setChunkItem(self.showPanelControl[pos], obj, pos, thumbs, thumbDim, artDim)
+
+                if obj:
+                    loaded.append(obj)
+                pos += 1
+        except plexnet.exceptions.IncompleteResponse:
+            # let the chunks be requested again
+            util.DEBUG_LOG('Incomplete chunk response at {0}, got {1} of {2} items', start, pos - start, task.size)
+            with self.lock:
+                for c in range(start, start + task.size, self.CHUNK_SIZE):
+                    if c not in self.loadedChunkList:
+                        self.alreadyFetchedChunkList.discard(c)
+                        self.prefetcher.onCanceled(c)
+            return
 
-                    mli = self.showPanelControl[pos]
-                    if obj:
-                        mli.dataSource = obj
-                        mli.setProperty('index', str(pos))
-                        if obj.index:
-                            subtitle = u'{0} \u2022 {1}'.format(T(32310, 'S').format(obj.parentIndex),
-                                                                T(32311, 'E').format(obj.index))
-                            mli.setProperty('subtitle', subtitle)
-                            subtitle = "\n" + subtitle
-                        else:
-                            subtitle = ' - ' + obj.originallyAvailableAt.asDatetime('%m/%d/%y')
-                        mli.setLabel((obj.defaultTitle or '') + subtitle)
+        if task.isCanceled():
+            return
 
-                        mli.setThumbnailImage(obj.defaultThumb.asTranscodedImageURL(*thumbDim))
+        with self.lock:
+            if not self.showPanelControl:
+                return
 
-                        mli.setProperty('summary', obj.summary)
+            if loaded:
+                self.setBackground(loaded, start, randomize=not util.addonSettings.dynamicBackgrounds)
 
-                        mli.setLabel2(util.durationToText(obj.fixedDuration()))
-                        mli.setProperty('art', obj.defaultArt.asTranscodedImageURL(*artDim))
-                        if not obj.isWatched:
-                            mli.setProperty('unwatched', '1')
-                        mli.setBoolProperty('watched', obj.isFullyWatched)
-                        mli.setProperty('initialized', '1')
-                    else:
-                        mli.clear()
-                        if obj is False:
-                            mli.setProperty('index', str(pos))
-                        else:
-                            mli.setProperty('index', '')
+            chunks = range(start, max(pos, start + 1), self.CHUNK_SIZE)
+            self.loadedChunkList.update(chunks)
+            self.prefetcher.onLoaded(chunks)
 
-                    pos += 1
+            # Kodi only loads the posters of visible items; warm the image cache for chunks ahead of the viewport
+            if thumbs and not start <= self.prefetcher.position < pos:
+                imagecache.CACHE.prefetch(list(thumbs.keys()),
+                                          callback=lambda url, path: self.onChunkThumbnailCached(thumbs, url, path))
 
-            elif ITEM_TYPE == 'album':
-                for offset, obj in enumerate(items):
-                    if not self.showPanelControl:
-                        return
+    def _setChunkItem(self, mli, obj, pos, thumbs, thumbDim, artDim):
+        if ITEM_TYPE == 'episode':
+            if obj:
+                mli.dataSource = obj
+                mli.setProperty('index', str(pos))
+                if obj.index:
+                    subtitle = u'{0} \u2022 {1}'.format(T(32310, 'S').format(obj.parentIndex),
+                                                        T(32311, 'E').format(obj.index))
+                    mli.setProperty('subtitle', subtitle)
+                    subtitle = "\n" + subtitle
+                else:
+                    subtitle = ' - ' + obj.originallyAvailableAt.asDatetime('%m/%d/%y')
+                mli.setLabel((obj.defaultTitle or '') + subtitle)
 
-                    mli = self.showPanelControl[pos]
-                    if obj:
-                        mli.dataSource = obj
-                        mli.setProperty('index', str(pos))
-                        mli.setLabel(u'{0}\n{1}'.format(obj.parentTitle, obj.title))
+                self.setChunkThumbnail(mli, obj, obj.defaultThumb.asTranscodedImageURL(*thumbDim), thumbs)
 
-                        mli.setThumbnailImage(obj.defaultThumb.asTranscodedImageURL(*thumbDim))
+                mli.setProperty('summary', obj.summary)
 
-                        mli.setProperty('summary', obj.summary)
+                mli.setLabel2(util.durationToText(obj.fixedDuration()))
+                mli.setProperty('art', obj.defaultArt.asTranscodedImageURL(*artDim))
+                if not obj.isWatched:
+                    mli.setProperty('unwatched', '1')
+                mli.setBoolProperty('watched', obj.isFullyWatched)
+                mli.setProperty('initialized', '1')
+            else:
+                mli.clear()
+                if obj is False:
+                    mli.setProperty('index', str(pos))
+                else:
+                    mli.setProperty('index', '')
 
-                        mli.setLabel2(obj.year)
-                    else:
-                        mli.clear()
-                        if obj is False:
-                            mli.setProperty('index', str(pos))
-                        else:
-                            mli.setProperty('index', '')
+        elif ITEM_TYPE == 'album':
+            if obj:
+                mli.dataSource = obj
+                mli.setProperty('index', str(pos))
+                mli.setLabel(u'{0}\n{1}'.format(obj.parentTitle, obj.title))
 
-                    pos += 1
+                self.setChunkThumbnail(mli, obj, obj.defaultThumb.asTranscodedImageURL(*thumbDim), thumbs)
+
+                mli.setProperty('summary', obj.summary)
+
+                mli.setLabel2(obj.year)
             else:
-                for offset, obj in enumerate(items):
-                    if not self.showPanelControl:
-                        return
+                mli.clear()
+                if obj is False:
+                    mli.setProperty('index', str(pos))
+                else:
+                    mli.setProperty('index', '')
 
-                    mli = self.showPanelControl[pos]
-                    if obj:
-                        mli.setProperty('index', str(pos))
-                        if obj.TYPE == 'track':
-                            mli.setLabel("{} - {}: {}".format(obj.grandparentTitle, obj.parentTitle, obj.title))
-                        else:
-                            mli.setLabel(obj.defaultTitle or '')
+        else:
+            if obj:
+                mli.setProperty('index', str(pos))
+                if obj.TYPE == 'track':
+                    mli.setLabel("{} - {}: {}".format(obj.grandparentTitle, obj.parentTitle, obj.title))
+                else:
+                    mli.setLabel(obj.defaultTitle or '')
 
-                        if obj.TYPE == 'collection':
-                            colArtDim = TYPE_KEYS.get('collection').get('art_dim', (256, 256))
-                            mli.setProperty('art', obj.artCompositeURL(*colArtDim))
-                            mli.setThumbnailImage(obj.artCompositeURL(*thumbDim))
-                        else:
-                            if obj.TYPE == 'photodirectory' and obj.composite:
-                                mli.setThumbnailImage(obj.composite.asTranscodedImageURL(*thumbDim))
-                            else:
-                                mli.setThumbnailImage(obj.defaultThumb.asTranscodedImageURL(*thumbDim))
-                        mli.dataSource = obj
-                        mli.setProperty('summary', obj.get('summary'))
-                        mli.setProperty('year', obj.get('year'))
-
-                        if obj.TYPE != 'collection':
-                            if not obj.isDirectory() and obj.get('duration').asInt():
-                                mli.setLabel2(util.durationToText(obj.fixedDuration()))
-                            mli.setProperty('art', obj.defaultArt.asTranscodedImageURL(*artDim))
-                            if not obj.isWatched and obj.TYPE != "Directory":
-                                if self.section.TYPE == 'show' or obj.TYPE == 'show' or obj.TYPE == 'season':
-                                    mli.setProperty('unwatched.count', str(obj.unViewedLeafCount))
-                                else:
-                                    mli.setProperty('unwatched', '1')
-                            elif obj.isFullyWatched and obj.TYPE != "Directory":
-                                mli.setBoolProperty('watched', '1')
-                            mli.setProperty('initialized', '1')
-
-                        mli.setProperty('progress', util.getProgressImage(obj))
+                if obj.TYPE == 'collection':
+                    colArtDim = TYPE_KEYS.get('collection').get('art_dim', (256, 256))
+                    mli.setProperty('art', obj.artCompositeURL(*colArtDim))
+                    self.setChunkThumbnail(mli, obj, obj.artCompositeURL(*thumbDim), thumbs)
+                else:
+                    if obj.TYPE == 'photodirectory' and obj.composite:
+                        self.setChunkThumbnail(mli, obj, obj.composite.asTranscodedImageURL(*thumbDim), thumbs)
                     else:
-                        mli.clear()
-                        if obj is False:
-                            mli.setProperty('index', str(pos))
+                        self.setChunkThumbnail(mli, obj, obj.defaultThumb.asTranscodedImageURL(*thumbDim), thumbs)
+                mli.dataSource = obj
+                mli.setProperty('summary', obj.get('summary'))
+                mli.setProperty('year', obj.get('year'))
+
+                if obj.TYPE != 'collection':
+                    if not obj.isDirectory() and obj.get('duration').asInt():
+                        mli.setLabel2(util.durationToText(obj.fixedDuration()))
+                    mli.setProperty('art', obj.defaultArt.asTranscodedImageURL(*artDim))
+                    if not obj.isWatched and obj.TYPE != "Directory":
+                        if self.section.TYPE == 'show' or obj.TYPE == 'show' or obj.TYPE == 'season':
+                            mli.setProperty('unwatched.count', str(obj.unViewedLeafCount))
                         else:
-                            mli.setProperty('index', '')
+                            mli.setProperty('unwatched', '1')
+                    elif obj.isFullyWatched and obj.TYPE != "Directory":
+                        mli.setBoolProperty('watched', '1')
+                    mli.setProperty('initialized', '1')
 
-                    pos += 1
+                mli.setProperty('progress', util.getProgressImage(obj))
+            else:
+                mli.clear()
+                if obj is False:
+                    mli.setProperty('index', str(pos))
+                else:
+                    mli.setProperty('index', '')
+
+    def setChunkThumbnail(self, mli, obj, url, thumbs):
+        path = imagecache.CACHE.lookup(url)
+        if path:
+            mli.setThumbnailImage(path)
+        elif url:
+            mli.setThumbnailImage(url)
+            thumbs[url] = (mli, obj)
+
+    def onChunkThumbnailCached(self, thumbs, url, path):
+        mli, obj = thumbs.get(url, (None, None))
+        # the item might have been re-used for something else in the meantime
+        if self.showPanelControl and mli and mli.dataSource is obj:
+            mli.setThumbnailImage(path)
+
+    def prefetchChunks(self, pos):
+        """
+        Requests the chunks for the viewport at pos plus the next chunks in the direction of travel, and cancels
+        in-flight chunk requests that have fallen out of that window.
+        """
+        if util.addonSettings.retrieveAllMediaUpFront:
+            return
+
+        self.prefetcher.track(pos)
+        chunkOC = getattr(self._current, "CHUNK_OVERCOMMIT", self.CHUNK_OVERCOMMIT)
+        step = self.prefetcher.velocity < 0 and -self.CHUNK_SIZE or self.CHUNK_SIZE
+
+        first = (pos // self.CHUNK_SIZE) * self.CHUNK_SIZE
+        wanted = [first]
+        last = ((pos + chunkOC) // self.CHUNK_SIZE) * self.CHUNK_SIZE
+        if last != first:
+            wanted.append(last)
+
+        ahead = step > 0 and last or first
+        for x in range(self.prefetcher.chunksAhead(self.CHUNK_SIZE)):
+            ahead += step
+            wanted.append(ahead)
+
+        wanted = [c for c in wanted if 0 <= c <= self.finalChunkPosition]
+        for c in (first, last):
+            if c not in self.loadedChunkList:
+                self.prefetcher.onBlank(c)
+
+        # drop stale in-flight requests outside of the window
+        lo, hi = min(wanted), max(wanted) + self.CHUNK_SIZE
+        for task in self.tasks:
+            if isinstance(task, ChunkRequestTask) and task.isValid() and \
+                    (task.start + task.size <= lo or task.start >= hi):
+                util.DEBUG_LOG('Canceling stale chunk request {0}', task.start)
+                task.cancel()
+                backgroundthread.BGThreader.removeTasks([task])
+                for c in range(task.start, task.start + task.size, self.CHUNK_SIZE):
+                    if c not in self.loadedChunkList:
+                        self.alreadyFetchedChunkList.discard(c)
+                        self.prefetcher.onCanceled(c)
+
+        # merge consecutive missing chunks into bigger requests, nearest to the viewport first
+        tasks = []
+        merge = self.prefetcher.mergeCount()
+        for c in wanted:
+            if c in self.alreadyFetchedChunkList:
+                continue
+
+            if tasks and len(tasks[-1]) < merge and tasks[-1][-1] + step == c:
+                tasks[-1].append(c)
+            else:
+                tasks.append([c])
+            self.alreadyFetchedChunkList.add(c)
+
+        for chunks in tasks:
+            start = min(chunks)
+            util.DEBUG_LOG('Position {0} so requesting chunks {1}', pos, chunks)
+            for c in chunks:
+                self.prefetcher.onRequested(c)
+            self._addChunkTask(start, self.CHUNK_SIZE * len(chunks))
+
+    def _addChunkTask(self, start, size):
+        task = ChunkRequestTask().setup(self.section, start, size,
+                                        self._chunkCallback, filter_=self.getFilterOpts(), sort=self.getSortOpts(),
+                                        unwatched=self.filterUnwatched, subDir=self.subDir)
+
+        self.tasks.add(task)
+        backgroundthread.BGThreader.addTasksToFront([task])
 
     def requestChunk(self, start):
         if util.addonSettings.retrieveAllMediaUpFront:
@@ -1450,12 +1662,8 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
             util.DEBUG_LOG('Position {0} so requesting chunk {1}', start, startChunkPosition)
             # Keep track of the chunks we've already fetched by storing the chunk's starting position
             self.alreadyFetchedChunkList.add(startChunkPosition)
-            task = ChunkRequestTask().setup(self.section, startChunkPosition, self.CHUNK_SIZE,
-                                            self._chunkCallback, filter_=self.getFilterOpts(), sort=self.getSortOpts(),
-                                            unwatched=self.filterUnwatched, subDir=self.subDir)
-
-            self.tasks.add(task)
-            backgroundthread.BGThreader.addTasksToFront([task])
+            self.prefetcher.onRequested(startChunkPosition)
+            self._addChunkTask(startChunkPosition, self.CHUNK_SIZE)
 
 
 class PostersWindow(kodigui.ControlledWindow):
@@ -3,7 +3,9 @@
 import math
 
 from plexnet import util as pnUtil
+from plexnet import querycache
 
+from lib import backgroundthread
 from lib import util
 from lib.data_cache import dcm
 from lib.util import T
@@ -13,6 +15,23 @@ from . import kodigui
 from . import optionsdialog
 
 
+class SeasonsRefreshTask(backgroundthread.Task):
+    def setup(self, show, callback):
+        self.show = show
+        self.callback = callback
+        return self
+
+    def run(self):
+        if self.isCanceled():
+            return
+
+        changes = querycache.CACHE.changeCount()
+        seasons = self.show.seasons(cache=querycache.CACHE_REFRESH)
+        if self.isCanceled() or not seasons or querycache.CACHE.changeCount() == changes:
+            return
+        self.callback(seasons)
+
+
 class SeasonsMixin:
     SEASONS_CONTROL_ATTR = "subItemListControl"
 
@@ -51,8 +70,18 @@ class SeasonsMixin:
                 watchedPerc += vPerc / season.leafCount.asFloat()
         return watchedPerc > 0 and math.ceil(watchedPerc) or 0
 
-    def fillSeasons(self, show, update=False, seasonsFilter=None, selectSeason=None, do_focus=True):
-        seasons = show.seasons()
+    def fillSeasons(self, show, update=False, seasonsFilter=None, selectSeason=None, do_focus=True, seasons=None):
+        if seasons is None and not update:
+            seasons = show.seasons(cache=querycache.CACHE_ONLY) or None
+            if seasons:
+                # show the cached seasons right away and refresh them in the background
+                backgroundthread.BGThreader.addTask(SeasonsRefreshTask().setup(
+                    show, lambda s: self.fillSeasons(show, update=True, seasonsFilter=seasonsFilter,
+                                                     selectSeason=selectSeason, do_focus=False, seasons=s)))
+
+        if seasons is None:
+            seasons = show.seasons(cache=querycache.CACHE_REFRESH)
+
         if not seasons or (seasonsFilter and not seasonsFilter(seasons)):
             return False
 
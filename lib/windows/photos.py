@@ -1,15 +1,12 @@
 from __future__ import absolute_import
 
-import hashlib
 import os
-import shutil
 import threading
 import time
 
-import requests
 from kodi_six import xbmc
 from kodi_six import xbmcgui
-from plexnet import plexapp, plexplayer, playqueue
+from plexnet import plexapp, plexplayer, playqueue, imagecache
 from plexnet import util as plexnetUtil
 
 from lib import util, colors
@@ -43,8 +40,7 @@ class PhotoWindow(kodigui.BaseWindow):
 
     SLIDESHOW_INTERVAL = util.slideshowInterval
 
-    PHOTO_STACK_SIZE = 10
-    tempSubFolder = ("p4k", "photos")
+    PREFETCH_AHEAD = 3  # photos after the next one to prefetch
 
     def __init__(self, *args, **kwargs):
         kodigui.BaseWindow.__init__(self, *args, **kwargs)
@@ -64,20 +60,9 @@ class PhotoWindow(kodigui.BaseWindow):
         self.showPhotoThread = None
         self.showPhotoTimeout = 0
         self.rotate = 0
-        self.tempFolder = None
-        self.photoStack = []
         self.initialLoad = True
 
     def onFirstInit(self):
-        self.tempFolder = os.path.join(util.translatePath("special://temp/"), *self.tempSubFolder)
-
-        if not os.path.exists(self.tempFolder):
-            try:
-                os.makedirs(self.tempFolder)
-            except OSError:
-                if not os.path.isdir(self.tempFolder):
-                    util.ERROR()
-
         self.pqueueList = kodigui.ManagedControlList(self, self.PQUEUE_LIST_ID, 14)
         #self.setProperty('photo', 'script.plex/indicators/busy-photo.gif')
         try:
@@ -295,7 +280,7 @@ class PhotoWindow(kodigui.BaseWindow):
 
     def _showPhoto(self):
         """
-        load the current photo, preload the previous and the next one
+        load the current photo, preload the previous and the next one and prefetch the ones after that
         :return:
         """
         photo = self.playQueue.current()
@@ -307,7 +292,6 @@ class PhotoWindow(kodigui.BaseWindow):
 
         self.playerObject = plexplayer.PlexPhotoPlayer(photo)
 
-        addToStack = []
         currentFailed = False
         try:
             for item in loadItems:
@@ -317,10 +301,7 @@ class PhotoWindow(kodigui.BaseWindow):
                 if item.type != "photo":
                     continue
 
-                meta = self.playerObject.build(item=item)
-                url = photo.server.getImageTranscodeURL(meta.get('url', ''), self.width, self.height)
-                bgURL = item.thumb.asTranscodedImageURL(self.width, self.height, blur=128, opacity=60,
-                                                        background=colors.noAlpha.Background)
+                url, bgURL = self.getPhotoURLs(item)
 
                 isCurrent = currentFailed or item == photo
                 if isCurrent and not self.initialLoad:
@@ -331,56 +312,56 @@ class PhotoWindow(kodigui.BaseWindow):
                     currentFailed = True
                     continue
 
-                if (path, background) not in self.photoStack:
-                    if item == next:
-                        # move the next image to the top of the stack
-                        addToStack.insert(0, (path, background))
-                    else:
-                        addToStack.append((path, background))
-
                 if isCurrent:
                     self._reallyShowPhoto(item, path, background)
                     self.setBoolProperty('is.updating', False)
                     self.initialLoad = False
-
-            # maintain cache folder
-            self.photoStack = addToStack + self.photoStack
-            if len(self.photoStack) > self.PHOTO_STACK_SIZE:
-                clean = self.photoStack[self.PHOTO_STACK_SIZE:]
-                self.photoStack = self.photoStack[:self.PHOTO_STACK_SIZE]
-                for remList in clean:
-                    for rem in remList:
-                        try:
-                            os.remove(rem)
-                        except:
-                            pass
         finally:
             self.setBoolProperty('is.updating', False)
 
+        self.prefetchPhotos(next)
+
+    def getPhotoURLs(self, item):
+        meta = self.playerObject.build(item=item)
+        url = item.getServer().getImageTranscodeURL(meta.get('url', ''), self.width, self.height)
+        bgURL = item.thumb.asTranscodedImageURL(self.width, self.height, blur=128, opacity=60,
+                                                background=colors.noAlpha.Background)
+        return url, bgURL
+
+    def prefetchPhotos(self, next):
+        if not next:
+            return
+
+        items = list(self.playQueue.items())
+        try:
+            pos = items.index(next)
+        except ValueError:
+            return
+
+        urls = []
+        for item in items[pos + 1:pos + 1 + self.PREFETCH_AHEAD]:
+            if item.type != "photo":
+                continue
+
+            try:
+                urls += self.getPhotoURLs(item)
+            except Exception:
+                # not enough data on the play queue item yet
+                util.DEBUG_LOG('Photos: not prefetching {0}', item)
+
+        imagecache.CACHE.prefetch(urls)
+
     def getCachedPhotoData(self, url, bgURL):
         if not url:
-            return
+            return None, None
 
-        basename = hashlib.sha1(url.encode('utf-8')).hexdigest()
-        tmpPath = os.path.join(self.tempFolder, basename)
-        tmpBgPath = os.path.join(self.tempFolder, "%s_bg" % basename)
-
-        for p, url in ((tmpPath, url), (tmpBgPath, bgURL)):
-            if not os.path.exists(p):# and not xbmc.getCacheThumbName(tmpFn):
-                try:
-                    r = requests.get(url, allow_redirects=True, timeout=10.0)
-                    r.raise_for_status()
-                except Exception as e:
-                    util.ERROR("Couldn't load image: %s" % e, notify=True)
-                    return None, None
-                else:
-                    try:
-                        with open(p, 'wb') as f:
-                            f.write(r.content)
-                    except:
-                        return None, None
+        path = imagecache.CACHE.get(url)
+        bgPath = path and imagecache.CACHE.get(bgURL)
+        if not (path and bgPath):
+            util.ERROR("Couldn't load image", notify=True)
+            return None, None
 
-        return tmpPath, tmpBgPath
+        return path, bgPath
 
     def _reallyShowPhoto(self, photo, path, background):
         self.setRotation(0)
@@ -491,7 +472,7 @@ class PhotoWindow(kodigui.BaseWindow):
 
     def doClose(self):
         self.pause()
-        shutil.rmtree(self.tempFolder, ignore_errors=True)
+        imagecache.CACHE.cancelPrefetch()
 
         kodigui.BaseWindow.doClose(self)
 
@@ -1,10 +1,9 @@
 from __future__ import absolute_import
 
 import threading
-import time
 
 from kodi_six import xbmcgui, xbmc
-from plexnet import plexapp
+from plexnet import plexapp, searchindex, compactitems
 
 from lib import util
 from lib.kodijsonrpc import rpc
@@ -107,13 +106,18 @@ class SearchDialog(kodigui.BaseDialog, windowutils.UtilMixin):
         '10': {'thumb': 'script.plex/section_type/music.png'},  # Track
     }
 
+    SERVER_SEARCH_DELAY = 1.0  # seconds after the last keystroke
+
     def __init__(self, *args, **kwargs):
         kodigui.BaseDialog.__init__(self, *args, **kwargs)
         windowutils.UtilMixin.__init__(self)
         self.parentWindow = kwargs.get('parent_window')
         self.sectionID = kwargs.get('section_id')
-        self.resultsThread = None
-        self.updateResultsTimeout = 0
+        self.searchIndex = searchindex.INDEXES.get(plexapp.SERVERMANAGER.selectedServer)
+        self.localHubs = []
+        self.serverSearchTimer = None
+        # local results are shown from the UI thread, server results from the timer thread
+        self.hubsLock = threading.RLock()
         self.isActive = True
         self.useKodiKbd = util.getSetting('search_use_kodi_kbd', False)
 
@@ -244,26 +248,53 @@ class SearchDialog(kodigui.BaseDialog, windowutils.UtilMixin):
         self.updateResults()
 
     def updateResults(self):
-        self.updateResultsTimeout = time.time() + 1
-        if not self.resultsThread or not self.resultsThread.is_alive():
-            self.resultsThread = threading.Thread(target=self._updateResults, name='search.update')
-            self.resultsThread.start()
-
-    def _updateResults(self):
-        while time.time() < self.updateResultsTimeout and not util.MONITOR.waitForAbort(0.1):
-            pass
+        # show what the local index has right away, then ask the server once typing pauses
+        query = self.edit.getText()
+        self.localHubs = self.searchIndex.search(query, self.sectionID) if query else []
+        if self.localHubs:
+            self.showHubs(self.localHubs)
 
-        self._reallyUpdateResults()
+        if self.serverSearchTimer:
+            self.serverSearchTimer.cancel()
+        self.serverSearchTimer = threading.Timer(self.SERVER_SEARCH_DELAY, self._reallyUpdateResults)
+        self.serverSearchTimer.name = 'search.update'
+        self.serverSearchTimer.start()
 
     def _reallyUpdateResults(self):
+        if not self.isActive:
+            return
+
         query = self.edit.getText()
         if query:
             with self.propertyContext('searching'):
                 hubs = plexapp.SERVERMANAGER.selectedServer.hubs(count=10, search_query=query, section=self.sectionID)
-                self.showHubs(hubs)
+                with self.hubsLock:
+                    if query != self.edit.getText():
+                        # superseded by further typing
+                        return
+                    self.showHubs(self.mergeHubs(hubs, self.localHubs))
         else:
             self.clearHubs()
 
+    def mergeHubs(self, hubs, localHubs):
+        """
+        Adds the local results the server didn't return to the server's hubs.
+        """
+        merged = list(hubs)
+        byType = dict((hub.type, idx) for idx, hub in enumerate(merged))
+        for localHub in localHubs:
+            idx = byType.get(localHub.type)
+            if idx is None:
+                merged.append(localHub)
+                continue
+
+            hub = merged[idx]
+            keys = set(item.ratingKey for item in hub.items)
+            extra = [item for item in localHub.items if item.ratingKey not in keys]
+            if extra:
+                merged[idx] = searchindex.ResultHub(hub.type, hub.title, list(hub.items) + extra)
+        return merged
+
     def sectionClicked(self, controlID):
         section = self.SECTION_BUTTONS[controlID]
         old = self.getProperty('search.section')
@@ -299,7 +330,7 @@ class SearchDialog(kodigui.BaseDialog, windowutils.UtilMixin):
         if not mli:
             return
 
-        hubItem = mli.dataSource
+        hubItem = compactitems.fullItem(mli.dataSource)
         if hubItem.TYPE == 'playlist' and not hubItem.exists():  # Workaround for server bug
             util.messageDialog('No Access', 'Playlist not accessible by this user.')
             util.DEBUG_LOG('Search: Playlist does not exist - probably wrong user')
@@ -351,6 +382,10 @@ class SearchDialog(kodigui.BaseDialog, windowutils.UtilMixin):
         return mli
 
     def showHubs(self, hubs):
+        with self.hubsLock:
+            self._showHubs(hubs)
+
+    def _showHubs(self, hubs):
         self.clearHubs()
         self.opaqueBackground(on=False)
 
@@ -406,13 +441,14 @@ class SearchDialog(kodigui.BaseDialog, windowutils.UtilMixin):
         return itemListControl.controlID
 
     def clearHubs(self):
-        self.opaqueBackground(on=False)
-        self.setProperty('no.results', '')
-        for controls in self.hubControls:
-            for control in controls.values():
-                if control:
-                    control.reset()
-        self.setProperty('hub.focus', '')
+        with self.hubsLock:
+            self.opaqueBackground(on=False)
+            self.setProperty('no.results', '')
+            for controls in self.hubControls:
+                for control in controls.values():
+                    if control:
+                        control.reset()
+            self.setProperty('hub.focus', '')
 
     def opaqueBackground(self, on=True):
         self.parentWindow.setProperty('search.dialog.hasresults', on and '1' or '')
@@ -421,6 +457,9 @@ class SearchDialog(kodigui.BaseDialog, windowutils.UtilMixin):
         while self.isActive and not util.MONITOR.waitForAbort(0.1):
             pass
 
+        if self.serverSearchTimer:
+            self.serverSearchTimer.cancel()
+
 
 def dialog(parent_window, section_id=None):
     parent_window.setProperty('search.dialog.hasresults', '')
@@ -1289,7 +1289,7 @@ class SeekDialog(kodigui.BaseDialog):
                     util.LOG("Can't calculate OpenSubtitles hash because we're transcoding")
 
                 else:
-                    oss_hash = util.getOpenSubtitlesHash(meta.size, meta.streamUrls[0])
+                    oss_hash = util.getOpenSubtitlesHash(meta.size, meta.streamUrls[0], key=meta.partId)
                     if oss_hash:
                         util.DEBUG_LOG("OpenSubtitles hash: {}", oss_hash)
                         util.setGlobalProperty("current_oshash", oss_hash, base='videoinfo.{0}')
@@ -1609,11 +1609,13 @@ class SeekDialog(kodigui.BaseDialog):
                     if skipMarker:
                         continue
 
-                    bifUrl = self.handler.player.playerObject.getBifUrl(offset)
                     if "blur_chapters" in self.no_spoilers:
+                        bifUrl = self.handler.player.playerObject.getBifUrl(offset)
                         bifUrl = self.player.video.server.getImageTranscodeURL(bifUrl,
                                                                                *PlaylistDialog.LI_AR16X9_THUMB_DIM,
                                                                                **thumb_opts)
+                    else:
+                        bifUrl = self.handler.player.playerObject.getBifImage(offset)
                     chaps.append((offset, bifUrl,
                                   label.format(" #{}".format(credCnt) if credits and creditsCounter > 1 else "")))
 
@@ -1798,7 +1800,7 @@ class SeekDialog(kodigui.BaseDialog):
             return
 
         if self.hasBif:
-            self.setProperty('bif.image', self.handler.player.playerObject.getBifUrl(offset))
+            self.setProperty('bif.image', self.handler.player.playerObject.getBifImage(offset))
             self.bifImageControl.setPosition(bifx, 752)
 
         self.seekbarControl.setPosition(0, self.seekbarControl.getPosition()[1])
@@ -0,0 +1,164 @@
+# coding=utf-8
+"""
+Load benchmark for async HttpRequests against a local stand-in HTTP server. Reports client thread count, server
+connections and callback latency.
+
+    python tools/bench_dispatcher.py [--requests 500] [--delay 0.02] [--thread-per-request]
+
+--thread-per-request runs each request on its own thread instead of the RequestDispatcher, for comparison.
+"""
+from __future__ import print_function
+
+import sys
+import time
+import types
+import argparse
+import traceback
+import threading
+
+from six.moves import BaseHTTPServer, socketserver
+
+import benchutil
+
+import plexnet  # noqa: E402
+from plexnet import http, util, callback  # noqa: E402
+
+BODY = b'<MediaContainer size="0"/>'
+
+
+class StandInServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+    delay = 0
+    connections = 0
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_GET(self):
+        time.sleep(self.server.delay)
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+class BenchInterface(object):
+    """
+    Minimal stand-in for the app interface and the app, which plexnet logs and reports requests to.
+    """
+    def LOG(self, msg, *args, **kwargs):
+        pass
+
+    DEBUG_LOG = WARN_LOG = LOG
+
+    def ERROR_LOG(self, msg, *args, **kwargs):
+        print("ERROR", msg.format(*args, **kwargs))
+
+    def ERROR(self, msg=None, err=None):
+        print("ERROR", msg or "", err or traceback.format_exc())
+
+    def delRequest(self, request):
+        pass
+
+    def onRequestTimeout(self, context):
+        pass
+
+
+class Load(object):
+    def __init__(self, count):
+        self.left = count
+        self.latencies = []
+        self.errors = 0
+        self.peakThreads = 0
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+    def onResponse(self, request, response, context):
+        with self.lock:
+            self.latencies.append(time.time() - context.started)
+            if not response or response.getStatus() != 200:
+                self.errors += 1
+            self.left -= 1
+            if not self.left:
+                self.done.set()
+
+    def monitor(self):
+        while not self.done.is_set():
+            # dispatcher workers are named HTTP-ASYNC-n
+            self.peakThreads = max(self.peakThreads,
+                                   len([t for t in threading.enumerate() if t.name.startswith("HTTP-")]))
+            time.sleep(0.002)
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--delay", type=float, default=0.02, help="server response delay in seconds")
+    parser.add_argument("--thread-per-request", dest="threaded", action="store_true")
+    args = parser.parse_args()
+
+    util.setInterface(BenchInterface())
+    util.setApp(BenchInterface())
+    # the real plexapp module needs a running Kodi; requests only reach the app through plexapp.util
+    plexapp = types.ModuleType("plexnet.plexapp")
+    plexapp.util = util
+    plexnet.plexapp = sys.modules["plexnet.plexapp"] = plexapp
+
+    server = StandInServer(("127.0.0.1", 0), Handler)
+    server.delay = args.delay
+    serverThread = threading.Thread(target=server.serve_forever, name="STAND-IN-SERVER")
+    serverThread.daemon = True
+    serverThread.start()
+
+    load = Load(args.requests)
+    monitor = threading.Thread(target=load.monitor, name="MONITOR")
+    monitor.daemon = True
+    monitor.start()
+
+    start = time.time()
+    for x in range(args.requests):
+        request = http.HttpRequest("http://127.0.0.1:{0}/library/sections?x={1}".format(server.server_address[1], x))
+        context = request.createRequestContext("bench", callback.Callable(load.onResponse))
+        context.started = time.time()
+        if args.threaded:
+            thread = threading.Thread(target=request._startAsync, kwargs={"context": context},
+                                      name="HTTP-REQUEST-{0}".format(x))
+            thread.daemon = True
+            thread.start()
+        else:
+            request.startAsync(context=context)
+
+    finished = load.done.wait(120)
+    elapsed = time.time() - start
+    server.shutdown()
+
+    latencies = sorted(load.latencies)
+    print("{0} requests, {1:.0f}ms server delay, {2}".format(
+        args.requests, args.delay * 1000, "thread per request" if args.threaded else "RequestDispatcher"))
+    if not finished:
+        print("timed out, {0} requests outstanding".format(load.left))
+    if latencies:
+        print("total {0:.2f}s, latency p50 {1:.0f}ms p95 {2:.0f}ms max {3:.0f}ms".format(
+            elapsed, percentile(latencies, 0.5) * 1000, percentile(latencies, 0.95) * 1000, latencies[-1] * 1000))
+    print("peak client threads {0}, server connections {1}, errors {2}".format(
+        load.peakThreads, server.connections, load.errors))
+    if not args.threaded:
+        print("dispatcher: {0}".format(http.DISPATCHER.stats()))
+    return 0 if finished and not load.errors else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+# coding=utf-8
+"""
+Micro-benchmark for kodigui.ManagedControlList against a fake list control, counting the calls that would go to
+Kodi.
+
+    python tools/bench_managedlist.py [--items 5000] [--no-batch]
+
+--no-batch simulates Kodi versions without ListItem.setProperties.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import types
+import argparse
+import collections
+
+import benchutil
+
+CALLS = collections.Counter()
+
+
+class FakeListItem(object):
+    """
+    Stands in for xbmcgui.ListItem, counting every setter call.
+    """
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith("set"):
+            def setter(*args, **kwargs):
+                CALLS[name] += 1
+            return setter
+        raise AttributeError(name)
+
+
+class FakeLegacyListItem(FakeListItem):
+    def __getattr__(self, name):
+        if name == "setProperties":
+            raise AttributeError(name)
+        return FakeListItem.__getattr__(self, name)
+
+
+class FakeControl(object):
+    def __init__(self):
+        self.listItems = []
+
+    def addItems(self, items):
+        self.listItems += items
+
+    def addItem(self, item):
+        self.listItems.append(item)
+
+    def getListItem(self, idx):
+        CALLS["getListItem"] += 1
+        return self.listItems[idx]
+
+    def getSelectedPosition(self):
+        return 0
+
+    def reset(self):
+        self.listItems = []
+
+
+class FakeWindow(object):
+    def __init__(self, control):
+        self.control = control
+
+    def getControl(self, control_id):
+        return self.control
+
+
+def load_kodigui(batch):
+    # kodigui reads ListItem's capabilities on import
+    import xbmcgui
+    xbmcgui.ListItem = FakeListItem if batch else FakeLegacyListItem
+
+    # lib.util and plexnet.plexapp need a running Kodi; the list code only logs through util
+    util = types.ModuleType("lib.util")
+    util.LOG = util.DEBUG_LOG = lambda *args, **kwargs: None
+    util.ERROR = lambda *args, **kwargs: print("ERROR", *args)
+    sys.modules["lib.util"] = util
+    benchutil.package("lib", "lib").util = util
+    benchutil.package("lib.windows", os.path.join("lib", "windows"))
+
+    plexapp = types.ModuleType("plexnet.plexapp")
+    sys.modules["plexnet.plexapp"] = plexapp
+    benchutil.package("plexnet", os.path.join("lib", "_included_packages", "plexnet")).plexapp = plexapp
+
+    from lib.windows import kodigui
+    return kodigui
+
+
+def wait_for_sync(control_list):
+    thread = control_list._syncThread
+    if thread:
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--no-batch", dest="batch", action="store_false")
+    args = parser.parse_args()
+
+    kodigui = load_kodigui(args.batch)
+    properties = dict(("prop{0}".format(x), str(x)) for x in range(5))
+
+    def managed_items():
+        return [kodigui.ManagedListItem("item{0}".format(x), data_source=object(), properties=properties)
+                for x in range(args.items)]
+
+    control_list = kodigui.ManagedControlList(FakeWindow(FakeControl()), 1, 10)
+    print("{0} items, setProperties {1}".format(args.items, "used" if kodigui.BATCH_PROPERTIES else "unavailable"))
+
+    def run(label, func, *fargs):
+        CALLS.clear()
+        seconds = benchutil.timed(func, *fargs)[0]
+        returned = sum(CALLS.values())
+        wait_for_sync(control_list)
+        benchutil.report(label, seconds, "kodi calls: {0} before returning, {1} in total".format(
+            returned, sum(CALLS.values())))
+
+    run("addItems", control_list.addItems, managed_items())
+    run("sort", control_list.sort, lambda mli: -int(mli.label[4:]))
+    run("replaceItems", control_list.replaceItems, managed_items())
+
+    dataSources = [mli.dataSource for mli in control_list.items[::10]]
+    seconds = benchutil.timed(lambda: [control_list.getListItemByDataSource(ds) for ds in dataSources])[0]
+    benchutil.report("{0} lookups by data source".format(len(dataSources)), seconds)
+
+    mlis = control_list.items[::10]
+    seconds = benchutil.timed(lambda: [control_list.getManagedItemPosition(mli) for mli in mlis])[0]
+    benchutil.report("{0} position lookups".format(len(mlis)), seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# coding=utf-8
+"""
+Renders the full skin template set with the ibis tree walker and the compiled backend (ibis.compiled) and compares
+timings and output.
+
+    python tools/bench_templates.py [--theme modern-colored] [--indicators modern_2024] [--rounds 5]
+
+Cold timings include loading (lexing/parsing or compiling) every template, "cached" loads the compiled code from
+the on-disk cache, and warm timings re-render already loaded templates.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import copy
+import glob
+import shutil
+import argparse
+import tempfile
+
+import benchutil
+
+benchutil.package("lib.templating", os.path.join("lib", "templating"))
+
+import ibis  # noqa: E402
+from lib.templating import core, context  # noqa: E402
+from lib.templating.util import deep_update  # noqa: E402
+
+TEMPLATE_DIR = os.path.join(benchutil.ROOT, "resources", "skins", "Main", "1080i", "templates")
+
+
+def template_context(theme, indicators):
+    ctx = copy.deepcopy(context.TEMPLATE_CONTEXTS)
+    deep_update(ctx, {
+        "core": {
+            "resolution": [1920, 1080],
+            "needs_scaling": False
+        },
+        "indicators": {
+            "START": {
+                "INHERIT": indicators,
+                "style": indicators,
+                "hide_aw_bg": False,
+                "use_scaling": True
+            }
+        },
+    })
+    return core.prepare_template_data(theme, ctx)
+
+
+def render_all(loader, names, ctx):
+    ibis.loader = loader
+    return dict((name, loader(name).render(ctx)) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--theme", default="modern-colored", choices=sorted(context.TEMPLATE_CONTEXTS["themes"]))
+    parser.add_argument("--indicators", default="modern_2024",
+                        choices=sorted(context.TEMPLATE_CONTEXTS["indicators"]))
+    parser.add_argument("--rounds", type=int, default=5, help="rounds for warm renders (best is reported)")
+    args = parser.parse_args()
+
+    names = [os.path.basename(f) for f in sorted(glob.glob(os.path.join(TEMPLATE_DIR, "script-plex-*.tpl")))]
+    ctx = template_context(args.theme, args.indicators)
+    cache_dir = tempfile.mkdtemp(prefix="ibis_bench_")
+    print("{0} templates, theme {1}, indicators {2}".format(len(names), args.theme, args.indicators))
+
+    try:
+        tree = ibis.loaders.FileLoader(TEMPLATE_DIR)
+        seconds, expected = benchutil.timed(render_all, tree, names, ctx)
+        benchutil.report("tree walker, cold", seconds)
+        benchutil.report("tree walker, warm", benchutil.best(render_all, args.rounds, tree, names, ctx))
+
+        results = []
+        seconds, output = benchutil.timed(render_all, ibis.loaders.FileLoader(TEMPLATE_DIR, cache_dir=cache_dir),
+                                          names, ctx)
+        results.append(output)
+        benchutil.report("compiled, cold (empty cache)", seconds,
+                         "{0} cache files".format(len(os.listdir(cache_dir))))
+
+        compiled = ibis.loaders.FileLoader(TEMPLATE_DIR, cache_dir=cache_dir)
+        seconds, output = benchutil.timed(render_all, compiled, names, ctx)
+        results.append(output)
+        benchutil.report("compiled, cold (cached code)", seconds)
+        benchutil.report("compiled, warm", benchutil.best(render_all, args.rounds, compiled, names, ctx))
+    finally:
+        shutil.rmtree(cache_dir, True)
+
+    differing = sorted(set(name for output in results for name in names if output[name] != expected[name]))
+    if differing:
+        print("output differs from the tree walker: {0}".format(", ".join(differing)))
+        return 1
+    print("output identical")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+# coding=utf-8
+"""
+Shared setup for the benchmark scripts in this directory.
+
+The benchmarks run outside of Kodi on Python 3. The xbmc modules come from the Kodistubs package:
+
+    pip install Kodistubs six requests
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path[:0] = [ROOT, os.path.join(ROOT, "lib", "_included_packages")]
+
+if "kodi_six" not in sys.modules:
+    # kodi_six is a plain passthrough of the xbmc modules on Python 3
+    kodi_six = types.ModuleType("kodi_six")
+    for _name in ("xbmc", "xbmcgui", "xbmcaddon", "xbmcvfs", "xbmcplugin"):
+        setattr(kodi_six, _name, __import__(_name))
+    sys.modules["kodi_six"] = kodi_six
+
+
+def package(name, path):
+    """
+    Registers an empty package, so its modules can be imported without running its __init__ (which usually pulls
+    in the whole addon).
+    """
+    pkg = types.ModuleType(name)
+    pkg.__path__ = [os.path.join(ROOT, path)]
+    sys.modules[name] = pkg
+    return pkg
+
+
+def timed(func, *args, **kwargs):
+    """
+    Returns (seconds, result) of calling func once.
+    """
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def best(func, rounds, *args, **kwargs):
+    """
+    Returns the best of rounds timings of func.
+    """
+    return min(timed(func, *args, **kwargs)[0] for x in range(rounds))
+
+
+def report(label, seconds, extra=""):
+    print("{0:<40} {1:>10.2f}ms{2}".format(label, seconds * 1000, extra and "  " + extra))